@@ -27,6 +27,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'channels',
     'core',
     'crispy_forms',
     'crispy_bootstrap5',
@@ -36,6 +37,7 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
+    'core.instrumentation.RequestInstrumentationMiddleware',  # Outermost, so wall time covers the whole stack
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,12 +61,48 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.notifications',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'brainProject.wsgi.application'
+ASGI_APPLICATION = 'brainProject.asgi.application'
+
+# --- Channels (WebSocket chat delivery) ---
+# WebSockets need the ASGI server: Procfile.txt and render.yaml start daphne on
+# brainProject.asgi. Under a WSGI server (gunicorn brainProject.wsgi) /ws/chat/
+# is never served and the chat page falls back to polling the messages API.
+# The in-memory layer only reaches sockets in the same process, which is fine
+# for development and tests. Set REDIS_URL so every process shares one layer
+# (channels-redis) and one cache (redis) in production.
+if os.getenv('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.getenv('REDIS_URL')]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+    }
+
+# --- Cache ---
+# Per-process memory by default; with REDIS_URL every process shares one cache
+# so invalidations (e.g. of notification summaries) are seen everywhere.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        },
+    }
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }
 
 # --- Database ---
 DATABASES = {
@@ -106,6 +144,68 @@ AUTH_USER_MODEL = 'core.User'
 
 # --- File Upload Sizes ---
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
-
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+# Multipart files above this spill to a temp file instead of worker memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(2.5 * 1024 * 1024)  # 2.5 MB
+
+# --- Chunked uploads (see core/uploads.py) ---
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024     # Bytes per chunk; the client sends each with its SHA-256
+UPLOAD_MAX_SIZE = 512 * 1024 * 1024     # Largest file accepted through a session
+UPLOAD_USER_QUOTA = 1024 * 1024 * 1024  # Bytes one user may hold in unclaimed sessions at once
+UPLOAD_STREAM_BLOCK_SIZE = 64 * 1024    # Bytes read from the request at a time
+UPLOAD_SESSION_TTL = 24 * 60 * 60       # Seconds an untouched session is kept (purge_upload_sessions)
+UPLOAD_SESSION_DIR = os.getenv('UPLOAD_SESSION_DIR', '')  # Defaults to MEDIA_ROOT/upload_sessions
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# --- Home feed timelines (see core/timeline.py) ---
+# Swap for 'core.timeline.LocMemTimelineBackend' to keep timelines in process memory.
+TIMELINE_BACKEND = os.getenv('TIMELINE_BACKEND', 'core.timeline.DatabaseTimelineBackend')
+TIMELINE_MAX_LENGTH = 500       # Posts kept per profile timeline
+TIMELINE_BACKFILL_LENGTH = 50   # Posts copied in when two profiles connect
+
+# --- Reference data (see core/reference_data.py) ---
+# Seconds a cached Subject/Skill/Badge version stamp is trusted; only matters
+# for the per-process LocMem cache, since shared caches are invalidated directly
+REFERENCE_DATA_VERSION_TIMEOUT = 60
+
+# --- Connection suggestions (see core/recommendations.py) ---
+SUGGESTION_TOP_K = 20   # Precomputed "people you may know" entries kept per profile
+
+# --- Notifications (see core/notifications.py) ---
+NOTIFICATION_COALESCE_WINDOW = 15 * 60  # Seconds an unread notification keeps absorbing repeats
+# Write notifications from a background thread; set to false to write inline after commit
+NOTIFICATION_DISPATCH_ASYNC = os.getenv('NOTIFICATION_DISPATCH_ASYNC', 'true').lower() == 'true'
+NOTIFICATION_SUMMARY_TIMEOUT = 5 * 60   # Seconds the navbar unread count/dropdown stays cached
+
+# --- Post search (see core/search.py) ---
+# Empty picks the backend for the database: SQLite FTS5, PostgreSQL tsvector,
+# or LIKE matching elsewhere. Set a dotted path to force one.
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', '')
+SEARCH_PAGE_SIZE = 10
+
+# --- Post card fragment cache (see core/post_cards.py) ---
+POST_CARD_CACHE_TIMEOUT = 60 * 60   # Seconds a rendered card fragment is kept; 0 disables the cache
+
+# --- Post view counts (see core/view_counter.py) ---
+VIEW_COUNT_DEDUP_WINDOW = 30 * 60   # Seconds a viewer counts once per post
+VIEW_COUNT_FLUSH_INTERVAL = 10      # Seconds between batched writes of buffered views
+VIEW_COUNT_FLUSH_SIZE = 500         # Distinct posts buffered before an early flush
+
+# --- Image derivatives (see core/images.py) ---
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))   # Threads resizing uploads
+# Resize in the worker pool after commit; set to false to resize inline (tests, commands)
+IMAGE_PROCESSING_ASYNC = os.getenv('IMAGE_PROCESSING_ASYNC', 'true').lower() == 'true'
+
+# --- Request instrumentation (see core/instrumentation.py) ---
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+INSTRUMENTATION_HEADERS = DEBUG     # Send Server-Timing and X-Query-* headers with each response
+INSTRUMENTATION_WINDOW = 200        # Recent requests kept per URL name for /system/performance/
+# Query budgets by URL name, for views without @query_budget: {'url_name': 12} or
+# {'url_name': {'queries': 12, 'duplicates': 0}}
+QUERY_BUDGETS = {}
+# Raise QueryBudgetExceeded instead of logging a warning (turn on in test runs)
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'false').lower() == 'true'
+
+# --- Challenge leaderboards (see core/leaderboard.py) ---
+LEADERBOARD_CACHE_SIZE = 100        # Top entries per challenge kept in the cache and updated in place
+LEADERBOARD_CACHE_TIMEOUT = 60 * 60 # Seconds before an untouched cached top is dropped
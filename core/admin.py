@@ -28,7 +28,7 @@ class ProfileAdmin(admin.ModelAdmin):
 
 # Notification admin with content object link
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('recipient', 'sender', 'notification_type', 'read', 'created_at')
+    list_display = ('recipient', 'sender', 'notification_type', 'count', 'read', 'created_at')
     list_filter = ('notification_type', 'read')
     search_fields = ('recipient__username', 'sender__username', 'message')
     date_hierarchy = 'created_at'
@@ -55,15 +55,12 @@ class ConnectionAdmin(admin.ModelAdmin):
 
 # Post admin with rich content display
 class PostAdmin(admin.ModelAdmin):
-    list_display = ('author', 'title', 'content_type', 'created_at')
+    list_display = ('author', 'title', 'content_type', 'like_count', 'comment_count', 'created_at')
     list_filter = ('content_type', 'is_featured', 'is_approved')
     search_fields = ('author__user__username', 'title', 'content')
     date_hierarchy = 'created_at'
-    readonly_fields = ('like_count',)
-
-    def like_count(self, obj):
-        return obj.likes.count()
-    like_count.short_description = 'Likes'
+    # Maintained by core/counters.py; never edited by hand
+    readonly_fields = ('like_count', 'comment_count', 'share_count')
 
 # Inline for skills
 '''class SkillInline(admin.TabularInline):
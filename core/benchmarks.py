@@ -0,0 +1,180 @@
+# core/benchmarks.py
+
+"""
+Timings of the key views, for regression comparison between commits.
+
+``run_benchmarks`` signs in as two personas:
+- "typical": the median user by connection count
+- "heavy": the most connected user, where N+1 patterns and unbounded
+  lists hurt most
+It requests each view in BENCHMARK_VIEWS as each persona. The first
+request is reported on its own as the cold time. Warm-up requests follow,
+and then ``repeat`` timed ones. Wall time is taken around the test
+client call. Query counts, SQL time and template time come from
+core/instrumentation.py when its middleware is installed.
+
+The result is plain JSON-ready data. ``compare`` diffs two results and
+lists the views whose median time or query count went up.
+``manage.py benchmark_views`` seeds a throwaway database per scale with
+core/seeding.py, runs this, and writes the JSON.
+"""
+
+import platform
+import time
+from collections import namedtuple
+
+import django
+from django.db import connection
+from django.db.models import Q
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from . import lookups, reference_data, timeline, view_counter
+from .conversations import inbox_for
+from .models import Comment, Connection, Message, Notification, Post, Profile, Submission, User
+
+Subject = namedtuple('Subject', 'persona user partner')
+
+BENCHMARK_VIEWS = [
+    ('home_view', lambda subject: reverse('home')),
+    ('profile_view', lambda subject: reverse('profile_view', args=[subject.user.username])),
+    ('chat_list_history', lambda subject: reverse('chat_list_history')),
+    ('get_messages', lambda subject: subject.partner and reverse('api_get_messages', args=[subject.partner])),
+    ('network_view', lambda subject: reverse('network')),
+    ('all_notifications', lambda subject: reverse('all_notifications')),
+]
+
+ROW_COUNTS = {
+    'users': lambda: User.objects.count(),
+    'connections': lambda: Connection.objects.filter(accepted=True).count(),
+    'posts': lambda: Post.objects.count(),
+    'likes': lambda: Post.likes.through.objects.count(),
+    'comments': lambda: Comment.objects.count(),
+    'messages': lambda: Message.objects.count(),
+    'notifications': lambda: Notification.objects.count(),
+    'submissions': lambda: Submission.objects.count(),
+}
+
+
+def reset_process_state():
+    """Drops per-process caches that would outlive a switch to another database."""
+    reference_data.reset()
+    lookups.reset_indexes()
+    timeline.reset_timeline_backend()
+    view_counter.reset_buffer()
+
+
+def row_counts():
+    return {name: count() for name, count in ROW_COUNTS.items()}
+
+
+def _partner(user):
+    conversation = inbox_for(user).first()
+    if conversation is None:
+        return None
+    partner = conversation.user_high if conversation.user_low_id == user.pk else conversation.user_low
+    return partner.username
+
+
+def pick_subjects():
+    """The "typical" and "heavy" personas, by connection count."""
+    profiles = Profile.objects.filter(Q(user__is_superuser=False)).order_by('connection_count', 'pk')
+    total = profiles.count()
+    if not total:
+        return []
+    chosen = [('typical', profiles[total // 2]), ('heavy', profiles[total - 1])]
+    return [Subject(persona, profile.user, _partner(profile.user)) for persona, profile in chosen]
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _request(client, url):
+    started = time.perf_counter()
+    response = client.get(url)
+    wall_ms = (time.perf_counter() - started) * 1000
+    return response, wall_ms
+
+
+def time_view(client, url, repeat=5, warmup=1):
+    """Requests ``url`` until warm, then ``repeat`` more times; returns the timing summary."""
+    response, cold_ms = _request(client, url)
+    for _ in range(warmup):
+        _request(client, url)
+    walls = []
+    for _ in range(repeat):
+        response, wall_ms = _request(client, url)
+        walls.append(wall_ms)
+    walls.sort()
+    stats = getattr(response, 'instrumentation', None)
+    result = {
+        'url': url,
+        'status': response.status_code,
+        'cold_ms': round(cold_ms, 2),
+        'min_ms': round(walls[0], 2),
+        'p50_ms': round(_percentile(walls, 0.5), 2),
+        'p95_ms': round(_percentile(walls, 0.95), 2),
+        'mean_ms': round(sum(walls) / len(walls), 2),
+    }
+    if stats is not None:
+        result.update({
+            'queries': stats.queries,
+            'duplicate_queries': stats.duplicates,
+            'similar_queries': stats.similar,
+            'sql_ms': stats.sql_ms,
+            'template_ms': stats.template_ms,
+            'query_budget': stats.budget.max_queries if stats.budget else None,
+        })
+    return result
+
+
+def run_benchmarks(repeat=5, warmup=1):
+    """Times every view in BENCHMARK_VIEWS for each persona against the current database."""
+    results = []
+    for subject in pick_subjects():
+        client = Client()
+        client.force_login(subject.user)
+        for view, url_for in BENCHMARK_VIEWS:
+            url = url_for(subject)
+            if not url:
+                continue  # e.g. get_messages for a user with no conversations
+            result = time_view(client, url, repeat=repeat, warmup=warmup)
+            results.append({'view': view, 'persona': subject.persona, 'username': subject.user.username, **result})
+    return results
+
+
+def environment():
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'django': django.get_version(),
+        'python': platform.python_version(),
+    }
+
+
+def compare(current, baseline, tolerance=0.2, min_delta_ms=2.0):
+    """
+    Regressions of ``current`` against ``baseline``, both as written by
+    benchmark_views. A view regresses when its median time grew by more
+    than ``tolerance`` (and by at least ``min_delta_ms``), or when it ran
+    more queries than before.
+    """
+    def index(report):
+        return {
+            (run['scale'], result['view'], result['persona']): result
+            for run in report.get('runs', ()) for result in run['results']
+        }
+    before = index(baseline)
+    regressions = []
+    for key, result in sorted(index(current).items()):
+        old = before.get(key)
+        if old is None:
+            continue
+        label = '/'.join(key)
+        if result['p50_ms'] > old['p50_ms'] * (1 + tolerance) and result['p50_ms'] - old['p50_ms'] >= min_delta_ms:
+            regressions.append(f"{label}: p50 {old['p50_ms']}ms -> {result['p50_ms']}ms")
+        if result.get('queries') is not None and old.get('queries') is not None and result['queries'] > old['queries']:
+            regressions.append(f"{label}: {old['queries']} -> {result['queries']} queries")
+    return regressions
@@ -0,0 +1,161 @@
+# core/connections.py
+
+"""
+The connection graph and connection state between users.
+
+Accepted connections are mirrored into ConnectionEdge, one row per pair
+stored as (lower profile id, higher profile id), with each profile's degree
+in ``Profile.connection_count``. Connection's signals keep both in step, so
+"are A and B connected?" is one probe on the unique index and a degree is a
+column read, whichever side sent the request.
+
+``connection_statuses`` answers "connected / request sent / request
+received?" for a whole list of users (suggestion widgets, search results,
+post authors on a feed page) in two queries, instead of one or two queries
+per user. Templates look entries up by user id with the ``get_item`` filter.
+"""
+
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+
+from .models import Connection, ConnectionEdge, ConnectionRequest, Profile
+
+ConnectionStatus = namedtuple('ConnectionStatus', 'is_self is_connected request_sent request_received')
+
+NO_CONNECTION = ConnectionStatus(is_self=False, is_connected=False, request_sent=False, request_received=False)
+SELF = ConnectionStatus(is_self=True, is_connected=False, request_sent=False, request_received=False)
+
+
+def ordered_pair(profile_a_id, profile_b_id):
+    """Returns the pair as (low_id, high_id), the canonical key of a ConnectionEdge."""
+    return (profile_a_id, profile_b_id) if profile_a_id < profile_b_id else (profile_b_id, profile_a_id)
+
+
+def _adjust_degree(profile_ids, delta):
+    Profile.objects.filter(pk__in=profile_ids).update(
+        connection_count=Greatest(F('connection_count') + delta, Value(0))
+    )
+
+
+def add_edge(profile_a_id, profile_b_id):
+    """Records an accepted connection. Returns True if the pair was not connected before."""
+    if profile_a_id == profile_b_id:
+        return False
+    low_id, high_id = ordered_pair(profile_a_id, profile_b_id)
+    try:
+        with transaction.atomic():
+            ConnectionEdge.objects.create(profile_low_id=low_id, profile_high_id=high_id)
+            _adjust_degree([low_id, high_id], 1)
+    except IntegrityError:
+        # Already connected (e.g. accepted rows exist in both directions)
+        return False
+    return True
+
+
+def remove_edge(profile_a_id, profile_b_id):
+    """
+    Drops the pair's edge unless another accepted Connection row still
+    links them. Returns True if an edge was removed.
+    """
+    low_id, high_id = ordered_pair(profile_a_id, profile_b_id)
+    if Connection.objects.filter(creator_id=low_id, friend_id=high_id, accepted=True).exists() or \
+       Connection.objects.filter(creator_id=high_id, friend_id=low_id, accepted=True).exists():
+        return False
+    with transaction.atomic():
+        deleted, _ = ConnectionEdge.objects.filter(profile_low_id=low_id, profile_high_id=high_id).delete()
+        if deleted:
+            _adjust_degree([low_id, high_id], -1)
+    return bool(deleted)
+
+
+def disconnect(profile_a, profile_b):
+    """
+    Removes every accepted Connection row between the two profiles (the
+    edge and degrees follow via signals). Returns True if they were connected.
+    """
+    if not profile_a.is_connected_with(profile_b):
+        return False
+    # Two probes on Connection's unique (creator, friend) index rather than an OR
+    for creator, friend in ((profile_a, profile_b), (profile_b, profile_a)):
+        for connection in Connection.objects.filter(creator=creator, friend=friend, accepted=True):
+            connection.delete()
+    return True
+
+
+def rebuild_edges():
+    """Recomputes ConnectionEdge and every degree from Connection (repair). Returns the edge count."""
+    pairs = set()
+    for creator_id, friend_id in Connection.objects.filter(accepted=True).values_list('creator_id', 'friend_id').iterator():
+        if creator_id != friend_id:
+            pairs.add(ordered_pair(creator_id, friend_id))
+    degrees = {}
+    for low_id, high_id in pairs:
+        degrees[low_id] = degrees.get(low_id, 0) + 1
+        degrees[high_id] = degrees.get(high_id, 0) + 1
+
+    with transaction.atomic():
+        ConnectionEdge.objects.all().delete()
+        ConnectionEdge.objects.bulk_create(
+            [ConnectionEdge(profile_low_id=low_id, profile_high_id=high_id) for low_id, high_id in pairs],
+            batch_size=1000,
+        )
+        Profile.objects.exclude(pk__in=degrees).exclude(connection_count=0).update(connection_count=0)
+        drifted = [
+            profile for profile in Profile.objects.filter(pk__in=degrees).only('pk', 'connection_count')
+            if profile.connection_count != degrees[profile.pk]
+        ]
+        for profile in drifted:
+            profile.connection_count = degrees[profile.pk]
+        Profile.objects.bulk_update(drifted, ['connection_count'], batch_size=1000)
+    return len(pairs)
+
+
+def connection_statuses(viewer, user_ids):
+    """
+    Returns ``{user_id: ConnectionStatus}`` describing how ``viewer`` (a
+    User) relates to each of ``user_ids``. Always two queries, whatever the
+    number of ids.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    statuses = {user_id: NO_CONNECTION for user_id in user_ids}
+    if viewer is None or not viewer.is_authenticated:
+        return statuses
+    if viewer.pk in statuses:
+        statuses[viewer.pk] = SELF
+    others = user_ids - {viewer.pk}
+    if not others:
+        return statuses
+
+    # Profile's primary key is its user id, so edge profile ids are user ids
+    connected = set()
+    for low_id, high_id in ConnectionEdge.objects.filter(
+        Q(profile_low_id=viewer.pk, profile_high_id__in=others) | Q(profile_high_id=viewer.pk, profile_low_id__in=others)
+    ).values_list('profile_low_id', 'profile_high_id'):
+        connected.add(high_id if low_id == viewer.pk else low_id)
+
+    sent, received = set(), set()
+    for sender_id, receiver_id in ConnectionRequest.objects.filter(
+        Q(sender_id=viewer.pk, receiver_id__in=others) | Q(receiver_id=viewer.pk, sender_id__in=others),
+        status='pending',
+    ).values_list('sender_id', 'receiver_id'):
+        if sender_id == viewer.pk:
+            sent.add(receiver_id)
+        else:
+            received.add(sender_id)
+
+    for user_id in others:
+        statuses[user_id] = ConnectionStatus(
+            is_self=False,
+            is_connected=user_id in connected,
+            request_sent=user_id in sent,
+            request_received=user_id in received,
+        )
+    return statuses
+
+
+def connection_status(viewer, user_id):
+    """Single-user convenience wrapper around ``connection_statuses``."""
+    return connection_statuses(viewer, [user_id])[user_id]
@@ -1,63 +1,72 @@
 # consumers.py
 import json
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.contrib.auth import get_user_model
+
+from .messaging import send_message, user_group_name
+
+User = get_user_model()
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    One socket per open chat window. The sending side is always the
+    authenticated ``scope['user']``; the URL only names the other
+    participant, which is resolved once here and reused for every message.
+    """
+
     async def connect(self):
-        self.sender = self.scope['url_route']['kwargs']['sender']
-        self.recipient = self.scope['url_route']['kwargs']['recipient']
-        self.room_name = f'chat_{min(self.sender, self.recipient)}_{max(self.sender, self.recipient)}'
-        
+        self.user = self.scope.get('user')
+        kwargs = self.scope['url_route']['kwargs']
+
+        if self.user is None or not self.user.is_authenticated:
+            await self.close(code=4003)
+            return
+        # Legacy /ws/chat/<sender>/<recipient>/ URLs must name the logged-in user
+        if kwargs.get('sender') not in (None, self.user.username):
+            await self.close(code=4003)
+            return
+
+        try:
+            self.recipient = await User.objects.aget(username=kwargs['recipient'])
+        except User.DoesNotExist:
+            await self.close(code=4004)
+            return
+
+        self.participants = sorted((self.user.pk, self.recipient.pk))
+        self.group_name = user_group_name(self.user.pk)
         await self.channel_layer.group_add(
-            self.room_name,
+            self.group_name,
             self.channel_name
         )
-        
+
         await self.accept()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(
-            self.room_name,
-            self.channel_name
-        )
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(
+                self.group_name,
+                self.channel_name
+            )
 
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
-        message = text_data_json['message']
-        
-        # Save message to database
-        from .models import Message
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        
-        sender = await User.objects.aget(username=self.sender)
-        recipient = await User.objects.aget(username=self.recipient)
-        
-        msg = await Message.objects.acreate(
-            sender=sender,
-            recipient=recipient,
-            content=message['content']
-        )
-        
-        # Send message to room group
-        await self.channel_layer.group_send(
-            self.room_name,
-            {
-                'type': 'chat_message',
-                'message': {
-                    'id': str(msg.id),
-                    'sender': self.sender,
-                    'content': message['content'],
-                    'timestamp': msg.timestamp.isoformat(),
-                    'isCurrentUser': False
-                }
-            }
-        )
+        message = text_data_json.get('message') or {}
+        content = (message.get('content') or '').strip()
+        if not content:
+            return
+
+        # Stored and fanned out to both users' sockets (including this one)
+        await database_sync_to_async(send_message)(self.user, self.recipient, content)
 
     async def chat_message(self, event):
-        message = event['message']
-        
+        # The user group carries all of this user's conversations
+        if event.get('participants') != self.participants:
+            return
+
         # Send message to WebSocket
         await self.send(text_data=json.dumps({
-            'message': message
-        }))
\ No newline at end of file
+            'message': event['message']
+        }))
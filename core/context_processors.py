@@ -1,4 +1,9 @@
 # core/context_processors.py
+from django.utils.functional import SimpleLazyObject
+
+from .notifications import get_notification_summary
+
+
 def navigation(request):
     nav_items = {
         'super_super': [
@@ -29,4 +34,16 @@ def navigation(request):
             'main_nav': nav_items.get(user_role, nav_items['default']),
             'admin_nav': nav_items.get(user_role, []) if user_role in ['super_super', 'super', 'admin'] else []
         }
-    return {'main_nav': [], 'admin_nav': []}
\ No newline at end of file
+    return {'main_nav': [], 'admin_nav': []}
+
+
+def notifications(request):
+    """
+    Navbar notification badge and dropdown. Lazy, so pages that never render
+    them pay nothing, and cached (see core/notifications.py) so pages that do
+    pay one cache hit.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'notification_summary': SimpleLazyObject(lambda: get_notification_summary(user))}
@@ -0,0 +1,169 @@
+# core/conversations.py
+
+"""
+Maintenance of the Conversation summary table.
+
+Each pair of users who have exchanged messages has one Conversation row
+holding the latest message (id, time, preview, sender) and an unread
+counter per participant. Counters move with atomic F() updates so two
+messages arriving at once cannot lose an increment; ``rebuild_conversations``
+recomputes everything from Message for backfills and repairs.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Value
+from django.db.models.functions import Greatest, Least
+
+from .models import Conversation, Message
+from .notifications import mark_notifications_read
+
+PREVIEW_LENGTH = 100
+
+
+def ordered_pair(user_a_id, user_b_id):
+    """Returns the pair as (low_id, high_id), the canonical key of a Conversation."""
+    return (user_a_id, user_b_id) if user_a_id < user_b_id else (user_b_id, user_a_id)
+
+
+def unread_field_for(conversation_low_id, user_id):
+    return 'unread_low' if user_id == conversation_low_id else 'unread_high'
+
+
+def message_preview(message):
+    if message.content:
+        return message.content[:PREVIEW_LENGTH]
+    if message.file_name:
+        return f"[Attachment] {message.file_name}"[:PREVIEW_LENGTH]
+    return ''
+
+
+def get_or_create_conversation(user_a_id, user_b_id):
+    low_id, high_id = ordered_pair(user_a_id, user_b_id)
+    try:
+        with transaction.atomic():
+            conversation, _ = Conversation.objects.get_or_create(user_low_id=low_id, user_high_id=high_id)
+    except IntegrityError:
+        # Another request created the row between our SELECT and INSERT
+        conversation = Conversation.objects.get(user_low_id=low_id, user_high_id=high_id)
+    return conversation
+
+
+def record_message(message):
+    """Folds a newly created message into its conversation summary."""
+    conversation = get_or_create_conversation(message.sender_id, message.recipient_id)
+    low_id, _ = ordered_pair(message.sender_id, message.recipient_id)
+    unread_field = unread_field_for(low_id, message.recipient_id)
+
+    conversations = Conversation.objects.filter(pk=conversation.pk)
+    # Only move the "last message" pointer forward, never backwards
+    conversations.filter(
+        Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.timestamp)
+    ).update(
+        last_message=message,
+        last_message_at=message.timestamp,
+        last_message_preview=message_preview(message),
+        last_sender_id=message.sender_id,
+    )
+    if not message.read:
+        conversations.update(**{unread_field: F(unread_field) + 1})
+
+
+def message_read(message):
+    """Decrements the recipient's unread counter after one message is marked read."""
+    low_id, high_id = ordered_pair(message.sender_id, message.recipient_id)
+    unread_field = unread_field_for(low_id, message.recipient_id)
+    Conversation.objects.filter(user_low_id=low_id, user_high_id=high_id)\
+                        .update(**{unread_field: Greatest(F(unread_field) - 1, Value(0))})
+
+
+def mark_conversation_read(user, partner):
+    """
+    Marks every unread message from ``partner`` to ``user`` as read, along
+    with the (possibly coalesced) message notifications for them, and zeroes
+    ``user``'s unread counter. Returns the number of messages updated.
+    """
+    updated = Message.objects.filter(sender=partner, recipient=user, read=False).update(read=True)
+    if updated:
+        mark_notifications_read(user, sender=partner, notification_type='message')
+    low_id, high_id = ordered_pair(user.pk, partner.pk)
+    unread_field = unread_field_for(low_id, user.pk)
+    Conversation.objects.filter(user_low_id=low_id, user_high_id=high_id).exclude(**{unread_field: 0})\
+                        .update(**{unread_field: 0})
+    return updated
+
+
+def message_deleted(message):
+    """Keeps the summary consistent after a message row is deleted."""
+    low_id, high_id = ordered_pair(message.sender_id, message.recipient_id)
+    conversation = Conversation.objects.filter(user_low_id=low_id, user_high_id=high_id).first()
+    if conversation is None:
+        return
+    if not message.read:
+        unread_field = unread_field_for(low_id, message.recipient_id)
+        setattr(conversation, unread_field, max(getattr(conversation, unread_field) - 1, 0))
+    if conversation.last_message_id in (None, message.pk):
+        latest = Message.objects.filter(
+            Q(sender_id=low_id, recipient_id=high_id) | Q(sender_id=high_id, recipient_id=low_id)
+        ).order_by('-timestamp', '-id').first()
+        if latest is None:
+            conversation.delete()
+            return
+        conversation.last_message = latest
+        conversation.last_message_at = latest.timestamp
+        conversation.last_message_preview = message_preview(latest)
+        conversation.last_sender_id = latest.sender_id
+    conversation.save()
+
+
+def inbox_for(user):
+    """Queryset of ``user``'s conversations, most recent first, ready to paginate."""
+    return Conversation.objects.filter(Q(user_low=user) | Q(user_high=user))\
+                               .select_related('user_low__profile', 'user_high__profile')\
+                               .order_by('-last_message_at', '-id')
+
+
+def rebuild_conversations(batch_size=1000):
+    """
+    Recomputes every Conversation from the Message table (backfill/repair).
+    Returns the number of conversations written.
+    """
+    pairs = Message.objects.order_by()\
+        .annotate(low=Least('sender_id', 'recipient_id'), high=Greatest('sender_id', 'recipient_id'))\
+        .values('low', 'high')\
+        .annotate(
+            last_id=Max('id'),
+            unread_low=Count('id', filter=Q(read=False, recipient_id=F('low'))),
+            unread_high=Count('id', filter=Q(read=False, recipient_id=F('high'))),
+        )
+
+    written = 0
+    with transaction.atomic():
+        Conversation.objects.all().delete()
+        batch = []
+        for row in pairs.iterator():
+            batch.append(row)
+            if len(batch) >= batch_size:
+                written += _write_conversations(batch)
+                batch = []
+        if batch:
+            written += _write_conversations(batch)
+    return written
+
+
+def _write_conversations(rows):
+    last_messages = Message.objects.in_bulk([row['last_id'] for row in rows])
+    conversations = []
+    for row in rows:
+        last = last_messages[row['last_id']]
+        conversations.append(Conversation(
+            user_low_id=row['low'],
+            user_high_id=row['high'],
+            last_message=last,
+            last_message_at=last.timestamp,
+            last_message_preview=message_preview(last),
+            last_sender_id=last.sender_id,
+            unread_low=row['unread_low'],
+            unread_high=row['unread_high'],
+        ))
+    Conversation.objects.bulk_create(conversations)
+    return len(conversations)
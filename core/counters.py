@@ -0,0 +1,75 @@
+# core/counters.py
+
+"""
+Denormalised engagement counters on Post (like_count, comment_count,
+share_count).
+
+Writers adjust counters with a single atomic ``UPDATE ... SET x = x + n``
+so concurrent likes never lose increments and the row is never re-saved.
+``reconcile_post_counters`` recomputes the true values in id-ordered
+batches and rewrites only the rows that have drifted (e.g. after admin
+edits or deletes that bypassed these helpers).
+"""
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from . import post_cards
+from .models import Comment, Post
+
+COUNTER_FIELDS = ('like_count', 'comment_count', 'share_count')
+
+
+def adjust_post_counter(post_id, field, delta):
+    """Atomically adds ``delta`` (which may be negative) to one counter, never going below zero."""
+    if field not in COUNTER_FIELDS:
+        raise ValueError(f"Unknown post counter: {field}")
+    if delta:
+        Post.objects.filter(pk=post_id).update(**{field: Greatest(F(field) + delta, Value(0))})
+        post_cards.invalidate(post_id)  # Cached cards show the counts
+
+
+def _count_subquery(queryset):
+    counts = queryset.order_by().values('post_id').annotate(total=Count('*')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def _actual_counts(posts):
+    likes = Post.likes.through.objects.filter(post_id=OuterRef('pk'))
+    comments = Comment.objects.filter(post_id=OuterRef('pk'))
+    return posts.annotate(
+        actual_like_count=_count_subquery(likes),
+        actual_comment_count=_count_subquery(comments),
+    )
+
+
+def reconcile_post_counters(batch_size=500, dry_run=False):
+    """
+    Repairs drifted like/comment counters. Walks posts by primary key in
+    batches so memory stays flat, and only writes rows whose stored value
+    differs from the live count. Returns the number of posts repaired.
+    (share_count has no backing table yet, so it is left untouched.)
+    """
+    repaired = 0
+    last_id = 0
+    while True:
+        batch = list(
+            _actual_counts(Post.objects.filter(pk__gt=last_id))
+            .order_by('pk')
+            .only('pk', 'like_count', 'comment_count')[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].pk
+
+        drifted = []
+        for post in batch:
+            if post.like_count != post.actual_like_count or post.comment_count != post.actual_comment_count:
+                post.like_count = post.actual_like_count
+                post.comment_count = post.actual_comment_count
+                drifted.append(post)
+
+        if drifted and not dry_run:
+            Post.objects.bulk_update(drifted, ['like_count', 'comment_count'])
+        repaired += len(drifted)
+    return repaired
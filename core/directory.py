@@ -0,0 +1,114 @@
+# core/directory.py
+
+"""
+The "Grow your network" member directory.
+
+Everything is filtered, annotated and paginated in the database. Members
+the viewer is already connected to are left out with two anti-joins on
+ConnectionEdge. Pending requests in either direction become boolean
+``Exists`` annotations, so no per-row queries are needed. Skill filters go
+through the Profile.skills M2M as an ``Exists`` subquery, which avoids a
+join that would need ``distinct()``. Skill names are matched against the
+cached Skill table (core/reference_data.py), so the subquery filters on
+skill ids rather than a case-insensitive scan of core_skill.
+
+Pages are walked in username order with a keyset cursor (the last or first
+username on the page) instead of an OFFSET. A page is one range scan on
+the unique username index, so page 500 costs the same as page 1, and no
+COUNT query is needed.
+"""
+
+import base64
+
+from django.db.models import Exists, OuterRef
+
+from . import reference_data
+from .feed import InvalidCursor
+from .models import ConnectionEdge, ConnectionRequest, Profile, User
+from .people_search import search_users
+
+DIRECTORY_PAGE_SIZE = 12
+
+ProfileSkill = Profile.skills.through
+
+
+def encode_cursor(username):
+    return base64.urlsafe_b64encode(username.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Reverses ``encode_cursor``. Raises ``InvalidCursor`` on bad input."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return base64.urlsafe_b64decode(padded.encode()).decode()
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Malformed directory cursor: {cursor!r}") from e
+
+
+def parse_skills(skills_query):
+    """Splits a "Python, Design" style filter into distinct skill names."""
+    names, seen = [], set()
+    for name in (skills_query or '').split(','):
+        name = name.strip()
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+def directory_queryset(viewer, query=None, skills=None):
+    """
+    Members ``viewer`` is not yet connected to, narrowed by a free-text
+    ``query`` (word prefixes, see core/people_search.py) and a list of
+    skill names (any of them matches). Each user carries
+    ``connection_request_sent`` and ``connection_request_received``.
+    """
+    users = (
+        User.objects.filter(profile__isnull=False)
+                    .exclude(pk=viewer.pk)
+                    .exclude(pk__in=ConnectionEdge.objects.filter(profile_low_id=viewer.pk).values('profile_high_id'))
+                    .exclude(pk__in=ConnectionEdge.objects.filter(profile_high_id=viewer.pk).values('profile_low_id'))
+                    .annotate(
+                        connection_request_sent=Exists(ConnectionRequest.objects.filter(
+                            sender_id=viewer.pk, receiver_id=OuterRef('pk'), status='pending')),
+                        connection_request_received=Exists(ConnectionRequest.objects.filter(
+                            sender_id=OuterRef('pk'), receiver_id=viewer.pk, status='pending')),
+                    )
+    )
+
+    if query:
+        users = search_users(query, users)
+
+    if skills:
+        # Names resolve against the cached Skill table, so the query filters by indexed ids
+        wanted = {name.lower() for name in skills}
+        skill_ids = [skill.pk for skill in reference_data.get_all('skill') if skill.name.lower() in wanted]
+        users = users.filter(Exists(ProfileSkill.objects.filter(profile_id=OuterRef('pk'), skill_id__in=skill_ids)))
+    return users
+
+
+def get_directory_page(queryset, after=None, before=None, page_size=DIRECTORY_PAGE_SIZE):
+    """
+    Returns ``(users, prev_cursor, next_cursor)`` for one page of
+    ``queryset`` in username order. ``after`` continues forwards from a
+    ``next_cursor``, ``before`` goes back from a ``prev_cursor``. A cursor is
+    ``None`` when there is nothing further in that direction. One extra row
+    is fetched to find out whether there is another page.
+    """
+    queryset = queryset.select_related('profile').prefetch_related('profile__skills')
+    if before:
+        users = list(queryset.filter(username__lt=decode_cursor(before)).order_by('-username')[:page_size + 1])
+        has_more_before = len(users) > page_size
+        users = users[:page_size][::-1]
+        has_more_after = True
+    else:
+        if after:
+            queryset = queryset.filter(username__gt=decode_cursor(after))
+        users = list(queryset.order_by('username')[:page_size + 1])
+        has_more_after = len(users) > page_size
+        users = users[:page_size]
+        has_more_before = bool(after)
+
+    prev_cursor = encode_cursor(users[0].username) if users and has_more_before else None
+    next_cursor = encode_cursor(users[-1].username) if users and has_more_after else None
+    return users, prev_cursor, next_cursor
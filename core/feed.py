@@ -0,0 +1,123 @@
+# core/feed.py
+
+"""
+Keyset ("cursor") pagination for the home feed.
+
+Posts are walked in ``(-created_at, -id)`` order. Each page hands back an
+opaque cursor pointing at its last post, and the next page starts strictly
+after that position. Because the query is a bounded range scan on the
+``-created_at`` index instead of an OFFSET, every scroll step costs
+O(page size) however deep the user has scrolled.
+
+Two sources share the same cursor format: the global feed over all posts
+and the reader's precomputed timeline (see core/timeline.py).
+"""
+
+import base64
+from datetime import datetime
+
+from django.db.models import Prefetch, Q
+
+from .models import Comment, Post
+from .timeline import get_timeline_backend
+
+FEED_PAGE_SIZE = 10
+MAX_FEED_PAGE_SIZE = 50
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+def encode_cursor(created_at, pk):
+    """Packs a ``(created_at, id)`` position into a URL-safe token."""
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Reverses ``encode_cursor``. Raises ``InvalidCursor`` on bad input."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Malformed feed cursor: {cursor!r}") from e
+
+
+def feed_queryset():
+    """
+    Base queryset for feed rendering, with the relations post cards need.
+    Comments and their authors come in one query per page, for the cards
+    and for the fragment keys core.post_cards.prime builds from them.
+    """
+    return Post.objects.select_related('author__user', 'subject').prefetch_related(
+        Prefetch('comments', queryset=Comment.objects.select_related('user__user')),
+    )
+
+
+def get_feed_page(queryset=None, cursor=None, page_size=FEED_PAGE_SIZE):
+    """
+    Returns ``(posts, next_cursor)`` for one page of the feed.
+
+    ``next_cursor`` is ``None`` once the end of the feed has been reached.
+    One extra row is fetched to tell whether another page exists, so no
+    COUNT query is ever needed.
+    """
+    if queryset is None:
+        queryset = feed_queryset()
+    page_size = max(1, min(int(page_size), MAX_FEED_PAGE_SIZE))
+
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+
+    posts = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(posts) > page_size:
+        posts = posts[:page_size]
+        last = posts[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return posts, next_cursor
+
+
+def get_timeline_page(profile, cursor=None, page_size=FEED_PAGE_SIZE):
+    """
+    Same contract as ``get_feed_page`` but reads ``profile``'s precomputed
+    timeline: one range scan for the ids, one ``in_bulk`` for the posts.
+    """
+    page_size = max(1, min(int(page_size), MAX_FEED_PAGE_SIZE))
+    before = decode_cursor(cursor) if cursor else None
+
+    entries = get_timeline_backend().fetch(profile.pk, before=before, limit=page_size + 1)
+    has_more = len(entries) > page_size
+    entries = entries[:page_size]
+
+    posts_by_id = feed_queryset().in_bulk([post_id for _, post_id in entries])
+    # Entries for posts deleted since fan-out are skipped rather than failing the page.
+    posts = [posts_by_id[post_id] for _, post_id in entries if post_id in posts_by_id]
+
+    next_cursor = None
+    if has_more:
+        created_at, post_id = entries[-1]
+        next_cursor = encode_cursor(created_at, post_id)
+    return posts, next_cursor
+
+
+def get_home_feed_page(profile, source=None, cursor=None, page_size=FEED_PAGE_SIZE):
+    """
+    Returns ``(posts, next_cursor, source)`` for the home feed.
+
+    Readers get their personalised timeline; when it is empty (a new member
+    with no connections yet) the first page falls back to the global feed.
+    The chosen ``source`` is echoed back so later pages stay on the same one.
+    """
+    if source != 'global':
+        posts, next_cursor = get_timeline_page(profile, cursor, page_size)
+        if posts or cursor or source == 'timeline':
+            return posts, next_cursor, 'timeline'
+    posts, next_cursor = get_feed_page(cursor=cursor, page_size=page_size)
+    return posts, next_cursor, 'global'
@@ -7,6 +7,8 @@ from .models import (
     Opportunity, Comment, Submission
 )
 from .models import User
+from .lookups import parse_skill_names, set_profile_skills
+from .reference_data import ReferenceChoiceField
 from django.core.validators import URLValidator
 
 # Authentication Forms
@@ -48,64 +50,53 @@ class CustomUserChangeForm(UserChangeForm):
 
 # Profile Forms
 class ProfileForm(forms.ModelForm):
+    # Free text, resolved to Skill rows in bulk on save (see core/lookups.py)
     skills = forms.CharField(
         required=False,
         widget=forms.TextInput(attrs={
             'class': 'form-control',
-            'placeholder': 'Comma-separated list (e.g., Python, Debate, Machine Learning)'
+            'placeholder': 'Comma-separated list (e.g., Python, Debate, Machine Learning)',
+            'autocomplete': 'off',
         })
     )
     
     class Meta:
         model = Profile
-        fields = [
-            'profile_pic', 'bio', 'education_level', 
-            'institution', 'graduation_year', 'location',
-            'website', 'linkedin', 'github', 'skills', 'achievements'
-        ]
+        # Only the fields edit_profile.html renders; a field left out of the
+        # page would be blanked on every save
+        fields = ['profile_pic', 'bio', 'location', 'birth_date', 'website']
         widgets = {
             'bio': forms.Textarea(attrs={
                 'class': 'form-control',
                 'rows': 3
             }),
-            'education_level': forms.Select(attrs={'class': 'form-select'}),
-            'institution': forms.TextInput(attrs={'class': 'form-control'}),
-            'graduation_year': forms.NumberInput(attrs={
-                'class': 'form-control',
-                'min': 1900,
-                'max': 2100
-            }),
             'location': forms.TextInput(attrs={'class': 'form-control'}),
+            'birth_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'website': forms.URLInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'https://'
             }),
-            'linkedin': forms.URLInput(attrs={
-                'class': 'form-control',
-                'placeholder': 'https://linkedin.com/in/username'
-            }),
-            'github': forms.URLInput(attrs={
-                'class': 'form-control',
-                'placeholder': 'https://github.com/username'
-            }),
-            'achievements': forms.Textarea(attrs={
-                'class': 'form-control',
-                'rows': 3,
-                'placeholder': 'List your notable achievements'
-            }),
         }
 
-    def clean_graduation_year(self):
-        year = self.cleaned_data.get('graduation_year')
-        if year and (year < 1900 or year > 2100):
-            raise ValidationError("Please enter a valid year between 1900-2100")
-        return year
-
-    def clean_linkedin(self):
-        linkedin = self.cleaned_data.get('linkedin')
-        if linkedin and 'linkedin.com' not in linkedin:
-            raise ValidationError("Please enter a valid LinkedIn URL")
-        return linkedin
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk and not self.is_bound:
+            self.initial['skills'] = ', '.join(skill.name for skill in self.instance.skills.all())
+
+    def clean_skills(self):
+        return parse_skill_names(self.cleaned_data.get('skills'))
+
+    def save(self, commit=True):
+        profile = super().save(commit=commit)
+        if commit:
+            set_profile_skills(profile, self.cleaned_data['skills'])
+        else:
+            save_m2m = self.save_m2m
+            def save_m2m_and_skills():
+                save_m2m()
+                set_profile_skills(profile, self.cleaned_data['skills'])
+            self.save_m2m = save_m2m_and_skills
+        return profile
 
 # Content Forms
 from django.core.validators import FileExtensionValidator
@@ -113,8 +104,12 @@ class PostForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
-        # Show all subjects ordered by name, regardless of user
-        self.fields['subject'].queryset = Subject.objects.all().order_by('name')
+
+    # All subjects ordered by name, served from the reference-data cache
+    subject = ReferenceChoiceField('subject', widget=forms.Select(attrs={
+        'class': 'form-select',
+        'id': 'id_subject'
+    }))
 
     class Meta:
         model = Post
@@ -130,10 +125,6 @@ class PostForm(forms.ModelForm):
                 'placeholder': 'Write your content here...'
             }),
             'content_type': forms.Select(attrs={'class': 'form-select'}),
-            'subject': forms.Select(attrs={
-                'class': 'form-select',
-                'id': 'id_subject'
-            }),
             'video_url': forms.URLInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'https://youtube.com/watch?v=...'
@@ -293,6 +284,9 @@ class CommentForm(forms.ModelForm):
         }
 
 class SubmissionForm(forms.ModelForm):
+    # Id of a completed chunked upload, used instead of ``file`` for large files (see core/uploads.py)
+    upload_id = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Submission
         fields = ['content', 'file']
@@ -310,6 +304,8 @@ class SubmissionForm(forms.ModelForm):
 
 # Subject Form
 class SubjectForm(forms.ModelForm):
+    parent = ReferenceChoiceField('subject', required=False, widget=forms.Select(attrs={'class': 'form-select'}))
+
     class Meta:
         model = Subject
         fields = ['name', 'description', 'parent', 'icon']
@@ -319,7 +315,6 @@ class SubjectForm(forms.ModelForm):
                 'class': 'form-control',
                 'rows': 3
             }),
-            'parent': forms.Select(attrs={'class': 'form-select'}),
             'icon': forms.TextInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'Font Awesome icon class (e.g., fa-math)'
@@ -335,13 +330,14 @@ class PostSearchForm(forms.Form):
             'placeholder': 'Search posts...'
         })
     )
-    subject = forms.ModelChoiceField(
-        queryset=Subject.objects.all(),
+    subject = ReferenceChoiceField(
+        'subject',
         required=False,
+        empty_label='All subjects',
         widget=forms.Select(attrs={'class': 'form-select'})
     )
     content_type = forms.ChoiceField(
-        choices=Post.CONTENT_TYPES,
+        choices=[('', 'All types')] + Post.CONTENT_TYPES,
         required=False,
         widget=forms.Select(attrs={'class': 'form-select'})
     )
@@ -385,16 +381,6 @@ class SystemSettingsForm(forms.Form):
 
 
 
-from django import forms
-from .models import Profile
-
-class ProfileForm(forms.ModelForm):
-    class Meta:
-        model = Profile
-        fields = ['profile_pic', 'bio', 'location', 'birth_date']  # Add your actual profile fields
-
-
-
 from django import forms
 from .models import Message, Project
 
@@ -0,0 +1,306 @@
+# core/images.py
+
+"""
+Resized derivatives of uploaded images.
+
+Profile pictures, cover photos, post images and project images are served
+as small, fixed-size renditions instead of the original upload. Each
+rendition is written twice, as WebP and as JPEG. Pillow applies the EXIF
+orientation, resizes the image and saves it without metadata, so GPS tags
+and camera data never reach the browser.
+
+Every image field has a ``<field>_variants`` JSONField next to it, listed
+in IMAGE_FIELDS. It records the source file name, the original
+dimensions, and the file name and size of each rendition. Templates build
+``srcset`` and ``width``/``height`` from that column alone (see
+``{% responsive_image %}`` in custom_tags), so no query or storage lookup
+happens at render time.
+
+A post_save signal notices when a field's file differs from the recorded
+source. Once the transaction commits, the work is queued on a thread pool
+(IMAGE_WORKERS threads; inline when IMAGE_PROCESSING_ASYNC is off). The
+result is written with a guarded ``UPDATE``, so a job for a file that has
+since been replaced changes nothing. ``manage.py generate_image_derivatives``
+backfills media uploaded before this existed.
+"""
+
+import atexit
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'derivatives'
+DEFAULT_WORKERS = 2
+BATCH_SIZE = 200
+
+# name -> (max width, max height, crop to fill)
+DERIVATIVE_SIZES = {
+    'avatar': (192, 192, True),
+    'card': (800, 800, False),
+    'full': (1600, 1600, False),
+}
+
+ORIENTATION_TAG = 0x0112
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}  # EXIF orientations that swap width and height
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# model label -> {image field: derivative sizes}
+IMAGE_FIELDS = {
+    'core.Profile': {'profile_pic': ('avatar',), 'cover_photo': ('card', 'full')},
+    'core.Post': {'image': ('card', 'full')},
+    'core.Project': {'image': ('card', 'full')},
+}
+
+
+def variants_field(field_name):
+    return f'{field_name}_variants'
+
+
+def needs_processing(instance, field_name):
+    """True when ``field_name``'s file is not the one its derivatives were made from."""
+    name = getattr(instance, field_name).name or ''
+    recorded = getattr(instance, variants_field(field_name)) or {}
+    return name != recorded.get('source', '')
+
+
+def _derivative_name(source_name, size, extension):
+    stem = os.path.splitext(source_name)[0]
+    return f'{DERIVATIVES_DIR}/{stem}.{size}.{extension}'
+
+
+def _resize(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    image = image.copy()
+    image.thumbnail((width, height), Image.Resampling.LANCZOS)  # Never upscales
+    return image
+
+
+def _flatten(image):
+    # JPEG has no alpha channel; put transparent images on white
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_derivatives(storage, source_name, sizes):
+    """
+    Writes every size/format rendition of ``source_name`` to ``storage``.
+    Returns the variants dict to record, or None if it is not an image.
+    """
+    largest = max(max(DERIVATIVE_SIZES[size][:2]) for size in sizes)
+    try:
+        with storage.open(source_name, 'rb') as source:
+            image = Image.open(source)
+            width, height = image.size
+            if image.getexif().get(ORIENTATION_TAG) in ROTATED_ORIENTATIONS:
+                width, height = height, width
+            # Let the JPEG decoder scale down by 2-8x while reading, before the real resize
+            image.draft('RGB', (largest, largest))
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        logger.warning("Cannot make derivatives of %s: missing or not a readable image", source_name)
+        return None
+
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    base = image.convert('RGBA' if has_alpha else 'RGB')
+    variants = {'source': source_name, 'width': width, 'height': height, 'sizes': {}}
+    for size in sizes:
+        resized = _resize(base, *DERIVATIVE_SIZES[size])
+        rendition = {'width': resized.width, 'height': resized.height}
+        for extension, (pil_format, options) in FORMATS.items():
+            encoded = resized if pil_format == 'WEBP' else _flatten(resized)
+            buffer = io.BytesIO()
+            encoded.save(buffer, pil_format, **options)  # No exif= argument, so no metadata
+            name = _derivative_name(source_name, size, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            rendition[extension] = storage.save(name, ContentFile(buffer.getvalue()))
+        variants['sizes'][size] = rendition
+    return variants
+
+
+def delete_derivatives(storage, variants):
+    for rendition in (variants or {}).get('sizes', {}).values():
+        for extension in FORMATS:
+            if rendition.get(extension):
+                storage.delete(rendition[extension])
+
+
+def process_image(model_label, pk, field_name, source_name):
+    """
+    Makes the derivatives for one image field and records them, unless the
+    row has moved on to another file in the meantime.
+    """
+    model = apps.get_model(model_label)
+    field = model._meta.get_field(field_name)
+    column = variants_field(field_name)
+    row = model.objects.filter(pk=pk).values(field_name, column).first()
+    if row is None or (row[field_name] or '') != source_name:
+        return None  # Deleted, or replaced by another upload with its own job
+    previous = row[column] or {}
+
+    variants = {}
+    if source_name:
+        variants = render_derivatives(field.storage, source_name, IMAGE_FIELDS[model_label][field_name])
+        if variants is None:
+            variants = {'source': source_name}  # Recorded so it is not retried on every save
+
+    current = Q(**{field_name: source_name})
+    if not source_name:
+        current |= Q(**{f'{field_name}__isnull': True})
+    updated = model.objects.filter(current, pk=pk).update(**{column: variants})
+    if not updated:
+        delete_derivatives(field.storage, variants)  # Stale job
+    elif previous.get('source') != source_name:
+        delete_derivatives(field.storage, previous)
+    return variants if updated else None
+
+
+def _run(job):
+    try:
+        process_image(*job)
+    except Exception:
+        logger.exception("Failed to make image derivatives for %s", job)
+
+
+def _run_in_worker(job):
+    close_old_connections()
+    try:
+        _run(job)
+    finally:
+        close_old_connections()
+
+
+class ImageProcessor:
+    """Runs derivative jobs on a small thread pool, or inline when not async."""
+
+    def __init__(self, run_async=True, workers=DEFAULT_WORKERS):
+        self.run_async = run_async
+        self.workers = workers
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, job):
+        if not self.run_async:
+            _run(job)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-derivatives')
+            future = self._executor.submit(_run_in_worker, job)
+            self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+
+    def flush(self):
+        """Blocks until every job submitted so far has finished."""
+        for future in list(self._pending):
+            future.result()
+
+
+_processor = None
+_processor_lock = threading.Lock()
+
+
+def get_processor():
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                _processor = ImageProcessor(
+                    run_async=getattr(settings, 'IMAGE_PROCESSING_ASYNC', True),
+                    workers=getattr(settings, 'IMAGE_WORKERS', DEFAULT_WORKERS),
+                )
+                atexit.register(_processor.flush)
+    return _processor
+
+
+def reset_processor():
+    """Drops the cached processor (used when settings change, e.g. in tests)."""
+    global _processor
+    if _processor is not None:
+        _processor.flush()
+    _processor = None
+
+
+def schedule_derivatives(instance):
+    """Queues a job, after commit, for each of ``instance``'s image fields whose file changed."""
+    label = instance._meta.label
+    for field_name in IMAGE_FIELDS.get(label, {}):
+        if needs_processing(instance, field_name):
+            job = (label, instance.pk, field_name, getattr(instance, field_name).name or '')
+            transaction.on_commit(lambda job=job: get_processor().submit(job))
+
+
+def backfill(model_label, force=False, processor=None, batch_size=BATCH_SIZE):
+    """
+    Queues every row of ``model_label`` whose derivatives are missing or
+    stale (all rows with ``force``) on ``processor`` (the shared one by
+    default). Returns the number of jobs queued.
+    """
+    processor = processor or get_processor()
+    model = apps.get_model(model_label)
+    fields = IMAGE_FIELDS[model_label]
+    columns = [name for field_name in fields for name in (field_name, variants_field(field_name))]
+    queued = 0
+    for row in model.objects.order_by('pk').values('pk', *columns).iterator(chunk_size=batch_size):
+        for field_name in fields:
+            source_name = row[field_name] or ''
+            recorded = row[variants_field(field_name)] or {}
+            if source_name and (force or recorded.get('source') != source_name):
+                processor.submit((model_label, row['pk'], field_name, source_name))
+                queued += 1
+    return queued
+
+
+def rendition(image, size):
+    """``(variants dict for size, original variants)`` for a FieldFile, or ``(None, None)``."""
+    if not image:
+        return None, None
+    variants = getattr(image.instance, variants_field(image.field.name), None) or {}
+    if variants.get('source') != image.name:
+        return None, None
+    return variants.get('sizes', {}).get(size), variants
+
+
+def srcset(image, size, extension):
+    """``"url 800w, url 1600w"`` for ``size`` and every larger uncropped size recorded."""
+    chosen, variants = rendition(image, size)
+    if chosen is None:
+        return ''
+    storage = image.storage
+    candidates = [chosen]
+    if not DERIVATIVE_SIZES[size][2]:
+        candidates += [
+            other for name, other in variants['sizes'].items()
+            if not DERIVATIVE_SIZES[name][2] and other['width'] > chosen['width']
+        ]
+    return ', '.join(f"{storage.url(item[extension])} {item['width']}w" for item in candidates)
+
+
+def derivative_url(image, size, extension='jpeg'):
+    """URL of one rendition, falling back to the original until it has been made."""
+    if not image:
+        return ''
+    chosen, _ = rendition(image, size)
+    return image.storage.url(chosen[extension]) if chosen else image.url
@@ -0,0 +1,272 @@
+# core/instrumentation.py
+
+"""
+Per-request cost accounting, grouped by resolved URL name.
+
+``RequestInstrumentationMiddleware`` measures each request. Every SQL
+statement goes through a ``connection.execute_wrapper`` hook, which works
+without DEBUG; it records the count, the time and repeats.
+- "duplicates" are statements run again with the same parameters.
+- "similar" are statements run again with the same SQL but other
+  parameters, the usual sign of an N+1 loop.
+Template time is the time spent inside the outermost
+``Template.render`` call. Wall time covers the whole middleware stack
+below this one.
+
+Results go three ways:
+- The response carries them in ``Server-Timing`` and ``X-Query-*``
+  headers when INSTRUMENTATION_HEADERS is on (DEBUG by default).
+- ``response.instrumentation`` holds the RequestStats, so tests can
+  inspect them.
+- A rolling window of the last INSTRUMENTATION_WINDOW requests per URL
+  name is kept in process memory. It backs the /system/performance/ page.
+
+Views declare a query budget with ``@query_budget(n)``, or by URL name in
+QUERY_BUDGETS. Going over the budget is logged. With QUERY_BUDGET_STRICT
+on, it raises ``QueryBudgetExceeded`` instead, so a test suite fails on
+the request that regressed. ``assert_within_budget(response)`` does the
+same check from a test.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.template import base as template_base
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 200
+
+RequestStats = namedtuple(
+    'RequestStats',
+    'url_name queries sql_ms duplicates similar template_ms wall_ms budget',
+)
+Budget = namedtuple('Budget', 'max_queries max_duplicates')
+
+_active = contextvars.ContextVar('request_instrumentation', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class _Recorder:
+    """Collects one request's queries and template time."""
+
+    def __init__(self):
+        self.statements = []  # (sql, params repr)
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.statements.append((sql, repr(params)))
+
+    def counts(self):
+        exact = Counter(self.statements)
+        by_sql = Counter(sql for sql, _ in self.statements)
+        duplicates = sum(count - 1 for count in exact.values())
+        similar = sum(count - 1 for count in by_sql.values()) - duplicates
+        return duplicates, similar
+
+
+def _instrumented_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        recorder = _active.get()
+        if recorder is None:
+            return render(self, context)
+        recorder.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            recorder.template_depth -= 1
+            if recorder.template_depth == 0:  # Includes run inside their parent; count them once
+                recorder.template_time += time.perf_counter() - start
+    wrapper.instrumented = True
+    return wrapper
+
+
+_install_lock = threading.Lock()
+
+
+def install_template_timing():
+    with _install_lock:
+        if not getattr(template_base.Template.render, 'instrumented', False):
+            template_base.Template.render = _instrumented_render(template_base.Template.render)
+
+
+# --- Budgets ---
+
+def query_budget(max_queries, max_duplicates=None):
+    """Declares the most queries (and optionally exact repeats) a view may run per request."""
+    def decorator(view_func):
+        view_func.query_budget = Budget(max_queries, max_duplicates)
+        return view_func
+    return decorator
+
+
+def budget_for(url_name, view_func=None):
+    """The Budget for a view: its decorator first, then QUERY_BUDGETS[url_name], else None."""
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is not None:
+        return budget
+    configured = getattr(settings, 'QUERY_BUDGETS', {}).get(url_name)
+    if configured is None:
+        return None
+    if isinstance(configured, int):
+        return Budget(configured, None)
+    return Budget(configured.get('queries'), configured.get('duplicates'))
+
+
+def budget_violations(stats):
+    """Human-readable reasons ``stats`` went over its budget (empty if within it)."""
+    budget = stats.budget
+    if budget is None:
+        return []
+    problems = []
+    if budget.max_queries is not None and stats.queries > budget.max_queries:
+        problems.append(f"{stats.queries} queries (budget {budget.max_queries})")
+    if budget.max_duplicates is not None and stats.duplicates > budget.max_duplicates:
+        problems.append(f"{stats.duplicates} duplicate queries (budget {budget.max_duplicates})")
+    return problems
+
+
+def assert_within_budget(response):
+    """For tests: fails if the request behind ``response`` went over its query budget."""
+    stats = getattr(response, 'instrumentation', None)
+    if stats is None:
+        raise AssertionError("Response was not instrumented; is RequestInstrumentationMiddleware installed?")
+    problems = budget_violations(stats)
+    if problems:
+        raise AssertionError(f"{stats.url_name}: " + '; '.join(problems))
+    return stats
+
+
+# --- Rolling stats ---
+
+class RollingStats:
+    """The last ``window`` RequestStats per URL name, for this process."""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, stats):
+        with self._lock:
+            samples = self._samples.get(stats.url_name)
+            if samples is None:
+                samples = self._samples[stats.url_name] = deque(maxlen=self.window)
+            samples.append(stats)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        """One dict per URL name, slowest (p95 wall time) first."""
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+        rows = []
+        for name, samples in snapshot.items():
+            count = len(samples)
+            wall = sorted(sample.wall_ms for sample in samples)
+            rows.append({
+                'url_name': name,
+                'requests': count,
+                'avg_queries': sum(sample.queries for sample in samples) / count,
+                'max_queries': max(sample.queries for sample in samples),
+                'avg_sql_ms': sum(sample.sql_ms for sample in samples) / count,
+                'avg_duplicates': sum(sample.duplicates for sample in samples) / count,
+                'avg_similar': sum(sample.similar for sample in samples) / count,
+                'avg_template_ms': sum(sample.template_ms for sample in samples) / count,
+                'p50_wall_ms': wall[count // 2],
+                'p95_wall_ms': wall[min(count - 1, int(count * 0.95))],
+                'budget': samples[-1].budget,
+                'over_budget': sum(1 for sample in samples if budget_violations(sample)),
+            })
+        rows.sort(key=lambda row: row['p95_wall_ms'], reverse=True)
+        return rows
+
+
+rolling_stats = RollingStats(getattr(settings, 'INSTRUMENTATION_WINDOW', DEFAULT_WINDOW))
+
+
+# --- Middleware ---
+
+class RequestInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_timing()
+
+    def __call__(self, request):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', True):
+            return self.get_response(request)
+
+        recorder = _Recorder()
+        token = _active.set(recorder)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _active.reset(token)
+        wall = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None or not match.url_name:
+            return response  # Static files, 404s and unnamed routes
+
+        duplicates, similar = recorder.counts()
+        stats = RequestStats(
+            url_name=match.url_name,
+            queries=len(recorder.statements),
+            sql_ms=round(recorder.sql_time * 1000, 2),
+            duplicates=duplicates,
+            similar=similar,
+            template_ms=round(recorder.template_time * 1000, 2),
+            wall_ms=round(wall * 1000, 2),
+            budget=budget_for(match.url_name, match.func),
+        )
+        rolling_stats.add(stats)
+        response.instrumentation = stats
+
+        if getattr(settings, 'INSTRUMENTATION_HEADERS', settings.DEBUG):
+            self._add_headers(response, stats)
+
+        problems = budget_violations(stats)
+        if problems:
+            message = f"{stats.url_name} went over its query budget: " + '; '.join(problems)
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def _add_headers(self, response, stats):
+        response['Server-Timing'] = ', '.join([
+            f'sql;dur={stats.sql_ms};desc="{stats.queries} queries"',
+            f'tpl;dur={stats.template_ms};desc="templates"',
+            f'total;dur={stats.wall_ms}',
+        ])
+        response['X-View'] = stats.url_name
+        response['X-Query-Count'] = str(stats.queries)
+        response['X-Query-Duplicates'] = str(stats.duplicates)
+        response['X-Query-Similar'] = str(stats.similar)
+        if stats.budget is not None and stats.budget.max_queries is not None:
+            response['X-Query-Budget'] = str(stats.budget.max_queries)
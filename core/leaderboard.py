@@ -0,0 +1,310 @@
+# core/leaderboard.py
+
+"""
+Challenge leaderboards.
+
+Scored submissions rank by ``(-score, submitted_at, id)``: the higher
+score first, the earlier submission on a tie. Unscored submissions do not
+rank. The partial ``submission_leaderboard_idx`` covers exactly that
+order, so a page of the board is one bounded range scan.
+
+"Where do I stand" needs no scan either. LeaderboardBucket keeps how many
+submissions hold each score per challenge, moved with atomic F()
+updates by the Submission signals. A rank is then the sum of the buckets
+above one's score, plus the ties submitted earlier, which is an index
+range over a single score. Both grow with the number of distinct scores
+and ties, not with the length of the board.
+
+The top LEADERBOARD_CACHE_SIZE entries of each challenge are cached as a
+sorted list. A re-score does not rebuild it. After commit the entry is
+taken out and put back at its new position. Only when that leaves a gap
+at the bottom is the missing tail fetched, with one keyset query. Pages
+inside the cached top cost no query. Pages further down use a keyset
+cursor like the home feed.
+
+The buckets can drift if a score is changed with ``QuerySet.update()``
+or a raw write, which bypasses signals. ``rebuild_leaderboards`` repairs
+them, and is also available as a command.
+"""
+
+import base64
+import bisect
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Greatest
+
+from .feed import InvalidCursor
+from .images import derivative_url
+from .models import LeaderboardBucket, Profile, Submission
+
+DEFAULT_CACHE_SIZE = 100
+DEFAULT_CACHE_TIMEOUT = 60 * 60  # seconds
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+LOCK_TIMEOUT = 5  # seconds
+LOCK_WAIT = 1.0  # seconds a re-score waits for another one on the same board
+
+# ``sort_key`` is (-score, submitted_at, submission_id): ascending order is board order
+Entry = namedtuple('Entry', 'sort_key submission_id user_id score submitted_at')
+
+ENTRY_FIELDS = ('id', 'user_id', 'score', 'submitted_at')
+
+
+def cache_size():
+    return getattr(settings, 'LEADERBOARD_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+
+
+def _entry(row):
+    submission_id, user_id, score, submitted_at = row
+    return Entry((-score, submitted_at, submission_id), submission_id, user_id, score, submitted_at)
+
+
+def _entries(queryset):
+    return [_entry(row) for row in queryset.values_list(*ENTRY_FIELDS)]
+
+
+def ranked(challenge_id):
+    """The challenge's scored submissions in board order."""
+    return Submission.objects.filter(challenge_id=challenge_id, score__isnull=False)\
+                             .order_by('-score', 'submitted_at', 'id')
+
+
+def _after(queryset, score, submitted_at, submission_id):
+    return queryset.filter(
+        Q(score__lt=score)
+        | Q(score=score, submitted_at__gt=submitted_at)
+        | Q(score=score, submitted_at=submitted_at, id__gt=submission_id)
+    )
+
+
+# --- Cursors ---
+
+def encode_cursor(entry):
+    raw = f"{entry.score}|{entry.submitted_at.isoformat()}|{entry.submission_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """``(score, submitted_at, submission_id)``. Raises ``InvalidCursor`` on bad input."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, submitted_at, submission_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return int(score), datetime.fromisoformat(submitted_at), int(submission_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Malformed leaderboard cursor: {cursor!r}") from e
+
+
+# --- Ranks ---
+
+def count_ahead(challenge_id, score, submitted_at, submission_id):
+    """How many scored submissions rank above the given position."""
+    higher = LeaderboardBucket.objects.filter(challenge_id=challenge_id, score__gt=score)\
+                                      .aggregate(total=Sum('submissions'))['total'] or 0
+    earlier_ties = Submission.objects.filter(challenge_id=challenge_id, score=score).filter(
+        Q(submitted_at__lt=submitted_at) | Q(submitted_at=submitted_at, id__lt=submission_id)
+    ).count()
+    return higher + earlier_ties
+
+
+def rank_of(submission):
+    """``submission``'s 1-based place on its board, or None while it is unscored."""
+    if submission is None or submission.score is None:
+        return None
+    return count_ahead(submission.challenge_id, submission.score, submission.submitted_at, submission.pk) + 1
+
+
+def total_ranked(challenge_id):
+    return LeaderboardBucket.objects.filter(challenge_id=challenge_id)\
+                                    .aggregate(total=Sum('submissions'))['total'] or 0
+
+
+# --- Buckets ---
+
+def _move(key, delta):
+    challenge_id, score = key
+    if challenge_id is None or score is None:
+        return
+    buckets = LeaderboardBucket.objects.filter(challenge_id=challenge_id, score=score)
+    if buckets.update(submissions=Greatest(F('submissions') + delta, Value(0))) or delta < 0:
+        return
+    with transaction.atomic():
+        bucket, created = LeaderboardBucket.objects.select_for_update().get_or_create(
+            challenge_id=challenge_id, score=score, defaults={'submissions': delta},
+        )
+        if not created:
+            buckets.update(submissions=F('submissions') + delta)
+
+
+def submission_saved(submission, created):
+    """Moves ``submission`` between score buckets and, after commit, on the cached board."""
+    new_key = (submission.challenge_id, submission.score)
+    old_key = (None, None) if created else getattr(submission, '_leaderboard_key', None)
+    submission._leaderboard_key = new_key
+    if old_key is None:
+        # Loaded without its score, so there is no way to tell what it was
+        rebuild_leaderboards([submission.challenge_id])
+        return
+    if old_key == new_key:
+        return
+    _move(old_key, -1)
+    _move(new_key, +1)
+    for challenge_id in {old_key[0], new_key[0]} - {None}:
+        transaction.on_commit(lambda challenge_id=challenge_id: refresh_entry(challenge_id, submission.pk))
+
+
+def submission_deleted(submission):
+    key = getattr(submission, '_leaderboard_key', (submission.challenge_id, submission.score))
+    submission_id = submission.pk  # Cleared on the instance once the delete finishes
+    _move(key, -1)
+    if key[1] is not None:
+        transaction.on_commit(lambda: refresh_entry(key[0], submission_id))
+
+
+def rebuild_leaderboards(challenge_ids=None):
+    """Recomputes the score buckets (all challenges, or just ``challenge_ids``) and drops their cached tops."""
+    submissions = Submission.objects.filter(score__isnull=False)
+    buckets = LeaderboardBucket.objects.all()
+    if challenge_ids is not None:
+        submissions = submissions.filter(challenge_id__in=challenge_ids)
+        buckets = buckets.filter(challenge_id__in=challenge_ids)
+    counts = submissions.order_by().values('challenge_id', 'score').annotate(total=Count('*'))
+    with transaction.atomic():
+        touched = set(buckets.values_list('challenge_id', flat=True))
+        buckets.delete()
+        rows = [LeaderboardBucket(challenge_id=row['challenge_id'], score=row['score'], submissions=row['total'])
+                for row in counts]
+        LeaderboardBucket.objects.bulk_create(rows, batch_size=1000)
+    touched |= set(challenge_ids or ()) | {row.challenge_id for row in rows}
+    cache.delete_many([_top_key(challenge_id) for challenge_id in touched])
+    return len(rows)
+
+
+# --- Cached top ---
+
+def _top_key(challenge_id):
+    return f'leaderboard:top:{challenge_id}'
+
+
+@contextmanager
+def _locked(challenge_id):
+    """Serialises edits of one cached board; yields False if the lock could not be had in time."""
+    key = f'leaderboard:lock:{challenge_id}'
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(key, 1, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(0.01)
+    try:
+        yield True
+    finally:
+        cache.delete(key)
+
+
+def _fill(challenge_id, entries, complete):
+    """Tops a short, incomplete list back up to cache_size() with the entries that follow it."""
+    size = cache_size()
+    if len(entries) > size:
+        return entries[:size], False
+    if len(entries) < size and not complete:
+        queryset = ranked(challenge_id)
+        if entries:
+            last = entries[-1]
+            queryset = _after(queryset, last.score, last.submitted_at, last.submission_id)
+        wanted = size - len(entries)
+        following = _entries(queryset[:wanted + 1])
+        return entries + following[:wanted], len(following) <= wanted
+    return entries, complete
+
+
+def get_top(challenge_id):
+    """``(entries, complete)``: the board's first cache_size() entries; ``complete`` if that is all of it."""
+    key = _top_key(challenge_id)
+    cached = cache.get(key)
+    if cached is None:
+        cached = _fill(challenge_id, [], False)
+        cache.set(key, cached, getattr(settings, 'LEADERBOARD_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT))
+    return cached
+
+
+def refresh_entry(challenge_id, submission_id):
+    """Re-places one submission on a cached board, from its committed row."""
+    key = _top_key(challenge_id)
+    with _locked(challenge_id) as locked:
+        if not locked:
+            cache.delete(key)  # Rebuilt on the next read
+            return
+        cached = cache.get(key)
+        if cached is None:
+            return
+        entries, complete = cached
+        entries = [entry for entry in entries if entry.submission_id != submission_id]
+        row = ranked(challenge_id).filter(pk=submission_id).values_list(*ENTRY_FIELDS).first()
+        if row is not None:
+            entry = _entry(row)
+            # Below the cached tail of an incomplete board it may not belong; _fill decides
+            if complete or (entries and entry.sort_key < entries[-1].sort_key):
+                bisect.insort(entries, entry)
+        cache.set(key, _fill(challenge_id, entries, complete),
+                  getattr(settings, 'LEADERBOARD_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT))
+
+
+# --- Pages ---
+
+def get_page(challenge_id, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    ``([(rank, Entry), ...], next_cursor)`` for one page of the board,
+    starting after ``cursor``. Raises ``InvalidCursor``/``ValueError`` on
+    bad input.
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+    entries, complete = get_top(challenge_id)
+
+    start = 0
+    if after is not None:
+        score, submitted_at, submission_id = after
+        start = bisect.bisect_right(entries, (-score, submitted_at, submission_id), key=lambda entry: entry.sort_key)
+    if complete or start + page_size <= len(entries):
+        page = entries[start:start + page_size]
+        ranks = range(start + 1, start + 1 + len(page))
+        more = start + page_size < len(entries) or not complete
+    else:
+        # Past the cached top: a keyset range scan on the leaderboard index
+        queryset = ranked(challenge_id)
+        if after is not None:
+            queryset = _after(queryset, *after)
+        page = _entries(queryset[:page_size + 1])
+        more = len(page) > page_size
+        page = page[:page_size]
+        first = count_ahead(challenge_id, page[0].score, page[0].submitted_at, page[0].submission_id) + 1 if page else 1
+        ranks = range(first, first + len(page))
+    next_cursor = encode_cursor(page[-1]) if page and more else None
+    return list(zip(ranks, page)), next_cursor
+
+
+def describe(ranked_entries):
+    """Display rows for ``get_page`` output, with each entrant's current name and avatar."""
+    profiles = Profile.objects.select_related('user').in_bulk([entry.user_id for _, entry in ranked_entries])
+    rows = []
+    for rank, entry in ranked_entries:
+        profile = profiles.get(entry.user_id)
+        if profile is None:
+            continue  # Deleted since the board was cached
+        user = profile.user
+        rows.append({
+            'rank': rank,
+            'username': user.username,
+            'name': user.get_full_name() or user.username,
+            'avatar': derivative_url(profile.profile_pic, 'avatar'),
+            'score': entry.score,
+            'submitted_at': entry.submitted_at,
+        })
+    return rows
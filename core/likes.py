@@ -0,0 +1,67 @@
+# core/likes.py
+
+"""
+Like/unlike operations on the ``Post.likes`` through-table.
+
+Every check is an existence probe on the unique ``(post_id, profile_id)``
+index rather than loading the likers into Python. ``like`` and ``unlike``
+are idempotent and race-safe: the unique constraint decides which of two
+concurrent likes wins, and only the request that actually changed a row
+touches ``Post.like_count``.
+"""
+
+from django.db import IntegrityError, transaction
+
+from . import notifications
+from .counters import adjust_post_counter
+from .models import Post
+
+PostLike = Post.likes.through
+
+
+def has_liked(profile, post_id):
+    """True if ``profile`` has liked the post."""
+    return PostLike.objects.filter(post_id=post_id, profile_id=profile.pk).exists()
+
+
+def like(profile, post_id):
+    """Likes the post. Returns True if a like was added, False if it already existed."""
+    try:
+        with transaction.atomic():
+            PostLike.objects.create(post_id=post_id, profile_id=profile.pk)
+            adjust_post_counter(post_id, 'like_count', 1)
+    except IntegrityError:
+        return False
+    notifications.notify_post_like(profile.user, post_id)
+    return True
+
+
+def unlike(profile, post_id):
+    """Removes the like. Returns True if a like was removed, False if there was none."""
+    with transaction.atomic():
+        deleted, _ = PostLike.objects.filter(post_id=post_id, profile_id=profile.pk).delete()
+        if deleted:
+            adjust_post_counter(post_id, 'like_count', -1)
+    return bool(deleted)
+
+
+def toggle_like(profile, post_id):
+    """Flips the like state. Returns the new state (True = liked)."""
+    if unlike(profile, post_id):
+        return False
+    like(profile, post_id)
+    return True
+
+
+def liked_post_ids(profile, post_ids):
+    """
+    Returns the subset of ``post_ids`` that ``profile`` has liked, in one
+    query, so a whole page of post cards can show their liked state.
+    """
+    post_ids = [post_id for post_id in post_ids if post_id is not None]
+    if profile is None or not post_ids:
+        return set()
+    return set(
+        PostLike.objects.filter(profile_id=profile.pk, post_id__in=post_ids)
+                        .values_list('post_id', flat=True)
+    )
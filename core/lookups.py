@@ -0,0 +1,152 @@
+# core/lookups.py
+
+"""
+Skill and Subject lookups: autocomplete and bulk get-or-create.
+
+Each process keeps a sorted array of normalised names per kind and answers
+prefix queries with ``bisect``, never touching the table. Every word of a
+multi-word name starts its own entry, so "lea" finds "Machine Learning".
+
+Arrays are built lazily from the rows cached by core/reference_data.py
+and tagged with that kind's version stamp. Every Skill/Subject write bumps
+the stamp (signals, plus ``get_or_create_skills`` for its bulk inserts).
+Before answering, a process compares its tag with the stamp and rebuilds
+if another worker has changed the table, so all workers serve the same
+data.
+"""
+
+import bisect
+import re
+import threading
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from . import reference_data
+from .models import Skill, Subject
+from .people_search import normalise
+
+AUTOCOMPLETE_LIMIT = 10
+MAX_SKILLS_PER_PROFILE = 50
+
+LOOKUP_MODELS = {
+    'skill': Skill,
+    'subject': Subject,
+}
+
+SPACES_RE = re.compile(r'\s+')
+
+
+def _clean(text):
+    return SPACES_RE.sub(' ', normalise(text)).strip()
+
+
+class PrefixIndex:
+    """Sorted ``(key, word_position, pk, name)`` entries searchable by prefix."""
+
+    def __init__(self, rows):
+        entries = []
+        for pk, name in rows:
+            words = _clean(name).split(' ')
+            for position in range(len(words)):
+                entries.append((' '.join(words[position:]), position, pk, name))
+        entries.sort()
+        self._keys = [entry[0] for entry in entries]
+        self._entries = entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        """
+        Returns up to ``limit`` ``(pk, name)`` pairs whose name, or a word
+        inside it, starts with ``prefix``. Names that start with it come
+        first, then alphabetical order.
+        """
+        prefix = _clean(prefix)
+        if not prefix:
+            return []
+        matches = {}
+        start = bisect.bisect_left(self._keys, prefix)
+        for key, position, pk, name in self._entries[start:]:
+            if not key.startswith(prefix):
+                break
+            if pk not in matches or position < matches[pk][0]:
+                matches[pk] = (position, name)
+        best = sorted(matches.items(), key=lambda item: (item[1][0] > 0, item[1][1].lower()))
+        return [(pk, name) for pk, (_, name) in best[:limit]]
+
+
+_indexes = {}  # kind -> (version, PrefixIndex)
+_indexes_lock = threading.Lock()
+
+
+def get_index(kind):
+    """Returns the up-to-date PrefixIndex for ``kind``, rebuilding it if the table changed."""
+    version = reference_data.current_version(kind)
+    cached = _indexes.get(kind)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _indexes_lock:
+        cached = _indexes.get(kind)
+        if cached is None or cached[0] != version:
+            # The version is read before the rows, so a concurrent write only causes one extra rebuild
+            index = PrefixIndex((row.pk, row.name) for row in reference_data.get_all(kind))
+            cached = _indexes[kind] = (version, index)
+    return cached[1]
+
+
+def reset_indexes():
+    """Drops every process-local index (e.g. in tests)."""
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def autocomplete(kind, prefix, limit=AUTOCOMPLETE_LIMIT):
+    """``[{'id', 'name'}, ...]`` for a Skill or Subject search box."""
+    return [{'id': pk, 'name': name} for pk, name in get_index(kind).search(prefix, limit)]
+
+
+def parse_skill_names(text):
+    """Splits "Python, machine  learning" into distinct, tidied skill names."""
+    max_length = Skill._meta.get_field('name').max_length
+    names, seen = [], set()
+    for name in (text or '').split(','):
+        name = SPACES_RE.sub(' ', name).strip()[:max_length]
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names[:MAX_SKILLS_PER_PROFILE]
+
+
+def get_or_create_skills(names):
+    """
+    Returns Skill objects for ``names`` in order, creating missing ones.
+    Existing skills are matched case-insensitively against the cached
+    Skill table, so "python" reuses "Python" without a query. Names the
+    cache misses are looked up once more in the table, since another
+    worker may have added them in other case since the cache was filled;
+    the rest cost one INSERT and one SELECT, however many there are.
+    """
+    names = parse_skill_names(','.join(names))
+    if not names:
+        return []
+    wanted = {name.lower() for name in names}
+    found = {skill.name.lower(): skill for skill in reference_data.get_all('skill') if skill.name.lower() in wanted}
+
+    missing = [name for name in names if name.lower() not in found]
+    if missing:
+        recent = Skill.objects.filter(reduce(or_, (Q(name__iexact=name) for name in missing)))
+        found.update({skill.name.lower(): skill for skill in recent})
+        missing = [name for name in missing if name.lower() not in found]
+    if missing:
+        Skill.objects.bulk_create([Skill(name=name) for name in missing], ignore_conflicts=True)
+        reference_data.bump_version('skill')  # bulk_create sends no post_save
+        found.update({skill.name.lower(): skill for skill in Skill.objects.filter(name__in=missing)})
+    return [found[name.lower()] for name in names if name.lower() in found]
+
+
+def set_profile_skills(profile, names):
+    """Replaces ``profile``'s skills with ``names`` (see ``get_or_create_skills``)."""
+    profile.skills.set(get_or_create_skills(names))
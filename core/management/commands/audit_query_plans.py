@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.query_audit import audit_queries
+
+
+class Command(BaseCommand):
+    help = ("EXPLAINs the app's hot querysets and fails if any of them scans a whole table. "
+            "Run against SQLite or PostgreSQL, e.g. in CI after migrating.")
+
+    def handle(self, *args, **options):
+        results = audit_queries()
+        failures = [result for result in results if result.full_scans]
+
+        for result in results:
+            if result.full_scans:
+                self.stdout.write(self.style.ERROR(
+                    f"FULL SCAN  {result.name} ({', '.join(sorted(set(result.full_scans)))})"
+                ))
+            else:
+                self.stdout.write(f"ok         {result.name}")
+            if result.full_scans or options['verbosity'] > 1:
+                for line in result.plan.splitlines():
+                    self.stdout.write(f"             {line}")
+
+        if failures:
+            raise CommandError(f"{len(failures)} of {len(results)} queries fall back to a full scan on {connection.vendor}.")
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} queries checked on {connection.vendor}; no full scans."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.conversations import rebuild_conversations
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the Conversation inbox summaries from the Message table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Conversations written per bulk insert.")
+
+    def handle(self, *args, **options):
+        written = rebuild_conversations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} conversation(s)."))
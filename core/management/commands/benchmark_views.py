@@ -0,0 +1,101 @@
+import json
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from core.benchmarks import compare, environment, reset_process_state, row_counts, run_benchmarks
+from core.seeding import Seeder, scale_users
+
+
+class Command(BaseCommand):
+    help = ("Times home_view, profile_view, chat_list_history, get_messages, network_view and "
+            "all_notifications at each --scale, each in a freshly seeded throwaway database, "
+            "and writes the results as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', action='append', default=[],
+                            help="1k, 10k, 100k or a number of users (may be repeated; default 1k).")
+        parser.add_argument('--existing', action='store_true',
+                            help="Benchmark the configured database as it is instead of seeding one.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the generated data.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed requests per view and persona.")
+        parser.add_argument('--warmup', type=int, default=1, help="Untimed requests after the cold one.")
+        parser.add_argument('--output', help="Write the JSON here instead of to stdout.")
+        parser.add_argument('--compare', help="A previous JSON report; fail if any view regressed against it.")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help="Allowed growth in median time before --compare fails (0.2 = 20%%).")
+
+    def log(self, message):
+        self.stderr.write(message)  # stdout may be carrying the JSON
+
+    def handle(self, *args, **options):
+        if options['existing'] and options['scale']:
+            raise CommandError("--existing benchmarks the current database; leave out --scale.")
+        report = {**environment(), 'runs': []}
+
+        # The test client needs 'testserver' in ALLOWED_HOSTS; a budget overrun should be measured, not raised
+        setup_test_environment(debug=False)
+        try:
+            with override_settings(QUERY_BUDGET_STRICT=False):
+                if options['existing']:
+                    report['runs'].append(self.benchmark('existing', options))
+                else:
+                    for scale in options['scale'] or ['1k']:
+                        report['runs'].append(self.benchmark_scale(scale, options))
+        finally:
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.log(self.style.SUCCESS(f"Wrote {options['output']}."))
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = compare(report, baseline, tolerance=options['tolerance'])
+            for line in regressions:
+                self.log(self.style.ERROR(f"REGRESSION {line}"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['compare']}.")
+            self.log(self.style.SUCCESS(f"No regressions against {options['compare']}."))
+
+    def benchmark_scale(self, scale, options):
+        try:
+            users = scale_users(scale)
+        except ValueError as e:
+            raise CommandError(str(e))
+        # A private cache, so fragments and version stamps from the real database cannot leak in
+        private_cache = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'benchmark-{uuid.uuid4().hex}',
+        }}
+        with override_settings(CACHES=private_cache):
+            reset_process_state()
+            old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+            try:
+                self.log(f"Seeding {users} users for {scale}...")
+                started = time.perf_counter()
+                Seeder(users=users, seed=options['seed'], log=self.log).run()
+                seed_seconds = time.perf_counter() - started
+                run = self.benchmark(scale, options)
+                run['seed_seconds'] = round(seed_seconds, 1)
+                return run
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                reset_process_state()
+
+    def benchmark(self, scale, options):
+        self.log(f"Benchmarking {scale}...")
+        results = run_benchmarks(repeat=options['repeat'], warmup=options['warmup'])
+        for result in results:
+            self.log(f"  {result['view']:<18} {result['persona']:<8} p50 {result['p50_ms']:>8.1f}ms  "
+                     f"queries {result.get('queries', '-')}")
+        return {'scale': scale, 'row_counts': row_counts(), 'results': results}
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.images import IMAGE_FIELDS, ImageProcessor, backfill
+
+
+class Command(BaseCommand):
+    help = "Makes the resized WebP/JPEG derivatives of existing profile, cover, post and project images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate images that already have derivatives.")
+        parser.add_argument('--workers', type=int, default=4, help="Images resized in parallel (1 resizes inline).")
+
+    def handle(self, *args, **options):
+        processor = ImageProcessor(run_async=options['workers'] > 1, workers=options['workers'])
+        total = 0
+        for model_label in IMAGE_FIELDS:
+            queued = backfill(model_label, force=options['force'], processor=processor)
+            self.stdout.write(f"{model_label}: {queued} image(s) queued.")
+            total += queued
+        processor.flush()
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} image(s)."))
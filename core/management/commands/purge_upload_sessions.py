@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.uploads import purge_stale_sessions
+
+
+class Command(BaseCommand):
+    help = "Deletes chunked upload sessions (and their files) that have not been touched for UPLOAD_SESSION_TTL seconds."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=None, help="Override the age limit, in seconds.")
+
+    def handle(self, *args, **options):
+        count = purge_stale_sessions(max_age=options['max_age'])
+        self.stdout.write(self.style.SUCCESS(f"Removed {count} upload session(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.connections import rebuild_edges
+
+
+class Command(BaseCommand):
+    help = "Recomputes ConnectionEdge rows and Profile.connection_count from accepted connections."
+
+    def handle(self, *args, **options):
+        count = rebuild_edges()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} connection edge(s)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.leaderboard import rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the per-score LeaderboardBucket counts from scored submissions and drops "
+            "the cached leaderboard tops.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('challenge_ids', nargs='*', type=int, help="Only these challenges (default: all).")
+
+    def handle(self, *args, **options):
+        count = rebuild_leaderboards(options['challenge_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} leaderboard bucket(s)."))
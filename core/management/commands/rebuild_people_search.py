@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.people_search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the people-search token index from users, profiles and skills."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Users loaded per batch.")
+
+    def handle(self, *args, **options):
+        count = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} user(s)."))
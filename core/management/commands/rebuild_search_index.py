@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.search import get_search_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the post full-text search index from the Post table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Posts indexed per batch.")
+
+    def handle(self, *args, **options):
+        count = rebuild_index(batch_size=options['batch_size'])
+        backend = type(get_search_backend()).__name__
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} post(s) with {backend}."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Profile
+from core.recommendations import rebuild_suggestions, refresh_suggestions
+
+
+class Command(BaseCommand):
+    help = "Recomputes precomputed connection suggestions from the connection graph. Run periodically (e.g. nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username', action='append', default=[],
+            help="Only recompute the suggestions of this user (may be repeated).",
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help="Profiles written per transaction.")
+
+    def handle(self, *args, **options):
+        if options['username']:
+            profile_ids = Profile.objects.filter(user__username__in=options['username']).values_list('pk', flat=True)
+            written = refresh_suggestions(list(profile_ids))
+        else:
+            written = rebuild_suggestions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} suggestion(s)."))
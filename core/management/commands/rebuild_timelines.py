@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Profile
+from core.timeline import rebuild_all_timelines, rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = "Recomputes precomputed home timelines from posts and accepted connections."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username', action='append', default=[],
+            help="Only rebuild the timeline of this user (may be repeated).",
+        )
+
+    def handle(self, *args, **options):
+        if options['username']:
+            profiles = Profile.objects.filter(user__username__in=options['username'])
+            for profile in profiles:
+                rebuild_timeline(profile)
+            count = len(profiles)
+        else:
+            count = rebuild_all_timelines()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} timeline(s)."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import reconcile_post_counters
+
+
+class Command(BaseCommand):
+    help = "Repairs drift in Post.like_count / Post.comment_count. Safe to run periodically (e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Posts checked per query.")
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        repaired = reconcile_post_counters(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        verb = "would be repaired" if options['dry_run'] else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"{repaired} post(s) {verb}."))
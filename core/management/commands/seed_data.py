@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.seeding import DEFAULT_RATES, SCALES, Seeder, scale_users
+
+
+class Command(BaseCommand):
+    help = ("Fills the database with synthetic users, connections, posts, likes, comments, messages, "
+            "notifications and submissions, with skewed activity, then rebuilds derived data. "
+            "Meant for an empty or disposable database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', default='1k', help=f"Users to create: {', '.join(SCALES)} or a number.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same data.")
+        parser.add_argument('--prefix', default='seed', help="Username prefix for the generated users.")
+        parser.add_argument('--days', type=int, default=365, help="How far back generated activity goes.")
+        parser.add_argument('--password', default='password', help="Password shared by every generated user.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk insert.")
+        for name, average in DEFAULT_RATES.items():
+            parser.add_argument(
+                f"--{name.replace('_', '-')}", type=float, default=None, dest=f'rate_{name}',
+                help=f"Average {name.replace('_', ' ')} per user (default {average}).",
+            )
+
+    def handle(self, *args, **options):
+        rates = {name: options[f'rate_{name}'] for name in DEFAULT_RATES if options[f'rate_{name}'] is not None}
+        try:
+            seeder = Seeder(
+                users=scale_users(options['scale']), seed=options['seed'], prefix=options['prefix'],
+                days=options['days'], password=options['password'], rates=rates,
+                batch_size=options['batch_size'], log=self.stdout.write,
+            )
+            counts = seeder.run()
+        except ValueError as e:
+            raise CommandError(str(e))
+        for model, count in counts.items():
+            self.stdout.write(f"{model:>20}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Seeded {seeder.user_count} user(s)."))
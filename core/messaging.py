@@ -0,0 +1,86 @@
+# core/messaging.py
+
+"""
+Chat message persistence, serialisation and real-time delivery.
+
+``send_message`` is the single write path for chat messages, used by both
+the HTTP ``send_message_api`` and ``ChatConsumer``. Every stored message is
+pushed over the channel layer to the per-user group of both participants,
+so each of a user's open sockets (one per device or tab) receives it.
+Clients that cannot hold a socket open fall back to polling get_messages
+with the id of the last message they have.
+"""
+
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+
+def user_group_name(user_id):
+    """Channel-layer group joined by every open chat socket of one user."""
+    return f'user_{user_id}'
+
+
+def serialize_message(message):
+    """JSON shape used by get_messages, send_message_api and the WebSocket feed."""
+    return {
+        'id': message.id,
+        'sender_username': message.sender.username,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(), # Essential for JS date parsing
+        'file_url': message.file_url,
+        'file_name': message.file_name,
+        'file_type': message.file_type,
+        'is_image': message.is_image,
+        'is_video': message.is_video,
+        'is_audio': message.is_audio,
+        'is_document': message.is_document,
+    }
+
+
+def chat_event(message):
+    """Channel-layer event handled by ChatConsumer.chat_message."""
+    return {
+        'type': 'chat.message',
+        # Lets each socket keep only the messages of the conversation it shows
+        'participants': sorted((message.sender_id, message.recipient_id)),
+        'message': serialize_message(message),
+    }
+
+
+def send_message(sender, recipient, content='', file=None):
+    """
+    Stores a chat message from ``sender`` to ``recipient`` and pushes it to
+    both participants' sockets. ``file`` is an optional uploaded file.
+    Returns the new Message.
+    """
+    fields = {'sender': sender, 'recipient': recipient, 'content': content}
+    if file is not None:
+        fields['file'] = file
+        fields['file_name'] = file.name
+        fields['file_type'] = getattr(file, 'content_type', None)
+    message = Message.objects.create(**fields)
+    broadcast_message(message)
+    return message
+
+
+def broadcast_message(message):
+    """
+    Pushes a stored message to every open socket of both participants.
+    Delivery is best-effort: a missing or failing channel layer must never
+    fail the request that saved the message, since clients can still poll.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    event = chat_event(message)
+    try:
+        for user_id in {message.sender_id, message.recipient_id}:
+            async_to_sync(channel_layer.group_send)(user_group_name(user_id), event)
+    except Exception:
+        logger.exception("Failed to broadcast message %s over the channel layer", message.id)
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:57
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('core', 'Post')
+    Comment = apps.get_model('core', 'Comment')
+
+    def counted(queryset):
+        totals = queryset.order_by().values('post_id').annotate(total=Count('*')).values('total')
+        return Coalesce(Subquery(totals, output_field=IntegerField()), Value(0))
+
+    Post.objects.update(
+        like_count=counted(Post.likes.through.objects.filter(post_id=OuterRef('pk'))),
+        comment_count=counted(Comment.objects.filter(post_id=OuterRef('pk'))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='share_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
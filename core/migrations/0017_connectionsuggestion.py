@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_notification_message_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConnectionSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField(default=0)),
+                ('mutual_count', models.PositiveIntegerField(default=0)),
+                ('shared_interest_count', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggested_to', to='core.profile')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='connection_suggestions', to='core.profile')),
+            ],
+            options={
+                'ordering': ['-score', 'candidate'],
+                'indexes': [models.Index(fields=['profile', '-score', 'candidate'], name='suggestion_profile_rank_idx')],
+                'unique_together': {('profile', 'candidate')},
+            },
+        ),
+    ]
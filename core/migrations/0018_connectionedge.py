@@ -0,0 +1,58 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_edges(apps, schema_editor):
+    Connection = apps.get_model('core', 'Connection')
+    ConnectionEdge = apps.get_model('core', 'ConnectionEdge')
+    Profile = apps.get_model('core', 'Profile')
+
+    # A pair may have accepted rows in both directions; it still gets one edge
+    pairs = set()
+    for creator_id, friend_id in Connection.objects.filter(accepted=True).values_list('creator_id', 'friend_id').iterator():
+        if creator_id != friend_id:
+            pairs.add((min(creator_id, friend_id), max(creator_id, friend_id)))
+    ConnectionEdge.objects.bulk_create(
+        [ConnectionEdge(profile_low_id=low_id, profile_high_id=high_id) for low_id, high_id in pairs],
+        batch_size=1000,
+    )
+
+    def degree(field):
+        totals = ConnectionEdge.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)\
+                                       .annotate(total=Count('*')).values('total')
+        return Coalesce(Subquery(totals, output_field=IntegerField()), Value(0))
+
+    Profile.objects.update(connection_count=degree('profile_low') + degree('profile_high'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_connectionsuggestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='connection_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ConnectionEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('profile_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges_as_high', to='core.profile')),
+                ('profile_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges_as_low', to='core.profile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile_high', 'profile_low'], name='connectionedge_high_low_idx')],
+                'unique_together': {('profile_low', 'profile_high')},
+            },
+        ),
+        migrations.RunPython(backfill_edges, migrations.RunPython.noop),
+    ]
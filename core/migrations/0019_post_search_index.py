@@ -0,0 +1,73 @@
+# Full-text index for posts (see core/search.py). The index is a side table
+# whose shape depends on the database, so it is created with raw SQL behind a
+# vendor check rather than as a model.
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE core_post_fts USING fts5(title, subject, author, content, tokenize='porter unicode61')",
+    """
+    INSERT INTO core_post_fts (rowid, title, subject, author, content)
+    SELECT p.id, p.title, COALESCE(s.name, ''),
+           TRIM(u.username || ' ' || u.first_name || ' ' || u.last_name), p.content
+    FROM core_post p
+    JOIN core_user u ON u.id = p.author_id
+    LEFT JOIN core_subject s ON s.id = p.subject_id
+    """,
+]
+SQLITE_BACKWARD = ["DROP TABLE IF EXISTS core_post_fts"]
+
+POSTGRES_FORWARD = [
+    """
+    CREATE TABLE core_post_search (
+        post_id integer PRIMARY KEY REFERENCES core_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX core_post_search_document_idx ON core_post_search USING GIN (document)",
+    """
+    INSERT INTO core_post_search (post_id, document)
+    SELECT p.id,
+           setweight(to_tsvector('english', p.title), 'A') ||
+           setweight(to_tsvector('english', COALESCE(s.name, '')), 'B') ||
+           setweight(to_tsvector('english', u.username || ' ' || u.first_name || ' ' || u.last_name), 'B') ||
+           setweight(to_tsvector('english', p.content), 'D')
+    FROM core_post p
+    JOIN core_user u ON u.id = p.author_id
+    LEFT JOIN core_subject s ON s.id = p.subject_id
+    """,
+]
+POSTGRES_BACKWARD = ["DROP TABLE IF EXISTS core_post_search"]
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FORWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_FORWARD)
+    # Other databases use core.search.BasicSearchBackend, which needs no table
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_BACKWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_connectionedge'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:26
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _normalise(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def backfill_tokens(apps, schema_editor):
+    # Same tokenisation as core.people_search at the time of writing
+    User = apps.get_model('core', 'User')
+    Profile = apps.get_model('core', 'Profile')
+    PeopleSearchToken = apps.get_model('core', 'PeopleSearchToken')
+
+    profiles = {profile.pk: profile for profile in Profile.objects.prefetch_related('skills')}
+    rows = []
+    for user in User.objects.iterator():
+        values = [user.username, user.email, user.first_name, user.last_name]
+        profile = profiles.get(user.pk)
+        if profile is not None:
+            values += [profile.institution, profile.location, profile.headline]
+            values += [skill.name for skill in profile.skills.all()]
+        tokens = {word[:64] for value in values for word in WORD_RE.findall(_normalise(value))}
+        tokens.add(_normalise(user.username)[:64])
+        rows += [PeopleSearchToken(user_id=user.pk, token=token) for token in tokens]
+    PeopleSearchToken.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_post_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeopleSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('token', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_buckets(apps, schema_editor):
+    Submission = apps.get_model('core', 'Submission')
+    LeaderboardBucket = apps.get_model('core', 'LeaderboardBucket')
+    counts = Submission.objects.filter(score__isnull=False).order_by()\
+                               .values('challenge_id', 'score').annotate(total=Count('*'))
+    LeaderboardBucket.objects.bulk_create(
+        [LeaderboardBucket(challenge_id=row['challenge_id'], score=row['score'], submissions=row['total']) for row in counts],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_post_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField()),
+                ('submissions', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('score__isnull', False)), fields=['challenge', '-score', 'submitted_at'], name='submission_leaderboard_idx'),
+        ),
+        migrations.AddField(
+            model_name='leaderboardbucket',
+            name='challenge',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_buckets', to='core.challenge'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='leaderboardbucket',
+            unique_together={('challenge', 'score')},
+        ),
+        migrations.RunPython(backfill_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:26
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _normalise(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def _tokens(*values):
+    return {word[:64] for value in values for word in WORD_RE.findall(_normalise(value))}
+
+
+def split_email_tokens(apps, schema_editor):
+    # Re-tokenises everyone with email words kept apart, as core.people_search does at the time of writing
+    User = apps.get_model('core', 'User')
+    Profile = apps.get_model('core', 'Profile')
+    PeopleSearchToken = apps.get_model('core', 'PeopleSearchToken')
+
+    PeopleSearchToken.objects.all().delete()
+    profiles = {profile.pk: profile for profile in Profile.objects.prefetch_related('skills')}
+    rows = []
+    for user in User.objects.iterator():
+        values = [user.username, user.first_name, user.last_name]
+        profile = profiles.get(user.pk)
+        if profile is not None:
+            values += [profile.institution, profile.location, profile.headline]
+            values += [skill.name for skill in profile.skills.all()]
+        public = _tokens(*values) | {_normalise(user.username)[:64]}
+        rows += [PeopleSearchToken(user_id=user.pk, field='public', token=token) for token in public]
+        rows += [PeopleSearchToken(user_id=user.pk, field='email', token=token) for token in _tokens(user.email)]
+    PeopleSearchToken.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='peoplesearchtoken',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='peoplesearchtoken',
+            name='field',
+            field=models.CharField(choices=[('public', 'Name, profile or skill'), ('email', 'Email')], default='public', max_length=10),
+        ),
+        migrations.AlterUniqueTogether(
+            name='peoplesearchtoken',
+            unique_together={('field', 'token', 'user')},
+        ),
+        migrations.RunPython(split_email_tokens, migrations.RunPython.noop),
+    ]
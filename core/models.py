@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
@@ -20,7 +22,8 @@ class User(AbstractUser):
     phone = models.CharField(max_length=20, blank=True, null=True)
 
     def get_unread_notification_count(self):
-        return self.received_notifications.filter(is_read=False).count()
+        from .notifications import get_notification_summary # Local import: notifications imports models
+        return get_notification_summary(self)['unread_count']
     
     def save(self, *args, **kwargs):
         if self.is_superuser and not self.role.startswith('super'):
@@ -60,6 +63,18 @@ class Skill(models.Model):
     def __str__(self):
         return self.name
 
+class ReferenceDataVersion(models.Model):
+    """
+    Change counter for a small, rarely edited table (e.g. 'skill',
+    'subject'). Every write bumps it, so each process can tell whether its
+    in-memory copy is stale with one primary-key read; see core/lookups.py.
+    """
+    key = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
 # Redefined Profile Model
 class Profile(models.Model):
     EDUCATION_LEVELS = [
@@ -73,6 +88,9 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='profile')
     profile_pic = models.ImageField(upload_to='profiles/%Y/%m/%d/', blank=True, null=True) # Added null=True for consistency
     cover_photo = models.ImageField(upload_to='cover_photos/', blank=True, null=True)
+    # Resized renditions and dimensions of the images above, written by core/images.py
+    profile_pic_variants = models.JSONField(default=dict, blank=True, editable=False)
+    cover_photo_variants = models.JSONField(default=dict, blank=True, editable=False)
     headline = models.CharField(max_length=200, blank=True)
     bio = models.TextField(blank=True)
     education_level = models.CharField(max_length=20, choices=EDUCATION_LEVELS, blank=True)
@@ -87,6 +105,7 @@ class Profile(models.Model):
     linkedin = models.URLField(blank=True)
     github = models.URLField(blank=True)
     points = models.PositiveIntegerField(default=0)
+    connection_count = models.PositiveIntegerField(default=0) # Degree in ConnectionEdge, kept by signals
     last_active = models.DateTimeField(auto_now=True)
 
     # --- IMPORTANT CHANGE HERE: skills is now a ManyToManyField to the Skill model ---
@@ -120,30 +139,25 @@ class Profile(models.Model):
         return reverse('profile_detail', kwargs={'username': self.user.username}) # Changed 'profile' to 'profile_detail' for common convention
 
     def get_connection_count(self):
-        # This counts accepted connections for the profile
-        # Note: if Connection model's 'accepted' field is used for established connections
-        return Connection.objects.filter(
-            Q(creator=self, accepted=True) | Q(friend=self, accepted=True)
-        ).distinct().count() # Use distinct to avoid double counting if connection creation is not strictly ordered
+        # Denormalised degree, maintained alongside ConnectionEdge (see core/connections.py)
+        return self.connection_count
 
     def get_post_count(self):
         return self.posts.count()
 
     def get_follower_count(self):
-        # This definition of 'follower' implies non-symmetrical connections.
-        # If 'Connection' is purely symmetrical, this method might be misleading.
-        # Assuming 'friend' in Connection means "who accepted the request" if symmetrical means A connected to B, and B connected to A.
-        # If 'Connection' is used to represent followers, this logic would be correct.
-        return Connection.objects.filter(friend=self, accepted=True).count()
+        # Connections are mutual, so everyone connected to this profile follows it
+        return self.connection_count
 
     
 
     def get_connections(self):
-        # Returns all established connections (both where current profile is creator or friend)
+        # Returns all established connections, whichever side created them.
+        # Each half is an index probe on ConnectionEdge; no join fan-out, so no distinct()
         return Profile.objects.filter(
-            Q(created_connections__friend=self, created_connections__accepted=True) |
-            Q(friend_connections__creator=self, friend_connections__accepted=True)
-        ).distinct()
+            Q(pk__in=ConnectionEdge.objects.filter(profile_low=self).values('profile_high')) |
+            Q(pk__in=ConnectionEdge.objects.filter(profile_high=self).values('profile_low'))
+        )
     
 
     def get_pending_requests(self):
@@ -152,28 +166,20 @@ class Profile(models.Model):
 
     def is_connected_with(self, other_profile):
         """
-        Checks if the current profile is connected with another profile.
-        Assumes 'Connection' model implies an accepted, established connection.
+        Checks if the current profile is connected with another profile:
+        one probe on ConnectionEdge's unique (low, high) index.
         """
-        return Connection.objects.filter(
-            (Q(creator=self, friend=other_profile) | Q(creator=other_profile, friend=self)),
-            accepted=True
-        ).exists()
+        low_id, high_id = sorted((self.pk, other_profile.pk))
+        return ConnectionEdge.objects.filter(profile_low_id=low_id, profile_high_id=high_id).exists()
 
     def get_skills_display(self):
         """Returns a comma-separated string of the profile's skills."""
         return ", ".join([skill.name for skill in self.skills.all()])
     
     def get_suggested_connects(self, limit=10):
-        """Returns a queryset of suggested User objects for this profile."""
-        connected_user_ids = self.connections.values_list('user_id', flat=True)
-        pending_sent_request_receiver_ids = self.user.sent_connection_requests.filter(status='pending').values_list('receiver_id', flat=True)
-        pending_received_request_sender_ids = self.user.received_connection_requests.filter(status='pending').values_list('sender_id', flat=True)
-
-        exclude_ids = list(connected_user_ids) + list(pending_sent_request_receiver_ids) + list(pending_received_request_sender_ids) + [self.user.id]
-
-        suggested_users = User.objects.exclude(id__in=exclude_ids).filter(profile__isnull=False).order_by('?')[:limit]
-        return suggested_users.select_related('profile')
+        """Returns up to ``limit`` suggested Users for this profile (see core/recommendations.py)."""
+        from .recommendations import suggested_users # Local import: recommendations imports models
+        return suggested_users(self, limit=limit)
     
 
 class Connection(models.Model):
@@ -189,6 +195,26 @@ class Connection(models.Model):
     def __str__(self):
         return f"{self.creator} -> {self.friend} ({'accepted' if self.accepted else 'pending'})"
 
+class ConnectionEdge(models.Model):
+    """
+    One accepted connection, stored once per pair with the lower profile id
+    in ``profile_low``, whichever side sent the request. Derived from
+    Connection by signals; see core/connections.py.
+    """
+    profile_low = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='edges_as_low')
+    profile_high = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='edges_as_high')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('profile_low', 'profile_high')
+        indexes = [
+            # unique_together covers lookups by profile_low; this covers the other side
+            models.Index(fields=['profile_high', 'profile_low'], name='connectionedge_high_low_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.profile_low} <-> {self.profile_high}"
+
 class ConnectionRequest(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -216,15 +242,65 @@ class ConnectionRequest(models.Model):
             self.create_notification()
     
     def create_notification(self):
-        Notification.objects.create(
-            recipient=self.receiver,
-            sender=self.sender,
-            message=f"{self.sender.username} wants to connect with you",
-            notification_type='connection_request',
-            related_object_id=self.id
+        from .notifications import notify # Local import: notifications imports models
+        notify(
+            self.receiver,
+            self.sender,
+            'connection_request',
+            f"{self.sender.username} wants to connect with you",
+            target=self,
         )
 
 
+class ConnectionSuggestion(models.Model):
+    """
+    One precomputed "people you may know" entry: ``candidate`` scored for
+    ``profile`` by mutual connections and shared skills/subjects. Each
+    profile keeps its top settings.SUGGESTION_TOP_K rows; see
+    core/recommendations.py.
+    """
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='connection_suggestions')
+    candidate = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='suggested_to')
+    score = models.PositiveIntegerField(default=0)
+    mutual_count = models.PositiveIntegerField(default=0)
+    shared_interest_count = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('profile', 'candidate')
+        ordering = ['-score', 'candidate']
+        indexes = [
+            models.Index(fields=['profile', '-score', 'candidate'], name='suggestion_profile_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.candidate} for {self.profile} ({self.score})"
+
+class PeopleSearchToken(models.Model):
+    """
+    One normalised word from a user's name, email, profile or skills, so
+    people search is a prefix range scan on ``token`` instead of a LIKE
+    over joined tables. Maintained by signals; see core/people_search.py.
+    """
+    PUBLIC = 'public'
+    EMAIL = 'email' # Only matched by the admin user search
+    FIELDS = [
+        (PUBLIC, 'Name, profile or skill'),
+        (EMAIL, 'Email'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_tokens')
+    field = models.CharField(max_length=10, choices=FIELDS, default=PUBLIC)
+    token = models.CharField(max_length=64)
+
+    class Meta:
+        # The unique index leads with (field, token), so it also serves prefix ranges within a field
+        unique_together = ('field', 'token', 'user')
+
+    def __str__(self):
+        return f"{self.token} -> {self.user_id}"
+
+
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 class Notification(models.Model):
@@ -241,6 +317,7 @@ class Notification(models.Model):
     notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
     message = models.CharField(max_length=255)
     read = models.BooleanField(default=False)
+    count = models.PositiveIntegerField(default=1) # Events folded into this row (see core/notifications.py)
     created_at = models.DateTimeField(auto_now_add=True)
     related_object_id = models.PositiveIntegerField(null=True, blank=True)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
@@ -249,13 +326,21 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unread badge counts, the navbar dropdown and coalescing lookups
+            models.Index(fields=['recipient', 'read', '-created_at'], name='notification_unread_idx'),
+            # Message.mark_as_read: notifications pointing at one object
+            models.Index(fields=['content_type', 'object_id', 'recipient', 'read'], name='notification_target_idx'),
+        ]
     
     def __str__(self):
         return f"{self.notification_type} notification for {self.recipient.username}"
     
     def mark_as_read(self):
+        from .notifications import invalidate_notification_summary # Local import: notifications imports models
         self.read = True
         self.save()
+        invalidate_notification_summary(self.recipient_id)
 
     @property
     def link(self):
@@ -292,7 +377,17 @@ class Post(models.Model):
     video_url = models.URLField(blank=True)
     document = models.FileField(upload_to='posts/documents/%Y/%m/%d/', blank=True)
     image = models.ImageField(upload_to='posts/images/%Y/%m/%d/', blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False) # See core/images.py
     likes = models.ManyToManyField(Profile, related_name='liked_posts', blank=True)
+
+    # Denormalised counters, kept current by core/counters.py and repaired
+    # by the reconcile_post_counters command. Read these instead of COUNT(*).
+    # Like views, they are never written by a full save(); see INCREMENTED_FIELDS.
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    share_count = models.PositiveIntegerField(default=0)
+    # Detail-page views, flushed in batches from core/view_counter.py; never saved with the post
+    views = models.PositiveBigIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -304,15 +399,47 @@ class Post(models.Model):
     def __str__(self):
         return f"{self.title} by {self.author.user.username}"
     
+    # Only ever changed through F() increments (core/counters.py, core/view_counter.py)
+    INCREMENTED_FIELDS = ('like_count', 'comment_count', 'share_count', 'views')
+
+    def save(self, *args, **kwargs):
+        # A full save must not write back stale copies of the counters over concurrent increments
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.INCREMENTED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def get_like_count(self):
-        return self.likes.count()
+        return self.like_count
     
     def get_comment_count(self):
-        return self.comments.count()
+        return self.comment_count
     
     def get_absolute_url(self):
         return reverse('post_detail', kwargs={'pk': self.pk})
 
+class TimelineEntry(models.Model):
+    """
+    One post id pushed into a profile's precomputed home timeline.
+    Rows are written when a post is created (fan-out on write) and trimmed
+    to settings.TIMELINE_MAX_LENGTH per owner; see core/timeline.py.
+    """
+    owner = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_at = models.DateTimeField() # Copy of post.created_at so reads never join Post
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        ordering = ['-created_at', '-post']
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in {self.owner_id}'s timeline"
+
 class Comment(models.Model):
     user = models.ForeignKey(Profile, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
@@ -345,6 +472,12 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['timestamp'] # Keep messages ordered by time
+        indexes = [
+            # One direction of a conversation, in time order (chat history/polling)
+            models.Index(fields=['sender', 'recipient', 'timestamp'], name='message_pair_time_idx'),
+            # Unread messages for a user
+            models.Index(fields=['recipient', 'read'], name='message_recipient_unread_idx'),
+        ]
 
     def __str__(self):
         # Provide a more descriptive string representation
@@ -358,48 +491,22 @@ class Message(models.Model):
             return f"Empty message from {self.sender.username} to {self.recipient.username}"
 
 
-    # Override save method to create notification for new messages
-    def save(self, *args, **kwargs):
-        is_new = not self.pk # Check if this is a new message being created
-        super().save(*args, **kwargs) # Save the message first to get its ID
-        if is_new:
-            self.create_notification()
-
-    # Helper method to create a notification
-    def create_notification(self):
-        notification_message = f"New message from {self.sender.username}"
-        if self.file_name:
-            # Shorten content for notification if both content and file exist
-            display_content = self.content[:20] + '...' if self.content else ''
-            inner = f': "{display_content}"' if display_content else ''
-            notification_message += f"{inner} (with attachment: {self.file_name})"
-        elif not self.content: # If only a file, and no explicit content
-             notification_message = f"New file from {self.sender.username} ({self.file_name})"
-
-        Notification.objects.create(
-            recipient=self.recipient,
-            sender=self.sender,
-            notification_type='message', # Or 'new_message_with_attachment' for more specificity
-            message=notification_message,
-            
-            # Use GenericForeignKey fields to link to the Message object
-            content_type=ContentType.objects.get_for_model(self),
-            object_id=self.id
-        )
-
     # Mark message and related notification as read
     def mark_as_read(self):
         if not self.read:
             self.read = True
             self.save(update_fields=['read']) # Use update_fields for efficiency
 
+            from .conversations import message_read # Local imports: both modules import models
+            message_read(self)
+
             # Mark related notification(s) as read
-            Notification.objects.filter(
+            from .notifications import mark_notifications_read
+            mark_notifications_read(
+                self.recipient,
                 content_type=ContentType.objects.get_for_model(self),
                 object_id=self.id,
-                recipient=self.recipient,
-                read=False # Only mark unread notifications
-            ).update(read=True)
+            )
 
     # --- Helper Properties for Frontend (accessed via API response) ---
     @property
@@ -443,12 +550,49 @@ class Message(models.Model):
         ]
         return self.file_type in doc_types
 
+
+
+class Conversation(models.Model):
+    """
+    Materialised summary of the message thread between two users, so the
+    inbox renders from one indexed query instead of aggregating Message.
+    The pair is stored in canonical order (user_low.id < user_high.id) and
+    maintained by core/conversations.py whenever a message is saved, read
+    or deleted.
+    """
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations_as_low')
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations_as_high')
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=255, blank=True)
+    last_sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    unread_low = models.PositiveIntegerField(default=0)  # Unread messages waiting for user_low
+    unread_high = models.PositiveIntegerField(default=0) # Unread messages waiting for user_high
+
+    class Meta:
+        unique_together = ('user_low', 'user_high')
+        ordering = ['-last_message_at']
+        indexes = [
+            models.Index(fields=['user_low', '-last_message_at'], name='conversation_low_recent_idx'),
+            models.Index(fields=['user_high', '-last_message_at'], name='conversation_high_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Conversation between {self.user_low_id} and {self.user_high_id}"
+
+    def other_user(self, user):
+        return self.user_high if user.pk == self.user_low_id else self.user_low
+
+    def unread_for(self, user):
+        return self.unread_low if user.pk == self.user_low_id else self.unread_high
+
         
 class Project(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='projects')
     title = models.CharField(max_length=200)
     description = models.TextField()
     image = models.ImageField(upload_to='project_images/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False) # See core/images.py
     link = models.URLField(blank=True)
     date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
@@ -575,6 +719,85 @@ class Submission(models.Model):
     class Meta:
         ordering = ['-submitted_at']
         unique_together = ('challenge', 'user')
+        indexes = [
+            # Leaderboard order; unscored submissions never rank, so they stay out of the index
+            models.Index(fields=['challenge', '-score', 'submitted_at'], name='submission_leaderboard_idx',
+                         condition=Q(score__isnull=False)),
+        ]
     
     def __str__(self):
-        return f"{self.user.user.username}'s submission for {self.challenge.title}"
\ No newline at end of file
+        return f"{self.user.user.username}'s submission for {self.challenge.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'challenge_id' in instance.__dict__ and 'score' in instance.__dict__:
+            # The ranking as loaded, so a re-score can move the right bucket (see core/leaderboard.py)
+            instance._leaderboard_key = (instance.challenge_id, instance.score)
+        return instance
+
+
+class LeaderboardBucket(models.Model):
+    """
+    How many of a challenge's submissions hold each score, kept by signals
+    (see core/leaderboard.py). A rank is the sum of the buckets above a
+    score plus the ties submitted earlier.
+    """
+    challenge = models.ForeignKey(Challenge, on_delete=models.CASCADE, related_name='leaderboard_buckets')
+    score = models.PositiveIntegerField()
+    submissions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('challenge', 'score')
+
+class UploadSession(models.Model):
+    """
+    A chunked, resumable upload in progress. Chunks are written to disk as
+    they arrive and assembled into one file on completion; only then can
+    the file be attached to a Message or Submission. See core/uploads.py.
+    """
+    PURPOSES = [
+        ('message', 'Chat attachment'),
+        ('submission', 'Challenge submission'),
+    ]
+    STATUSES = [
+        ('pending', 'Receiving chunks'),
+        ('complete', 'Assembled'),
+        ('attached', 'Attached'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    purpose = models.CharField(max_length=20, choices=PURPOSES)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True) # Whole-file checksum, checked on completion when given
+    status = models.CharField(max_length=20, choices=STATUSES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.status}) by {self.user_id}"
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('session', 'index')
+
+    def __str__(self):
+        return f"Chunk {self.index} of {self.session_id}"
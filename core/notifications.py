@@ -0,0 +1,322 @@
+# core/notifications.py
+
+"""
+Single write path for Notification rows.
+
+Callers describe a notification with ``notify``, or one of the
+``notify_*`` helpers for messages, likes and comments. Nothing is written
+until the surrounding transaction commits. Pending notifications are then
+handed to a dispatcher that writes them in batches with ``bulk_create`` from a
+background worker thread (or inline when NOTIFICATION_DISPATCH_ASYNC is
+off, e.g. in tests and management commands).
+
+Chatty types (messages, likes, comments) are coalesced per
+(recipient, sender, type): while an unread notification for the same key
+is younger than NOTIFICATION_COALESCE_WINDOW seconds, new events bump its
+``count`` and rewrite its text ("5 new messages from alice") instead of
+adding rows.
+
+``get_notification_summary`` serves the navbar badge and dropdown from the
+cache; every write path here (create, coalesce, mark-read) drops the
+affected users' cached summaries.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.contenttypes.models import ContentType
+from django.db import OperationalError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Notification, Post
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COALESCE_WINDOW = 15 * 60  # seconds
+DEFAULT_SUMMARY_TIMEOUT = 5 * 60  # seconds
+SUMMARY_RECENT_LENGTH = 5
+MAX_BATCH_SIZE = 500
+WRITE_ATTEMPTS = 3
+
+# Text used once a notification stands for more than one event
+COALESCED_MESSAGES = {
+    'message': "{count} new messages from {sender}",
+    'post_like': "{sender} liked your posts {count} times",
+    'post_comment': "{sender} left {count} new comments",
+}
+
+PendingNotification = namedtuple(
+    'PendingNotification',
+    'recipient_id sender_id sender_username notification_type message content_type_id object_id',
+)
+
+
+def notify(recipient, sender, notification_type, message, target=None):
+    """
+    Queues a notification for ``recipient``. ``target`` is the optional
+    object it points at (stored through the generic foreign key). The row is
+    written after the current transaction commits, so a rolled-back action
+    never leaves a notification behind.
+    """
+    _notify_user_id(recipient.pk, sender, notification_type, message, target)
+
+
+def _notify_user_id(recipient_id, sender, notification_type, message, target=None):
+    item = PendingNotification(
+        recipient_id=recipient_id,
+        sender_id=sender.pk,
+        sender_username=sender.username,
+        notification_type=notification_type,
+        message=message[:255],
+        content_type_id=ContentType.objects.get_for_model(target).pk if target is not None else None,
+        object_id=target.pk if target is not None else None,
+    )
+    transaction.on_commit(lambda: get_dispatcher().submit(item))
+
+
+def message_notification_text(message):
+    """Text of the notification for a single chat message."""
+    text = f"New message from {message.sender.username}"
+    if message.file_name:
+        # Shorten content for notification if both content and file exist
+        display_content = message.content[:20] + '...' if message.content else ''
+        inner = f': "{display_content}"' if display_content else ''
+        text += f"{inner} (with attachment: {message.file_name})"
+    elif not message.content:  # If only a file, and no explicit content
+        text = f"New file from {message.sender.username} ({message.file_name})"
+    return text
+
+
+def notify_message(message):
+    notify(message.recipient, message.sender, 'message', message_notification_text(message), target=message)
+
+
+def notify_post_like(liker, post_id):
+    """Tells the author of ``post_id`` that ``liker`` (a User) liked it; own posts are skipped."""
+    post = Post.objects.only('id', 'author_id').filter(pk=post_id).first()
+    if post is None or post.author_id == liker.pk:  # Profile.pk == user.pk
+        return
+    _notify_user_id(post.author_id, liker, 'post_like', f"{liker.username} liked your post", target=post)
+
+
+def notify_comment(comment):
+    """Tells the post's author about a new comment; own comments are skipped."""
+    post = comment.post
+    if post.author_id == comment.user_id:
+        return
+    sender = comment.user.user
+    _notify_user_id(post.author_id, sender, 'post_comment', f"{sender.username} commented on your post", target=post)
+
+
+def _coalesce_window():
+    return timedelta(seconds=getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', DEFAULT_COALESCE_WINDOW))
+
+
+def _coalesced_text(item, count):
+    return COALESCED_MESSAGES[item.notification_type].format(count=count, sender=item.sender_username)[:255]
+
+
+def write_notifications(items):
+    """
+    Writes a batch of pending notifications: coalescable ones are folded
+    into an open notification for the same key where one exists, the rest
+    are inserted with a single bulk_create. Returns the number of new rows.
+    """
+    groups = OrderedDict()
+    to_create = []
+    for item in items:
+        if item.notification_type in COALESCED_MESSAGES:
+            key = (item.recipient_id, item.sender_id, item.notification_type)
+            groups.setdefault(key, []).append(item)
+        else:
+            to_create.append(Notification(
+                recipient_id=item.recipient_id,
+                sender_id=item.sender_id,
+                notification_type=item.notification_type,
+                message=item.message,
+                content_type_id=item.content_type_id,
+                object_id=item.object_id,
+            ))
+
+    now = timezone.now()
+    open_notifications = {}
+    if groups:
+        # One query finds the newest unread notification for every key in the batch
+        candidates = Notification.objects.filter(
+            read=False,
+            created_at__gte=now - _coalesce_window(),
+            recipient_id__in={key[0] for key in groups},
+            sender_id__in={key[1] for key in groups},
+            notification_type__in={key[2] for key in groups},
+        ).order_by('-created_at', '-id')
+        for notification in candidates:
+            key = (notification.recipient_id, notification.sender_id, notification.notification_type)
+            if key in groups:
+                open_notifications.setdefault(key, notification)
+
+    to_update = []
+    for key, group in groups.items():
+        latest = group[-1]
+        existing = open_notifications.get(key)
+        if existing is not None:
+            existing.count += len(group)
+            existing.message = _coalesced_text(latest, existing.count)
+            existing.content_type_id = latest.content_type_id
+            existing.object_id = latest.object_id
+            existing.created_at = now  # Resurface it at the top of the list
+            to_update.append(existing)
+        else:
+            to_create.append(Notification(
+                recipient_id=latest.recipient_id,
+                sender_id=latest.sender_id,
+                notification_type=latest.notification_type,
+                message=latest.message if len(group) == 1 else _coalesced_text(latest, len(group)),
+                count=len(group),
+                content_type_id=latest.content_type_id,
+                object_id=latest.object_id,
+            ))
+
+    if to_update:
+        Notification.objects.bulk_update(to_update, ['count', 'message', 'content_type', 'object_id', 'created_at'])
+    if to_create:
+        Notification.objects.bulk_create(to_create)
+    invalidate_notification_summary(*{item.recipient_id for item in items})
+    return len(to_create)
+
+
+def _summary_key(user_id):
+    return f'notifications:summary:{user_id}'
+
+
+def get_notification_summary(user):
+    """
+    Returns ``{'unread_count': int, 'recent': [dict, ...]}`` for ``user``:
+    the unread badge count and the newest few notifications (id, message,
+    read, created_at) for the navbar dropdown. Served from the cache; a miss
+    costs one COUNT and one small SELECT.
+    """
+    key = _summary_key(user.pk)
+    summary = cache.get(key)
+    if summary is None:
+        notifications = Notification.objects.filter(recipient_id=user.pk)
+        summary = {
+            'unread_count': notifications.filter(read=False).count(),
+            'recent': list(
+                notifications.order_by('-created_at', '-id')
+                             .values('id', 'message', 'read', 'created_at')[:SUMMARY_RECENT_LENGTH]
+            ),
+        }
+        cache.set(key, summary, getattr(settings, 'NOTIFICATION_SUMMARY_TIMEOUT', DEFAULT_SUMMARY_TIMEOUT))
+    return summary
+
+
+def invalidate_notification_summary(*user_ids):
+    if user_ids:
+        cache.delete_many([_summary_key(user_id) for user_id in user_ids])
+
+
+def mark_notifications_read(user, **filters):
+    """
+    Marks ``user``'s unread notifications (optionally narrowed by
+    ``filters``) as read. Returns the number of rows updated.
+    """
+    updated = Notification.objects.filter(recipient_id=user.pk, read=False, **filters).update(read=True)
+    if updated:
+        invalidate_notification_summary(user.pk)
+    return updated
+
+
+class NotificationDispatcher:
+    """
+    Collects committed notifications and writes them in batches. In async
+    mode one daemon thread drains the queue, so a burst of events from many
+    requests turns into a handful of bulk writes.
+    """
+
+    def __init__(self, run_async=True, batch_size=MAX_BATCH_SIZE):
+        self.run_async = run_async
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        if not self.run_async:
+            write_notifications([item])
+            return
+        self._queue.put(item)
+        self._ensure_worker()
+
+    def flush(self):
+        """Blocks until everything submitted so far has been written."""
+        if self._worker is not None:
+            self._queue.join()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='notification-dispatcher', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                close_old_connections()
+                write_notifications(batch)
+                return
+            except OperationalError:
+                # Usually a lock held by a request's write; back off and retry
+                if attempt == WRITE_ATTEMPTS:
+                    logger.exception("Failed to write %d notifications", len(batch))
+                else:
+                    time.sleep(0.05 * attempt)
+            except Exception:
+                logger.exception("Failed to write %d notifications", len(batch))
+                return
+            finally:
+                close_old_connections()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = NotificationDispatcher(
+                    run_async=getattr(settings, 'NOTIFICATION_DISPATCH_ASYNC', True),
+                )
+                atexit.register(_dispatcher.flush)
+    return _dispatcher
+
+
+def reset_dispatcher():
+    """Drops the cached dispatcher (used when settings change, e.g. in tests)."""
+    global _dispatcher
+    if _dispatcher is not None:
+        _dispatcher.flush()
+    _dispatcher = None
@@ -0,0 +1,193 @@
+# core/people_search.py
+
+"""
+Indexed people search.
+
+Every user's searchable text is split into lowercase, accent-folded words
+and stored as PeopleSearchToken rows. The public tokens cover username,
+first and last name, the profile's institution, location and headline,
+and skill names. Email words are stored under their own ``field`` and are
+only matched when a caller asks for them (the admin user search), so
+members cannot look each other up by email. A query term matches a user
+when it is a prefix of one of their tokens. That check is a range scan on
+the (field, token, user) index (``token >= term AND token < term +
+U+FFFF``), which every database serves from a B-tree, unlike
+``icontains``. Multi-word queries must match every term.
+
+Signals refresh a user's tokens when their User, Profile or skills change.
+A refresh writes only the difference, so repeated saves of unchanged data
+cost a couple of reads. ``manage.py rebuild_people_search`` rebuilds
+everything.
+"""
+
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.urls import reverse
+
+from .models import PeopleSearchToken, User
+
+MAX_TOKEN_LENGTH = 64
+MAX_QUERY_TERMS = 5
+AUTOCOMPLETE_LIMIT = 8
+REBUILD_BATCH_SIZE = 500
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+PREFIX_END = '\uffff'
+
+
+def normalise(text):
+    """Lowercases ``text`` and strips accents, so 'José' and 'jose' match."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def tokenize(*values):
+    tokens = set()
+    for value in values:
+        for word in WORD_RE.findall(normalise(value)):
+            tokens.add(word[:MAX_TOKEN_LENGTH])
+    return tokens
+
+
+def query_terms(query):
+    return sorted(tokenize(query))[:MAX_QUERY_TERMS]
+
+
+def user_tokens(user, skill_names=()):
+    """The ``(field, token)`` set for ``user`` (with ``profile`` loaded, if they have one)."""
+    profile = getattr(user, 'profile', None)
+    values = [user.username, user.first_name, user.last_name, *skill_names]
+    if profile is not None:
+        values += [profile.institution, profile.location, profile.headline]
+    public = tokenize(*values)
+    # Usernames may contain . @ + -; keep the whole name searchable as well
+    public.add(normalise(user.username)[:MAX_TOKEN_LENGTH])
+    return ({(PeopleSearchToken.PUBLIC, token) for token in public}
+            | {(PeopleSearchToken.EMAIL, token) for token in tokenize(user.email)})
+
+
+def _load_users(user_ids):
+    users = list(User.objects.filter(pk__in=user_ids).select_related('profile').prefetch_related('profile__skills'))
+    for user in users:
+        profile = getattr(user, 'profile', None)
+        user.search_skill_names = [skill.name for skill in profile.skills.all()] if profile is not None else []
+    return users
+
+
+def refresh_users(user_ids):
+    """Brings the tokens of ``user_ids`` up to date, writing only what changed."""
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return
+    if len(user_ids) > REBUILD_BATCH_SIZE:
+        for start in range(0, len(user_ids), REBUILD_BATCH_SIZE):
+            refresh_users(user_ids[start:start + REBUILD_BATCH_SIZE])
+        return
+    existing = {}
+    for user_id, field, token in PeopleSearchToken.objects.filter(user_id__in=user_ids)\
+                                                         .values_list('user_id', 'field', 'token'):
+        existing.setdefault(user_id, set()).add((field, token))
+
+    to_create, to_delete = [], {}
+    for user in _load_users(user_ids):
+        wanted = user_tokens(user, user.search_skill_names)
+        current = existing.get(user.pk, set())
+        to_create += [PeopleSearchToken(user_id=user.pk, field=field, token=token) for field, token in wanted - current]
+        if current - wanted:
+            to_delete[user.pk] = current - wanted
+
+    if not to_create and not to_delete:
+        return
+    with transaction.atomic():
+        for user_id, tokens in to_delete.items():
+            for field in {field for field, _ in tokens}:
+                PeopleSearchToken.objects.filter(
+                    user_id=user_id, field=field, token__in=[token for f, token in tokens if f == field],
+                ).delete()
+        PeopleSearchToken.objects.bulk_create(to_create, ignore_conflicts=True)
+
+
+def rebuild_index(batch_size=REBUILD_BATCH_SIZE):
+    """Recreates every user's tokens. Returns the number of users indexed."""
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    with transaction.atomic():
+        PeopleSearchToken.objects.all().delete()
+        for start in range(0, len(user_ids), batch_size):
+            PeopleSearchToken.objects.bulk_create([
+                PeopleSearchToken(user_id=user.pk, field=field, token=token)
+                for user in _load_users(user_ids[start:start + batch_size])
+                for field, token in user_tokens(user, user.search_skill_names)
+            ], batch_size=1000)
+    return len(user_ids)
+
+
+PUBLIC_FIELDS = [PeopleSearchToken.PUBLIC]
+ALL_FIELDS = [PeopleSearchToken.PUBLIC, PeopleSearchToken.EMAIL]
+
+
+def _prefix_matches(term, fields=PUBLIC_FIELDS):
+    return PeopleSearchToken.objects.filter(field__in=fields, token__gte=term, token__lt=term + PREFIX_END)
+
+
+def _has_prefix(term, user_ref, fields=PUBLIC_FIELDS):
+    # Probes one user's handful of tokens through the user_id index, however common the term is
+    return Exists(_prefix_matches(term, fields).filter(user_id=user_ref))
+
+
+def search_users(query, queryset=None, include_email=False):
+    """
+    Narrows ``queryset`` (all users by default) to those matching every
+    word of ``query`` as a prefix. The longest (most selective) term is a
+    range scan on the token index, and the others are checked per
+    candidate, so no join or ``distinct()`` is needed. Email words only
+    count with ``include_email``, which is meant for admin screens.
+    """
+    queryset = User.objects.all() if queryset is None else queryset
+    terms = sorted(query_terms(query), key=len, reverse=True)
+    if not terms:
+        return queryset
+    fields = ALL_FIELDS if include_email else PUBLIC_FIELDS
+    queryset = queryset.filter(pk__in=_prefix_matches(terms[0], fields).values('user_id'))
+    for term in terms[1:]:
+        queryset = queryset.filter(_has_prefix(term, OuterRef('pk'), fields))
+    return queryset
+
+
+def autocomplete(query, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Up to ``limit`` ``{'username', 'name', 'headline', 'url'}`` dicts for a
+    search box. The longest term drives an index walk in token order, which
+    stops as soon as enough users are found. The other terms are checked
+    per candidate.
+    """
+    terms = sorted(query_terms(query), key=len, reverse=True)
+    if not terms:
+        return []
+    candidates = _prefix_matches(terms[0])
+    for term in terms[1:]:
+        candidates = candidates.filter(_has_prefix(term, OuterRef('user_id')))
+
+    user_ids = []
+    # A user can match through several tokens; over-fetch a little and dedupe
+    for user_id in candidates.filter(user__is_active=True).order_by('token', 'user_id') \
+                             .values_list('user_id', flat=True)[:limit * 4]:
+        if user_id not in user_ids:
+            user_ids.append(user_id)
+            if len(user_ids) == limit:
+                break
+
+    users = User.objects.select_related('profile').in_bulk(user_ids)
+    results = []
+    for user_id in user_ids:
+        user = users[user_id]
+        profile = getattr(user, 'profile', None)
+        results.append({
+            'username': user.username,
+            'name': user.get_full_name() or user.username,
+            'headline': profile.headline if profile is not None else '',
+            'url': reverse('profile_view', args=[user.username]),
+        })
+    return results
@@ -0,0 +1,148 @@
+# core/post_cards.py
+
+"""
+Fragment cache for posts/post_card.html.
+
+A card is split into parts that look the same to every viewer and parts
+that depend on who is looking. The shared parts are the author block, the
+body (text, media, counts) and each of the first comments. Each is wrapped
+in ``{% post_card_fragment post 'name' %}`` (``post 'comment' comment`` for
+a comment) and cached. The viewer's and the clock's parts stay live:
+timesince, connection status, the owner's menu and edit modal, the like
+button state, and the comment form avatar.
+
+A fragment key combines three things:
+- the post id
+- the post's version stamp: a counter in the cache, bumped after commit
+  whenever the post is saved, its like/comment/share counters move, or
+  one of its comments changes
+- for the author block and each comment, a fingerprint of the author's
+  or commenter's name and avatar taken from the already-loaded profile
+  row, so a new profile picture or finished derivatives change the key
+  without touching any post; the body likewise notes whether the post
+  image's derivatives are ready
+
+Old fragments are never deleted; their keys stop being asked for, and
+they expire after POST_CARD_CACHE_TIMEOUT. ``prime`` fetches the stamps
+and fragments for a whole page in two ``get_many`` calls; the comments it
+keys come from the queryset's prefetch (core.feed.feed_queryset). Without
+it, each card looks its own up.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+DEFAULT_TIMEOUT = 60 * 60  # seconds
+FRAGMENTS = ('author', 'body')  # Plus one 'comment' fragment per shown comment
+SHOWN_COMMENTS = 3
+
+
+def cache_timeout():
+    return getattr(settings, 'POST_CARD_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def _version_key(post_id):
+    return f'postcard:version:{post_id}'
+
+
+def _new_version():
+    # Time-based, so a stamp recreated after eviction never matches an older fragment
+    return time.time_ns() // 1000
+
+
+def get_versions(post_ids):
+    """``{post_id: version}``, creating stamps for posts that have none."""
+    keys = {_version_key(post_id): post_id for post_id in post_ids}
+    found = cache.get_many(keys)
+    versions = {keys[key]: value for key, value in found.items()}
+    for key, post_id in keys.items():
+        if post_id not in versions:
+            cache.add(key, _new_version(), cache_timeout() * 24)
+            versions[post_id] = cache.get(key)
+    return versions
+
+
+def bump(post_id):
+    """Gives ``post_id`` a new stamp, so its cached fragments are no longer used."""
+    try:
+        cache.incr(_version_key(post_id))
+    except ValueError:
+        pass  # No stamp yet, so nothing is cached under one
+
+
+def invalidate(post_id):
+    """Bumps ``post_id``'s stamp once the current transaction commits."""
+    transaction.on_commit(lambda: bump(post_id))
+
+
+def profile_fingerprint(profile):
+    user = profile.user
+    variants = profile.profile_pic_variants or {}
+    parts = (user.username, user.first_name, user.last_name, profile.profile_pic.name or '', variants.get('source', ''))
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()[:12]
+
+
+def author_fingerprint(post):
+    return profile_fingerprint(post.author)
+
+
+def shown_comments(post):
+    """The comments a card shows, taken from the prefetch when there is one."""
+    if not post.comment_count:
+        return []
+    return list(post.comments.all()[:SHOWN_COMMENTS])
+
+
+def fragment_key(post, name, version, item=None):
+    key = f'postcard:{post.pk}:{version}:{name}'
+    if name == 'author':
+        key += f':{author_fingerprint(post)}'
+    elif name == 'comment':
+        key += f':{item.pk}:{profile_fingerprint(item.user)}'
+    elif name == 'body' and post.image:
+        # Derivatives are recorded with a plain UPDATE (core/images.py), which bumps nothing
+        key += ':img' if (post.image_variants or {}).get('source') == post.image.name else ':orig'
+    return key
+
+
+def _attach(post, version, fragments):
+    post.card_version = version
+    post.card_fragments = fragments
+
+
+def prime(posts):
+    """Looks up the stamps and cached fragments for every card in ``posts`` at once."""
+    posts = [post for post in posts if post is not None]
+    if not posts or not cache_timeout():
+        return posts
+    versions = get_versions([post.pk for post in posts])
+    keys = {}
+    for post in posts:
+        version = versions[post.pk]
+        for name in FRAGMENTS:
+            keys[fragment_key(post, name, version)] = post.pk
+        for comment in shown_comments(post):
+            keys[fragment_key(post, 'comment', version, comment)] = post.pk
+    found = cache.get_many(keys)
+    fragments = {post.pk: {} for post in posts}
+    for key, html in found.items():
+        fragments[keys[key]][key] = html
+    for post in posts:
+        _attach(post, versions[post.pk], fragments[post.pk])
+    return posts
+
+
+def get_fragment(post, name, item=None):
+    """``(key, cached html or None)`` for one fragment of ``post``; caching must be enabled."""
+    if not hasattr(post, 'card_version'):
+        prime([post])
+    key = fragment_key(post, name, post.card_version, item)
+    return key, post.card_fragments.get(key)
+
+
+def store_fragment(key, html):
+    cache.set(key, html, cache_timeout())
@@ -0,0 +1,132 @@
+# core/query_audit.py
+
+"""
+EXPLAIN-based audit of the app's hot querysets.
+
+``_catalogue()`` lists the querysets behind the busiest pages and
+endpoints, built the same way the app builds them. ``audit_queries`` asks
+the database for each one's plan and reports any that read a whole table:
+``SCAN <table>`` without an index on SQLite, ``Seq Scan on <table>`` on
+PostgreSQL. SQLite names tables inside subqueries by their alias
+(``SCAN U0``), so aliases are mapped back to tables from the query's SQL.
+Postgres happily seq-scans small tables, so the audit runs with
+``enable_seqscan`` off; a sequential scan that survives that means no index
+can serve the query at all.
+"""
+
+import re
+from collections import namedtuple
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .conversations import inbox_for
+from .directory import directory_queryset
+from .people_search import search_users
+from .models import ConnectionEdge, Message, Notification, Profile, TimelineEntry, User
+
+QueryPlan = namedtuple('QueryPlan', 'name plan full_scans')
+
+SQLITE_SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?"?(\w+)"?(.*)$')
+POSTGRES_SEQ_SCAN_RE = re.compile(r'Seq Scan on "?(\w+)"?')
+# Django's table aliases: FROM "core_skill" U0, INNER JOIN "core_profile_skills" T3
+SQL_ALIAS_RE = re.compile(r'"(\w+)" (?:AS )?"?([A-Z]\d+)"?\b')
+
+
+def _catalogue():
+    # Unsaved instances are enough to build the querysets; EXPLAIN never runs them
+    user, other = User(pk=1), User(pk=2)
+    message_type = ContentType.objects.get_for_model(Message)
+    since = timezone.now()
+    return [
+        ('notifications: unread count',
+         Notification.objects.filter(recipient_id=user.pk, read=False)),
+        ('notifications: recent unread',
+         Notification.objects.filter(recipient_id=user.pk, read=False).order_by('-created_at')),
+        ('notifications: coalesce candidates',
+         Notification.objects.filter(read=False, created_at__gte=since, recipient_id__in=[user.pk],
+                                     sender_id__in=[other.pk], notification_type__in=['message'])),
+        ('notifications: message mark-read',
+         Notification.objects.filter(content_type=message_type, object_id=1, recipient=user, read=False)),
+        ('messages: chat history',
+         Message.objects.filter(Q(sender=user, recipient=other) | Q(sender=other, recipient=user))
+                        .order_by('timestamp', 'id')),
+        ('messages: poll after id',
+         Message.objects.filter(Q(sender=user, recipient=other) | Q(sender=other, recipient=user), id__gt=1)),
+        ('messages: unread for user',
+         Message.objects.filter(recipient=user, read=False)),
+        ('messages: mark conversation read',
+         Message.objects.filter(sender=other, recipient=user, read=False)),
+        ('conversations: inbox',
+         inbox_for(user)),
+        ('connections: membership',
+         ConnectionEdge.objects.filter(profile_low_id=user.pk, profile_high_id=other.pk)),
+        ('connections: list',
+         Profile(pk=user.pk).get_connections()),
+        ('network: directory page',
+         directory_queryset(user, skills=['Python']).filter(username__gt='m').order_by('username')[:13]),
+        ('people: prefix search',
+         search_users('ali sm', User.objects.order_by('-date_joined'))[:25]),
+        ('timeline: first page',
+         TimelineEntry.objects.filter(owner_id=user.pk).order_by('-created_at', '-post_id')),
+    ]
+
+
+def _model_tables():
+    return {model._meta.db_table for model in apps.get_models()}
+
+
+def table_aliases(sql):
+    """
+    ``{alias: {table, ...}}`` for the aliased tables in ``sql``. Separate
+    subqueries reuse aliases (each may have its own U0), so one alias can
+    stand for several tables.
+    """
+    aliases = {}
+    for table, alias in SQL_ALIAS_RE.findall(sql):
+        aliases.setdefault(alias, set()).add(table)
+    return aliases
+
+
+def full_scans(plan, vendor=None, sql=''):
+    """
+    Returns the app tables that ``plan`` (EXPLAIN output text) reads in
+    full. ``sql`` is the query the plan is for, used to resolve aliases.
+    """
+    vendor = vendor or connection.vendor
+    tables = _model_tables()
+    aliases = table_aliases(sql)
+    scanned = []
+    for line in plan.splitlines():
+        if vendor == 'postgresql':
+            match = POSTGRES_SEQ_SCAN_RE.search(line)
+            if match and match.group(1) in tables:
+                scanned.append(match.group(1))
+        else:
+            match = SQLITE_SCAN_RE.search(line)
+            if not match:
+                continue
+            # "SCAN t USING [COVERING] INDEX ..." walks an index; only a bare table scan counts
+            if 'INDEX' in match.group(2):
+                continue
+            # An ambiguous alias is reported under every table it may stand for
+            candidates = sorted(aliases.get(match.group(1), {match.group(1)}) & tables)
+            if candidates:
+                scanned.append(' or '.join(candidates))
+    return scanned
+
+
+def audit_queries(catalogue=None):
+    """EXPLAINs every catalogued queryset. Returns a list of QueryPlan."""
+    results = []
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        for name, queryset in catalogue or _catalogue():
+            plan = queryset.explain()
+            results.append(QueryPlan(name, plan, full_scans(plan, sql=str(queryset.query))))
+    return results
@@ -0,0 +1,268 @@
+# core/recommendations.py
+
+"""
+"People you may know" suggestions.
+
+A candidate's score for a profile is ``MUTUAL_WEIGHT`` per mutual
+connection plus ``INTEREST_WEIGHT`` per shared skill or subject. People the
+profile is already connected to, or has a pending request with, never
+qualify. The top ``SUGGESTION_TOP_K`` candidates per profile are stored as
+ConnectionSuggestion rows, so a suggestion widget is one indexed lookup.
+
+``rebuild_suggestions`` recomputes every profile from the whole connection
+graph (run it periodically). Between rebuilds the lists are kept fresh
+incrementally: an accepted connection recomputes both ends and adds or
+bumps each end in the other's friends' lists, a pending request drops the
+pair, and skill/subject edits recompute that one profile.
+"""
+
+import heapq
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import ConnectionEdge, ConnectionRequest, ConnectionSuggestion, Profile, User
+
+MUTUAL_WEIGHT = 3
+INTEREST_WEIGHT = 1
+DEFAULT_TOP_K = 20
+# Skills/subjects held by more people than this say little about who you know
+# and would make scoring quadratic, so they are ignored
+MAX_INTEREST_HOLDERS = 1000
+
+ProfileSkill = Profile.skills.through
+ProfileSubject = Profile.subjects.through
+
+
+def _top_k():
+    return getattr(settings, 'SUGGESTION_TOP_K', DEFAULT_TOP_K)
+
+
+class _Graph:
+    """The slice of the social graph that scoring needs, as id sets."""
+
+    def __init__(self):
+        self.friends = defaultdict(set)
+        self.pending = defaultdict(set)
+        self.interests = defaultdict(set)  # profile id -> {('skill', id), ('subject', id)}
+        self.holders = defaultdict(set)    # ('skill', id) -> profile ids
+
+    def add_edges(self, edges):
+        for a, b in edges:
+            self.friends[a].add(b)
+            self.friends[b].add(a)
+
+    def add_pending(self, pairs):
+        for a, b in pairs:
+            self.pending[a].add(b)
+            self.pending[b].add(a)
+
+    def add_interests(self, kind, rows, owners=None):
+        for profile_id, interest_id in rows:
+            key = (kind, interest_id)
+            self.holders[key].add(profile_id)
+            if owners is None or profile_id in owners:
+                self.interests[profile_id].add(key)
+
+
+def _accepted_edges(queryset=None):
+    queryset = ConnectionEdge.objects.all() if queryset is None else queryset
+    return queryset.values_list('profile_low_id', 'profile_high_id').iterator()
+
+
+def _pending_pairs(queryset=None):
+    queryset = ConnectionRequest.objects.filter(status='pending') if queryset is None else queryset
+    # Profile's primary key is its user id, so request user ids are profile ids
+    return queryset.values_list('sender_id', 'receiver_id').iterator()
+
+
+def _load_full_graph():
+    graph = _Graph()
+    graph.add_edges(_accepted_edges())
+    graph.add_pending(_pending_pairs())
+    graph.add_interests('skill', ProfileSkill.objects.values_list('profile_id', 'skill_id').iterator())
+    graph.add_interests('subject', ProfileSubject.objects.values_list('profile_id', 'subject_id').iterator())
+    return graph
+
+
+def _load_local_graph(profile_ids):
+    """Loads only what scoring ``profile_ids`` needs: two hops of edges and their interests' holders."""
+    profile_ids = set(profile_ids)
+    graph = _Graph()
+    graph.add_edges(_accepted_edges(ConnectionEdge.objects.filter(
+        Q(profile_low_id__in=profile_ids) | Q(profile_high_id__in=profile_ids)
+    )))
+    friend_ids = set().union(*(graph.friends[profile_id] for profile_id in profile_ids)) - profile_ids
+    if friend_ids:
+        graph.add_edges(_accepted_edges(ConnectionEdge.objects.filter(
+            Q(profile_low_id__in=friend_ids) | Q(profile_high_id__in=friend_ids)
+        )))
+    graph.add_pending(_pending_pairs(ConnectionRequest.objects.filter(
+        Q(sender_id__in=profile_ids) | Q(receiver_id__in=profile_ids), status='pending'
+    )))
+    for kind, through, field in (('skill', ProfileSkill, 'skill_id'), ('subject', ProfileSubject, 'subject_id')):
+        own = through.objects.filter(profile_id__in=profile_ids).values_list(field, flat=True)
+        # Over-popular interests are dropped in SQL, so their holders are never loaded
+        usable = through.objects.filter(**{f'{field}__in': own}).values(field)\
+                                .annotate(holders=Count('*')).filter(holders__lte=MAX_INTEREST_HOLDERS)\
+                                .values(field)
+        graph.add_interests(kind, through.objects.filter(**{f'{field}__in': usable})
+                                                .values_list('profile_id', field).iterator(), owners=profile_ids)
+    return graph
+
+
+def _score(graph, profile_id, top_k):
+    """Returns ConnectionSuggestion rows (unsaved) for the best ``top_k`` candidates."""
+    excluded = {profile_id} | graph.friends[profile_id] | graph.pending[profile_id]
+
+    mutual = Counter()
+    for friend_id in graph.friends[profile_id]:
+        for candidate_id in graph.friends[friend_id]:
+            if candidate_id not in excluded:
+                mutual[candidate_id] += 1
+
+    shared = Counter()
+    for interest in graph.interests[profile_id]:
+        holders = graph.holders[interest]
+        if len(holders) > MAX_INTEREST_HOLDERS:
+            continue
+        for candidate_id in holders:
+            if candidate_id not in excluded:
+                shared[candidate_id] += 1
+
+    def score(candidate_id):
+        return MUTUAL_WEIGHT * mutual[candidate_id] + INTEREST_WEIGHT * shared[candidate_id]
+
+    # Highest score first; ties go to the older account (lower id) so lists are stable
+    best = heapq.nlargest(top_k, set(mutual) | set(shared), key=lambda c: (score(c), -c))
+    return [
+        ConnectionSuggestion(
+            profile_id=profile_id,
+            candidate_id=candidate_id,
+            score=score(candidate_id),
+            mutual_count=mutual[candidate_id],
+            shared_interest_count=shared[candidate_id],
+        )
+        for candidate_id in best
+    ]
+
+
+def _replace_suggestions(profile_ids, graph, top_k):
+    rows = []
+    for profile_id in profile_ids:
+        rows.extend(_score(graph, profile_id, top_k))
+    with transaction.atomic():
+        ConnectionSuggestion.objects.filter(profile_id__in=profile_ids).delete()
+        ConnectionSuggestion.objects.bulk_create(rows)
+    return len(rows)
+
+
+def refresh_suggestions(profile_ids, top_k=None):
+    """Recomputes the lists of a few profiles from their local neighbourhood."""
+    profile_ids = list(set(profile_ids))
+    if not profile_ids:
+        return 0
+    return _replace_suggestions(profile_ids, _load_local_graph(profile_ids), top_k or _top_k())
+
+
+def rebuild_suggestions(batch_size=500, top_k=None):
+    """
+    Recomputes every profile's list from the full graph, held in memory as
+    id sets. Writes in batches of ``batch_size`` profiles. Returns the
+    number of suggestion rows written.
+    """
+    graph = _load_full_graph()
+    top_k = top_k or _top_k()
+    profile_ids = list(Profile.objects.order_by('pk').values_list('pk', flat=True))
+    written = 0
+    for start in range(0, len(profile_ids), batch_size):
+        written += _replace_suggestions(profile_ids[start:start + batch_size], graph, top_k)
+    return written
+
+
+def connection_accepted(profile_a_id, profile_b_id):
+    """
+    Incremental update after two profiles connect. Both ends are recomputed
+    (each drops the other and gains the other's friends). For the friends of
+    each end, the newcomer gains one mutual connection: existing rows are
+    bumped in place and missing ones are added with their mutual count.
+    Shared interests and top-K trimming for those rows wait for the next
+    rebuild.
+    """
+    graph = _load_local_graph([profile_a_id, profile_b_id])
+    _replace_suggestions([profile_a_id, profile_b_id], graph, _top_k())
+    for newcomer_id, other_id in ((profile_a_id, profile_b_id), (profile_b_id, profile_a_id)):
+        neighbours = graph.friends[other_id] - {newcomer_id} - graph.friends[newcomer_id]
+        if not neighbours:
+            continue
+        existing = ConnectionSuggestion.objects.filter(profile_id__in=neighbours, candidate_id=newcomer_id)
+        shown = set(existing.values_list('profile_id', flat=True))
+        existing.update(mutual_count=F('mutual_count') + 1, score=F('score') + MUTUAL_WEIGHT)
+
+        missing = neighbours - shown - _pending_with(newcomer_id, neighbours - shown)
+        new_rows = []
+        for profile_id in missing:
+            mutual_count = len(graph.friends[profile_id] & graph.friends[newcomer_id])
+            new_rows.append(ConnectionSuggestion(
+                profile_id=profile_id,
+                candidate_id=newcomer_id,
+                score=MUTUAL_WEIGHT * mutual_count,
+                mutual_count=mutual_count,
+            ))
+        ConnectionSuggestion.objects.bulk_create(new_rows, ignore_conflicts=True)
+
+
+def _pending_with(profile_id, other_ids):
+    """The subset of ``other_ids`` with a pending request to or from ``profile_id``."""
+    if not other_ids:
+        return set()
+    pending = set()
+    for sender_id, receiver_id in _pending_pairs(ConnectionRequest.objects.filter(
+        Q(sender_id=profile_id, receiver_id__in=other_ids) | Q(receiver_id=profile_id, sender_id__in=other_ids),
+        status='pending',
+    )):
+        pending.add(receiver_id if sender_id == profile_id else sender_id)
+    return pending
+
+
+def discard_pair(profile_a_id, profile_b_id):
+    """Removes two profiles from each other's lists (e.g. once a request is pending)."""
+    ConnectionSuggestion.objects.filter(
+        Q(profile_id=profile_a_id, candidate_id=profile_b_id) |
+        Q(profile_id=profile_b_id, candidate_id=profile_a_id)
+    ).delete()
+
+
+def suggested_users(profile, limit=5):
+    """
+    Returns up to ``limit`` suggested Users for ``profile``, best first, with
+    ``profile`` preloaded and ``suggestion_mutual_count`` set on each. Falls
+    back to the newest members for profiles with no precomputed list yet.
+    """
+    suggestions = list(
+        ConnectionSuggestion.objects.filter(profile=profile)
+                                    .select_related('candidate__user')[:limit]
+    )
+    users = []
+    for suggestion in suggestions:
+        user = suggestion.candidate.user
+        user.suggestion_mutual_count = suggestion.mutual_count
+        users.append(user)
+    if users:
+        return users
+
+    excluded = (
+        ConnectionEdge.objects.filter(profile_low=profile).values('profile_high_id'),
+        ConnectionEdge.objects.filter(profile_high=profile).values('profile_low_id'),
+        ConnectionRequest.objects.filter(sender_id=profile.pk, status='pending').values('receiver_id'),
+        ConnectionRequest.objects.filter(receiver_id=profile.pk, status='pending').values('sender_id'),
+    )
+    newest = User.objects.filter(profile__isnull=False).exclude(pk=profile.pk)
+    for subquery in excluded:
+        newest = newest.exclude(pk__in=subquery)
+    users = list(newest.select_related('profile').order_by('-pk')[:limit])
+    for user in users:
+        user.suggestion_mutual_count = 0
+    return users
@@ -0,0 +1,137 @@
+# core/reference_data.py
+
+"""
+Process-local cache of small, rarely edited tables: Subject, Skill and
+Badge.
+
+Each process keeps the rows of every kind in memory and checks a version
+stamp before serving them. The stamp lives in the shared cache (Redis
+when REDIS_URL is set), with the ReferenceDataVersion row behind it, so a
+steady-state read costs no database query at all. Save/delete signals bump
+the database counter and drop the cached stamp. Bulk writes call
+``bump_version`` themselves. Every process then reloads on its next read.
+With the per-process LocMem cache, other processes can see an old stamp
+for up to REFERENCE_DATA_VERSION_TIMEOUT seconds.
+
+Rows handed out here are shared between requests; treat them as
+read-only. ``ReferenceChoiceField`` gives forms a ModelChoiceField whose
+options and validation come from the cache.
+"""
+
+import threading
+
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Badge, ReferenceDataVersion, Skill, Subject
+
+DEFAULT_VERSION_TIMEOUT = 60  # seconds
+
+REFERENCE_MODELS = {
+    'subject': (Subject, ('name',)),
+    'skill': (Skill, ('name',)),
+    'badge': (Badge, ('points_required', 'name')),
+}
+
+
+def _version_key(kind):
+    return f'refdata:version:{kind}'
+
+
+def current_version(kind):
+    """The change counter for ``kind``; from the shared cache, else one primary-key read."""
+    key = _version_key(kind)
+    version = cache.get(key)
+    if version is None:
+        version = ReferenceDataVersion.objects.filter(key=kind).values_list('version', flat=True).first() or 0
+        cache.set(key, version, getattr(settings, 'REFERENCE_DATA_VERSION_TIMEOUT', DEFAULT_VERSION_TIMEOUT))
+    return version
+
+
+def bump_version(kind):
+    """Marks ``kind`` as changed so every process reloads its copy."""
+    if not ReferenceDataVersion.objects.filter(key=kind).update(version=F('version') + 1):
+        with transaction.atomic():
+            counter, _ = ReferenceDataVersion.objects.select_for_update().get_or_create(key=kind)
+            counter.version = F('version') + 1
+            counter.save(update_fields=['version'])
+    key = _version_key(kind)
+    cache.delete(key)
+    # Drop it again once committed, in case another process re-cached the old value meanwhile
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+_tables = {}  # kind -> (version, rows, rows_by_pk)
+_tables_lock = threading.Lock()
+
+
+def _table(kind):
+    version = current_version(kind)
+    cached = _tables.get(kind)
+    if cached is not None and cached[0] == version:
+        return cached
+    with _tables_lock:
+        cached = _tables.get(kind)
+        if cached is None or cached[0] != version:
+            model, ordering = REFERENCE_MODELS[kind]
+            rows = list(model.objects.order_by(*ordering))
+            cached = _tables[kind] = (version, rows, {row.pk: row for row in rows})
+    return cached
+
+
+def get_all(kind):
+    """Every row of ``kind``, in display order."""
+    return _table(kind)[1]
+
+
+def get_by_id(kind, pk):
+    """The row of ``kind`` with primary key ``pk``, or None."""
+    try:
+        return _table(kind)[2].get(int(pk))
+    except (TypeError, ValueError):
+        return None
+
+
+def choices(kind):
+    """``[(pk, str(row)), ...]`` for a ChoiceField or a template select."""
+    return [(row.pk, str(row)) for row in get_all(kind)]
+
+
+def reset():
+    """Drops every process-local table (e.g. in tests)."""
+    with _tables_lock:
+        _tables.clear()
+
+
+class ReferenceChoiceIterator(forms.models.ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for row in get_all(self.field.reference_kind):
+            yield self.choice(row)
+
+    def __len__(self):
+        return len(get_all(self.field.reference_kind)) + (1 if self.field.empty_label is not None else 0)
+
+
+class ReferenceChoiceField(forms.ModelChoiceField):
+    """
+    A ModelChoiceField over a cached reference table: rendering the options
+    and validating the submitted id both read the process-local copy.
+    """
+    iterator = ReferenceChoiceIterator
+
+    def __init__(self, kind, **kwargs):
+        self.reference_kind = kind
+        super().__init__(queryset=REFERENCE_MODELS[kind][0].objects.all(), **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        row = get_by_id(self.reference_kind, value)
+        if row is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return row
@@ -2,5 +2,7 @@ from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
-    re_path(r'ws/chat/(?P<sender>\w+)/(?P<recipient>\w+)/$', consumers.ChatConsumer.as_asgi()),
-]
\ No newline at end of file
+    re_path(r'ws/chat/(?P<recipient>[\w.@+-]+)/$', consumers.ChatConsumer.as_asgi()),
+    # Older clients still include their own username; it must match the session user
+    re_path(r'ws/chat/(?P<sender>[\w.@+-]+)/(?P<recipient>[\w.@+-]+)/$', consumers.ChatConsumer.as_asgi()),
+]
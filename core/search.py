@@ -0,0 +1,335 @@
+# core/search.py
+
+"""
+Full-text search over posts.
+
+Each post is indexed as one document with four fields, weighted in this
+order: title, subject name, author name (username plus full name), and
+content. The index lives in a side table created by migration 0019:
+
+* SQLite: ``core_post_fts``, an FTS5 virtual table keyed by the post id
+  (rowid), ranked with bm25.
+* PostgreSQL: ``core_post_search``, a weighted tsvector per post under a GIN
+  index, ranked with ts_rank_cd.
+
+Backends are pluggable through ``settings.SEARCH_BACKEND``. When that is
+unset the backend is picked from the database vendor. On other databases
+``BasicSearchBackend`` falls back to LIKE matching, so the feature still
+works there, just without an index.
+
+Signals keep the index in step with posts, subject renames and author name
+changes. ``manage.py rebuild_search_index`` rebuilds it from scratch. A
+search reads the index for matches and joins the post table only for the
+facet filters and the page of ids it returns. Its cost depends on the
+number of matches, not on the size of the post table.
+"""
+
+import re
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+SEARCH_CONFIG = 'english'  # PostgreSQL text search configuration
+INDEX_BATCH_SIZE = 500
+MAX_QUERY_TERMS = 10
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def query_terms(query):
+    """Splits user input into at most MAX_QUERY_TERMS plain word terms."""
+    return TERM_RE.findall((query or '').lower())[:MAX_QUERY_TERMS]
+
+
+def _documents(post_ids):
+    """Yields ``(post_id, title, subject, author, content)`` for the given posts."""
+    rows = Post.objects.filter(pk__in=post_ids).values_list(
+        'pk', 'title', 'subject__name', 'author__user__username',
+        'author__user__first_name', 'author__user__last_name', 'content',
+    )
+    for pk, title, subject, username, first_name, last_name, content in rows:
+        author = ' '.join(part for part in (username, first_name, last_name) if part)
+        yield pk, title, subject or '', author, content
+
+
+class BaseSearchBackend:
+    """Interface every search index implements."""
+
+    def index(self, documents):
+        """Adds or replaces ``(post_id, title, subject, author, content)`` documents."""
+        raise NotImplementedError
+
+    def remove(self, post_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def match_sql(self, terms):
+        """
+        Returns ``(sql, params)`` for a query that selects ``post_id`` and
+        ``rank`` (higher is better) for every post matching all ``terms``.
+        """
+        raise NotImplementedError
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """FTS5 virtual table; the post id is the rowid."""
+
+    table = 'core_post_fts'
+    # bm25 column weights for title, subject, author, content
+    weights = (10.0, 4.0, 4.0, 1.0)
+
+    def index(self, documents):
+        documents = list(documents)
+        if not documents:
+            return
+        with connection.cursor() as cursor:
+            self._delete(cursor, [document[0] for document in documents])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, title, subject, author, content) VALUES (%s, %s, %s, %s, %s)',
+                documents,
+            )
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            self._delete(cursor, list(post_ids))
+
+    def _delete(self, cursor, post_ids):
+        if post_ids:
+            placeholders = ', '.join(['%s'] * len(post_ids))
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', post_ids)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def match_sql(self, terms):
+        # Quote every term so user input can't form FTS5 syntax; the last one
+        # is a prefix so results keep up with a half-typed word
+        expression = ' '.join(f'"{term}"' for term in terms) + '*'
+        weights = ', '.join(str(weight) for weight in self.weights)
+        return (
+            f'SELECT rowid AS post_id, -bm25({self.table}, {weights}) AS rank '
+            f'FROM {self.table} WHERE {self.table} MATCH %s',
+            [expression],
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Weighted tsvector per post in a GIN-indexed side table."""
+
+    table = 'core_post_search'
+
+    def index(self, documents):
+        rows = [
+            (post_id, SEARCH_CONFIG, title, SEARCH_CONFIG, subject, SEARCH_CONFIG, author, SEARCH_CONFIG, content)
+            for post_id, title, subject, author, content in documents
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (post_id, document) VALUES (%s, '
+                "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+                "setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+                "setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+                "setweight(to_tsvector(%s::regconfig, %s), 'D')) "
+                'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document',
+                rows,
+            )
+
+    def remove(self, post_ids):
+        post_ids = list(post_ids)
+        if post_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {self.table} WHERE post_id = ANY(%s)', [post_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.table}')
+
+    def match_sql(self, terms):
+        expression = ' & '.join(f"'{term}'" for term in terms) + ':*'
+        return (
+            f'SELECT post_id, ts_rank_cd(document, query) AS rank '
+            f'FROM {self.table}, to_tsquery(%s::regconfig, %s) AS query WHERE document @@ query',
+            [SEARCH_CONFIG, expression],
+        )
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    """No index: LIKE matching on the post table, newest first. For other databases."""
+
+    def index(self, documents):
+        pass
+
+    def remove(self, post_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def match_sql(self, terms):
+        post_table = Post._meta.db_table
+        clauses, params = [], []
+        for term in terms:
+            clauses.append('(LOWER(title) LIKE %s OR LOWER(content) LIKE %s)')
+            params += [f'%{term}%', f'%{term}%']
+        return f'SELECT id AS post_id, 0 AS rank FROM {post_table} WHERE {" AND ".join(clauses)}', params
+
+
+VENDOR_BACKENDS = {
+    'sqlite': 'core.search.SQLiteSearchBackend',
+    'postgresql': 'core.search.PostgresSearchBackend',
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """Returns the backend named by settings.SEARCH_BACKEND, or the one for this database."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'SEARCH_BACKEND', None) or \
+                    VENDOR_BACKENDS.get(connection.vendor, 'core.search.BasicSearchBackend')
+                _backend = import_string(path)()
+    return _backend
+
+
+def reset_search_backend():
+    """Drops the cached backend, e.g. after settings change in tests."""
+    global _backend
+    _backend = None
+
+
+def index_posts(post_ids):
+    """(Re)indexes the given posts; ids of deleted posts are dropped from the index."""
+    post_ids = list(post_ids)
+    backend = get_search_backend()
+    for start in range(0, len(post_ids), INDEX_BATCH_SIZE):
+        batch = post_ids[start:start + INDEX_BATCH_SIZE]
+        documents = list(_documents(batch))
+        with transaction.atomic():
+            backend.index(documents)
+            missing = set(batch) - {document[0] for document in documents}
+            if missing:
+                backend.remove(missing)
+
+
+def remove_posts(post_ids):
+    get_search_backend().remove(post_ids)
+
+
+def rebuild_index(batch_size=INDEX_BATCH_SIZE):
+    """Empties the index and reindexes every post. Returns the number indexed."""
+    backend = get_search_backend()
+    post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+    # One transaction, so searches keep seeing the old index until the new one is complete
+    with transaction.atomic():
+        backend.clear()
+        for start in range(0, len(post_ids), batch_size):
+            backend.index(_documents(post_ids[start:start + batch_size]))
+    return len(post_ids)
+
+
+class SearchResults:
+    """
+    Lazy, ranked results for one search. Supports ``count()``, ``len()``
+    and slicing, so it can be handed straight to ``Paginator``. Only the
+    requested slice of posts is loaded, each with ``search_rank`` set.
+    """
+
+    def __init__(self, query, subject=None, content_type=None):
+        self.terms = query_terms(query)
+        self.filters = {}
+        if subject is not None:
+            self.filters['subject'] = subject
+        if content_type:
+            self.filters['content_type'] = content_type
+        self._count = None
+
+    def _match(self):
+        return get_search_backend().match_sql(self.terms)
+
+    def _matched_posts(self, **filters):
+        sql, params = self._match()
+        return Post.objects.filter(pk__in=RawSQL(f'SELECT post_id FROM ({sql}) AS search_match', params), **filters)
+
+    def count(self):
+        if self._count is None:
+            self._count = self._matched_posts(**self.filters).count() if self.terms else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        if not self.terms:
+            return []
+        start, stop = key.start or 0, key.stop
+        sql, params = self._match()
+        query = f'SELECT search_match.post_id, search_match.rank FROM ({sql}) AS search_match'
+        if self.filters:
+            filter_sql, filter_params = Post.objects.filter(**self.filters).values('pk').query.sql_with_params()
+            query += f' WHERE search_match.post_id IN ({filter_sql})'
+            params = params + list(filter_params)
+        query += ' ORDER BY search_match.rank DESC, search_match.post_id DESC'
+        if stop is not None:
+            query += ' LIMIT %s OFFSET %s'
+            params = params + [stop - start, start]
+        elif start:
+            query += ' LIMIT -1 OFFSET %s' if connection.vendor == 'sqlite' else ' OFFSET %s'
+            params = params + [start]
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            ranked = cursor.fetchall()
+
+        posts_by_id = Post.objects.select_related('author__user', 'subject').in_bulk([pk for pk, _ in ranked])
+        posts = []
+        for pk, rank in ranked:
+            if pk in posts_by_id:
+                posts_by_id[pk].search_rank = rank
+                posts.append(posts_by_id[pk])
+        return posts
+
+    def facets(self):
+        """
+        Match counts per subject and per content type, for narrowing the
+        search. Each facet ignores its own filter but applies the other, so
+        its options stay selectable.
+        """
+        if not self.terms:
+            return {'subject': [], 'content_type': []}
+        labels = dict(Post.CONTENT_TYPES)
+        subject_filters = {k: v for k, v in self.filters.items() if k != 'subject'}
+        type_filters = {k: v for k, v in self.filters.items() if k != 'content_type'}
+        subjects = (
+            self._matched_posts(**subject_filters).filter(subject__isnull=False)
+                .values('subject_id', 'subject__name').annotate(count=Count('pk')).order_by('-count', 'subject__name')
+        )
+        types = (
+            self._matched_posts(**type_filters)
+                .values('content_type').annotate(count=Count('pk')).order_by('-count', 'content_type')
+        )
+        return {
+            'subject': [(row['subject_id'], row['subject__name'], row['count']) for row in subjects],
+            'content_type': [(row['content_type'], labels.get(row['content_type'], row['content_type']), row['count'])
+                             for row in types],
+        }
+
+
+def search_posts(query, subject=None, content_type=None):
+    """Returns lazy ``SearchResults`` for ``query``, optionally narrowed by subject and content type."""
+    return SearchResults(query, subject=subject, content_type=content_type)
@@ -0,0 +1,522 @@
+# core/seeding.py
+
+"""
+Synthetic data at production-like volume, for load tests and benchmarks.
+
+``Seeder(users=10_000).run()`` adds that many users, along with their
+profiles, skills, connections, posts, likes, comments, conversations,
+notifications and challenge submissions. Activity is skewed the way real
+networks are skewed. Each user gets a heavy-tailed (Pareto) weight, and
+every per-user volume is spread around its average in proportion to that
+weight. Partners, likers and commenters are also drawn by weight. A few
+users end up with thousands of connections, likes and messages while
+most have a handful. The hot paths are exercised at both ends.
+
+Rows are written with ``bulk_create`` in batches, so no model signals
+fire. Timelines are filled straight from the generated graph.
+``rebuild_derived`` then recomputes the other stores those signals would
+have kept up to date: connection edges and degrees, post counters,
+conversations, suggestions, both search indexes, leaderboard buckets and
+the reference-data versions.
+
+Every user shares one password hash, computed once with the configured
+hasher. Logging in as any seeded user works, and hashing costs one call
+rather than one per user.
+
+The same ``seed`` gives the same data. Seeding is meant for an empty or
+disposable database. It refuses to run if users with its username prefix
+already exist.
+"""
+
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import people_search, reference_data, search
+from .leaderboard import rebuild_leaderboards
+from .connections import rebuild_edges
+from .conversations import rebuild_conversations
+from .counters import reconcile_post_counters
+from .models import (
+    Challenge, Comment, Connection, ConnectionRequest, Message, Notification,
+    Post, Profile, Skill, Subject, Submission, User,
+)
+from .recommendations import rebuild_suggestions
+from .timeline import get_timeline_backend, rebuild_all_timelines, timeline_max_length
+
+logger = logging.getLogger(__name__)
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000}
+
+# Per-user averages; each user is spread around them by activity weight
+DEFAULT_RATES = {
+    'connections': 12,
+    'pending_requests': 1,
+    'posts': 3,
+    'likes_per_post': 6,
+    'comments_per_post': 1.5,
+    'conversations': 3,
+    'messages_per_conversation': 8,
+    'notifications': 8,
+    'skills': 4,
+    'submissions': 0.3,
+}
+
+MAX_WEIGHT = 200  # Caps the Pareto tail so one user cannot take everything
+
+FIRST_NAMES = [
+    'Amara', 'Ben', 'Chen', 'Dana', 'Eli', 'Fatima', 'Gabriel', 'Hana', 'Ivan', 'Jia',
+    'Kofi', 'Lena', 'Mateo', 'Nadia', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sami', 'Tomas',
+    'Uma', 'Viktor', 'Wen', 'Ximena', 'Yusuf', 'Zara',
+]
+LAST_NAMES = [
+    'Adeyemi', 'Brown', 'Costa', 'Dubois', 'Eriksen', 'Fernandes', 'Garcia', 'Haddad', 'Ito', 'Jensen',
+    'Kim', 'Lopez', 'Mensah', 'Nguyen', 'Okafor', 'Patel', 'Rossi', 'Silva', 'Tanaka', 'Weber',
+]
+SUBJECTS = [
+    'Mathematics', 'Physics', 'Chemistry', 'Biology', 'Computer Science', 'Economics', 'History',
+    'Literature', 'Philosophy', 'Psychology', 'Engineering', 'Medicine', 'Law', 'Art', 'Music',
+]
+SKILLS = [
+    'Python', 'JavaScript', 'SQL', 'Django', 'React', 'Machine Learning', 'Data Analysis', 'Statistics',
+    'Calculus', 'Linear Algebra', 'Public Speaking', 'Writing', 'Research', 'Project Management',
+    'Leadership', 'Teamwork', 'Design', 'Photography', 'Video Editing', 'C++', 'Java', 'Rust', 'Go',
+    'Excel', 'Tableau', 'Docker', 'Linux', 'Networking', 'Robotics', 'Electronics', 'Chemistry Lab',
+    'Microscopy', 'Debate', 'Spanish', 'French', 'Mandarin', 'Arabic', 'Tutoring', 'Mentoring',
+]
+INSTITUTIONS = [
+    'State University', 'Institute of Technology', 'City College', 'National University',
+    'Polytechnic', 'Community College', 'Global Academy',
+]
+LOCATIONS = ['Lagos', 'Berlin', 'Toronto', 'Mumbai', 'São Paulo', 'Nairobi', 'Seoul', 'Austin', 'Lisbon', 'Cairo']
+WORDS = (
+    'study notes project exam research lecture paper lab results question answer idea team '
+    'data model theory proof experiment result design code review draft thesis group session '
+    'week today finally learned shared great helpful tips resources challenge solution'
+).split()
+
+
+def scale_users(scale):
+    """Users for a scale name (``1k``, ``10k``, ``100k``) or a plain number."""
+    if scale in SCALES:
+        return SCALES[scale]
+    try:
+        return int(scale)
+    except ValueError:
+        raise ValueError(f"Unknown scale {scale!r}; use {', '.join(SCALES)} or a number of users.")
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Lets bulk inserts set ``auto_now``/``auto_now_add`` fields instead of stamping them with now()."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    try:
+        for field in fields:
+            field.auto_now = field.auto_now_add = False
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _field(model, name):
+    return model._meta.get_field(name)
+
+
+class Seeder:
+    """Generates one synthetic data set; see the module docstring."""
+
+    def __init__(self, users, seed=0, prefix='seed', days=365, password='password',
+                 rates=None, batch_size=1000, log=None):
+        self.user_count = users
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.days = days
+        self.password = password
+        self.rates = {**DEFAULT_RATES, **(rates or {})}
+        self.batch_size = batch_size
+        self.log = log or logger.info
+        self.now = timezone.now()
+        self.counts = {}
+
+    # --- Helpers ---
+
+    def _insert(self, model, rows):
+        """Bulk-inserts an iterable of unsaved instances in batches. Returns how many."""
+        total = 0
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+            total += len(batch)
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + total
+        return total
+
+    def _spread(self, average, factor):
+        """A whole-number volume around ``average * factor``; ``factor`` averages 1 across draws."""
+        expected = average * factor
+        whole = int(expected)
+        return whole + (self.rng.random() < expected - whole)
+
+    def _pick_users(self, k):
+        """``k`` user ids drawn by activity weight (with repeats)."""
+        return self.rng.choices(self.user_ids, cum_weights=self.cum_weights, k=k)
+
+    def _moment(self, after=None):
+        """A random time in the window, denser towards now; never before ``after``."""
+        start = self.now - timedelta(days=self.days)
+        if after is not None and after > start:
+            start = after
+        span = (self.now - start).total_seconds()
+        return self.now - timedelta(seconds=span * self.rng.random() ** 2)
+
+    def _burst(self):
+        """A heavy-tailed factor with mean 1, for per-post and per-conversation popularity."""
+        return self.rng.paretovariate(1.5) / 3  # Pareto(1.5) has mean 3
+
+    def _text(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high))).capitalize() + '.'
+
+    @contextmanager
+    def _phase(self, name):
+        started = time.perf_counter()
+        with transaction.atomic():
+            yield
+        self.log(f"{name}: {time.perf_counter() - started:.1f}s")
+
+    # --- Phases ---
+
+    def run(self):
+        """Seeds everything, rebuilds derived data, and returns row counts by model."""
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise ValueError(
+                f"Users named {self.prefix!r}... already exist; use another prefix or a fresh database."
+            )
+        with self._phase("reference data"):
+            self.seed_reference_data()
+        with self._phase("users and profiles"):
+            self.seed_users()
+        with self._phase("connections"):
+            self.seed_connections()
+        with self._phase("posts"):
+            self.seed_posts()
+        with self._phase("likes and comments"):
+            self.seed_engagement()
+        with self._phase("messages"):
+            self.seed_messages()
+        with self._phase("notifications"):
+            self.seed_notifications()
+        with self._phase("challenges and submissions"):
+            self.seed_submissions()
+        with self._phase("timelines"):
+            self.seed_timelines()
+        rebuild_derived(log=self.log, timelines=False)
+        return self.counts
+
+    def seed_reference_data(self):
+        Subject.objects.bulk_create(
+            [Subject(name=name, slug=slugify(name)) for name in SUBJECTS], ignore_conflicts=True,
+        )
+        Skill.objects.bulk_create([Skill(name=name) for name in SKILLS], ignore_conflicts=True)
+        self.subject_ids = list(Subject.objects.filter(name__in=SUBJECTS).values_list('pk', flat=True))
+        # Zipf-like popularity: the first skills in the list are the common ones
+        skills = dict(Skill.objects.filter(name__in=SKILLS).values_list('name', 'pk'))
+        self.skill_ids = [skills[name] for name in SKILLS]
+        self.skill_cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(SKILLS) + 1)))
+
+    def seed_users(self):
+        rng = self.rng
+        password = make_password(self.password)  # Once, with the configured hasher
+        before = User.objects.aggregate(last=Max('pk'))['last'] or 0
+
+        def users():
+            for i in range(self.user_count):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                username = f'{self.prefix}{i:06d}'
+                yield User(
+                    username=username, email=f'{username}@example.com', password=password,
+                    first_name=first, last_name=last, role='mentor' if rng.random() < 0.03 else 'student',
+                    is_verified=rng.random() < 0.4, date_joined=self._moment(),
+                )
+        self._insert(User, users())
+        self.user_ids = list(User.objects.filter(pk__gt=before).order_by('pk').values_list('pk', flat=True))
+        self.usernames = dict(User.objects.filter(pk__gt=before).values_list('pk', 'username'))
+
+        # Activity weights, scaled to average 1
+        weights = [min(rng.paretovariate(1.2), MAX_WEIGHT) for _ in self.user_ids]
+        mean = sum(weights) / len(weights)
+        self.weight_of = {user_id: weight / mean for user_id, weight in zip(self.user_ids, weights)}
+        self.cum_weights = list(itertools.accumulate(weights))
+
+        levels = [level for level, _ in Profile.EDUCATION_LEVELS]
+
+        def profiles():
+            for user_id in self.user_ids:
+                yield Profile(
+                    user_id=user_id,
+                    headline=f"{rng.choice(SUBJECTS)} {rng.choice(['student', 'researcher', 'enthusiast', 'tutor'])}",
+                    bio=self._text(8, 30),
+                    education_level=rng.choice(levels),
+                    institution=f"{rng.choice(LOCATIONS)} {rng.choice(INSTITUTIONS)}",
+                    graduation_year=rng.randint(2015, 2030),
+                    location=rng.choice(LOCATIONS),
+                    points=int(self.weight_of[user_id] * rng.randint(10, 100)),
+                )
+        self._insert(Profile, profiles())
+
+        SkillLink, SubjectLink = Profile.skills.through, Profile.subjects.through
+
+        def skill_links():
+            for user_id in self.user_ids:
+                count = rng.randint(0, int(2 * self.rates['skills']))
+                chosen = set(rng.choices(self.skill_ids, cum_weights=self.skill_cum_weights, k=count))
+                for skill_id in chosen:
+                    yield SkillLink(profile_id=user_id, skill_id=skill_id)
+
+        def subject_links():
+            for user_id in self.user_ids:
+                for subject_id in set(rng.choices(self.subject_ids, k=rng.randint(0, 3))):
+                    yield SubjectLink(profile_id=user_id, subject_id=subject_id)
+        self._insert(SkillLink, skill_links())
+        self._insert(SubjectLink, subject_links())
+
+    def seed_connections(self):
+        rng = self.rng
+        pairs = set()
+        for user_id in self.user_ids:
+            # Each connection has two ends, so draw half the average per user
+            count = self._spread(self.rates['connections'] / 2, self.weight_of[user_id])
+            for other_id in self._pick_users(count):
+                if other_id != user_id:
+                    pairs.add((min(user_id, other_id), max(user_id, other_id)))
+        self.neighbours = {}
+        for low_id, high_id in pairs:
+            self.neighbours.setdefault(low_id, []).append(high_id)
+            self.neighbours.setdefault(high_id, []).append(low_id)
+
+        created = _field(Connection, 'created')
+
+        def connections():
+            for low_id, high_id in pairs:
+                creator_id, friend_id = (low_id, high_id) if rng.random() < 0.5 else (high_id, low_id)
+                yield Connection(creator_id=creator_id, friend_id=friend_id, accepted=True, created=self._moment())
+        with explicit_timestamps(created):
+            self._insert(Connection, connections())
+
+        # Outstanding requests, sent to popular users more often than not
+        self.pending_requests = []
+        pending = set()
+        for user_id in self.user_ids:
+            for other_id in self._pick_users(self._spread(self.rates['pending_requests'], 1)):
+                pair = (min(user_id, other_id), max(user_id, other_id))
+                if other_id != user_id and pair not in pairs and pair not in pending:
+                    pending.add(pair)
+                    self.pending_requests.append((user_id, other_id, self._moment(self.now - timedelta(days=30))))
+
+        fields = (_field(ConnectionRequest, 'created_at'), _field(ConnectionRequest, 'updated_at'))
+        with explicit_timestamps(*fields):
+            self._insert(ConnectionRequest, (
+                ConnectionRequest(sender_id=sender_id, receiver_id=receiver_id, status='pending',
+                                  created_at=moment, updated_at=moment)
+                for sender_id, receiver_id, moment in self.pending_requests
+            ))
+
+    def seed_posts(self):
+        rng = self.rng
+        before = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        kinds = [kind for kind, _ in Post.CONTENT_TYPES]
+
+        def posts():
+            for user_id in self.user_ids:
+                weight = self.weight_of[user_id]
+                for _ in range(self._spread(self.rates['posts'], weight)):
+                    moment = self._moment()
+                    yield Post(
+                        author_id=user_id, title=self._text(3, 8)[:200], content=self._text(20, 120),
+                        content_type=rng.choice(kinds), subject_id=rng.choice(self.subject_ids),
+                        is_approved=rng.random() < 0.95, created_at=moment, updated_at=moment,
+                        views=int(weight * self._burst() * 60),
+                    )
+        with explicit_timestamps(_field(Post, 'created_at'), _field(Post, 'updated_at')):
+            self._insert(Post, posts())
+        self.posts = list(Post.objects.filter(pk__gt=before).values_list('pk', 'author_id', 'created_at'))
+        self.posts_by_author = {}
+        for post_id, author_id, created_at in self.posts:
+            self.posts_by_author.setdefault(author_id, []).append((created_at, post_id))
+
+    def seed_engagement(self):
+        rng = self.rng
+        LikeLink = Post.likes.through
+        # Popular authors write more posts, so rescale to keep the per-post average at the configured rate
+        popularity = {post_id: self.weight_of[author_id] * self._burst() for post_id, author_id, _ in self.posts}
+        mean = sum(popularity.values()) / max(len(popularity), 1)
+        popularity = {post_id: value / mean for post_id, value in popularity.items()}
+
+        def likes():
+            for post_id, author_id, _ in self.posts:
+                likers = set(self._pick_users(self._spread(self.rates['likes_per_post'], popularity[post_id])))
+                likers.discard(author_id)
+                for profile_id in likers:
+                    yield LikeLink(post_id=post_id, profile_id=profile_id)
+        self._insert(LikeLink, likes())
+
+        def comments():
+            for post_id, author_id, created_at in self.posts:
+                count = self._spread(self.rates['comments_per_post'], popularity[post_id])
+                for commenter_id in self._pick_users(count):
+                    moment = self._moment(created_at)
+                    yield Comment(post_id=post_id, user_id=commenter_id, content=self._text(3, 25),
+                                  created_at=moment, updated_at=moment)
+        with explicit_timestamps(_field(Comment, 'created_at'), _field(Comment, 'updated_at')):
+            self._insert(Comment, comments())
+
+    def seed_messages(self):
+        rng = self.rng
+
+        def messages():
+            seen = set()
+            for user_id in self.user_ids:
+                weight = self.weight_of[user_id]
+                friends = self.neighbours.get(user_id, [])
+                for _ in range(self._spread(self.rates['conversations'] / 2, weight)):
+                    # Mostly with connections, sometimes a cold message
+                    partner_id = rng.choice(friends) if friends and rng.random() < 0.85 else self._pick_users(1)[0]
+                    pair = (min(user_id, partner_id), max(user_id, partner_id))
+                    if partner_id == user_id or pair in seen:
+                        continue
+                    seen.add(pair)
+                    count = max(1, self._spread(self.rates['messages_per_conversation'], self._burst()))
+                    moment = self._moment()
+                    for index in range(count):
+                        sender_id, recipient_id = (user_id, partner_id) if rng.random() < 0.5 else (partner_id, user_id)
+                        moment = min(moment + timedelta(minutes=rng.expovariate(1 / 90)), self.now)
+                        # The tail of a conversation is often still unread
+                        unread = index >= count - 2 and rng.random() < 0.3
+                        yield Message(sender_id=sender_id, recipient_id=recipient_id, content=self._text(2, 30),
+                                      timestamp=moment, read=not unread)
+        with explicit_timestamps(_field(Message, 'timestamp')):
+            self._insert(Message, messages())
+
+    def seed_notifications(self):
+        rng = self.rng
+        post_type = ContentType.objects.get_for_model(Post)
+
+        def notifications():
+            for user_id in self.user_ids:
+                own_posts = self.posts_by_author.get(user_id)
+                for _ in range(self._spread(self.rates['notifications'], self.weight_of[user_id])):
+                    sender_id = self._pick_users(1)[0]
+                    if sender_id == user_id:
+                        continue
+                    sender = self.usernames[sender_id]
+                    target = {}
+                    if own_posts and rng.random() < 0.7:
+                        kind = rng.choice(['post_like', 'post_comment'])
+                        text = f"{sender} liked your post" if kind == 'post_like' else f"{sender} commented on your post"
+                        target = {'content_type': post_type, 'object_id': rng.choice(own_posts)[1]}
+                    elif rng.random() < 0.5:
+                        kind, text = 'connection_accepted', f"{sender} accepted your connection request."
+                    else:
+                        kind, text = 'message', f"New message from {sender}"
+                    yield Notification(
+                        recipient_id=user_id, sender_id=sender_id, notification_type=kind, message=text,
+                        read=rng.random() < 0.7, count=1 if rng.random() < 0.8 else rng.randint(2, 9),
+                        created_at=self._moment(), **target,
+                    )
+            for sender_id, receiver_id, moment in self.pending_requests:
+                yield Notification(
+                    recipient_id=receiver_id, sender_id=sender_id, notification_type='connection_request',
+                    message=f"{self.usernames[sender_id]} wants to connect with you", created_at=moment,
+                )
+        with explicit_timestamps(_field(Notification, 'created_at')):
+            self._insert(Notification, notifications())
+
+    def seed_submissions(self):
+        rng = self.rng
+        difficulties = [level for level, _ in Challenge.DIFFICULTY_LEVELS]
+
+        def challenges():
+            for _ in range(max(5, self.user_count // 200)):
+                start = self._moment()
+                end = start + timedelta(days=rng.randint(7, 90))
+                yield Challenge(
+                    title=self._text(2, 6)[:200], description=self._text(20, 60),
+                    subject_id=rng.choice(self.subject_ids), difficulty=rng.choice(difficulties),
+                    prize=f"${rng.choice([50, 100, 250, 500, 1000])} prize", start_date=start, end_date=end,
+                    is_active=end > self.now, sponsor_id=self._pick_users(1)[0],
+                )
+        before = Challenge.objects.aggregate(last=Max('pk'))['last'] or 0
+        self._insert(Challenge, challenges())
+        windows = list(Challenge.objects.filter(pk__gt=before).values_list('pk', 'start_date', 'end_date'))
+        challenge_weights = list(itertools.accumulate(self._burst() for _ in windows))
+
+        def submissions():
+            for user_id in self.user_ids:
+                count = self._spread(self.rates['submissions'], self.weight_of[user_id])
+                for challenge_id, start, end in set(rng.choices(windows, cum_weights=challenge_weights, k=count)):
+                    moment = start + (min(end, self.now) - start) * rng.random()
+                    yield Submission(
+                        challenge_id=challenge_id, user_id=user_id, content=self._text(20, 80),
+                        submitted_at=moment, score=rng.randint(0, 100) if rng.random() < 0.8 else None,
+                    )
+        with explicit_timestamps(_field(Submission, 'submitted_at')):
+            self._insert(Submission, submissions())
+
+
+    def seed_timelines(self):
+        """
+        Fills every new profile's home timeline from the in-memory graph,
+        as rebuild_timeline would, in batched writes instead of one round
+        of queries per profile.
+        """
+        limit = timeline_max_length()
+        backend = get_timeline_backend()
+        for start in range(0, len(self.user_ids), self.batch_size):
+            timelines = {}
+            for owner_id in self.user_ids[start:start + self.batch_size]:
+                audience = [owner_id, *self.neighbours.get(owner_id, ())]
+                timelines[owner_id] = heapq.nlargest(
+                    limit, itertools.chain.from_iterable(self.posts_by_author.get(author_id, ()) for author_id in audience),
+                )
+            backend.push_bulk(timelines)
+
+
+def rebuild_derived(log=None, timelines=True):
+    """
+    Recomputes everything signals keep in step with writes, for use after
+    bulk inserts. Each step is also available as its own rebuild command.
+    ``timelines=False`` skips the per-profile timeline rebuild, for callers
+    that have filled timelines themselves.
+    """
+    log = log or logger.info
+    steps = [
+        ("reference data versions", lambda: [reference_data.bump_version(kind) for kind in reference_data.REFERENCE_MODELS]),
+        ("connection edges", rebuild_edges),
+        ("post counters", reconcile_post_counters),
+        ("timelines", rebuild_all_timelines if timelines else None),
+        ("conversations", rebuild_conversations),
+        ("connection suggestions", rebuild_suggestions),
+        ("post search index", search.rebuild_index),
+        ("people search index", people_search.rebuild_index),
+        ("leaderboard buckets", rebuild_leaderboards),
+    ]
+    for name, step in steps:
+        if step is None:
+            continue
+        started = time.perf_counter()
+        with transaction.atomic():  # One commit per step rather than per row batch
+            step()
+        log(f"rebuilt {name}: {time.perf_counter() - started:.1f}s")
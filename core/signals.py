@@ -1,13 +1,37 @@
 # signals.py
 
-from django.db.models.signals import post_save
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from django.contrib.contenttypes.models import ContentType # <--- IMPORT THIS
-from .models import Profile, Message, Notification # Ensure Notification is imported here
+from .models import Profile, Message, Post, Connection, ConnectionRequest, Comment, Subject, Skill, Badge, Project, Submission
+from . import timeline, conversations, notifications, recommendations, connections, search, people_search, reference_data, images, post_cards, leaderboard
+from .counters import adjust_post_counter
 
 User = get_user_model()
 
+_pending_refreshes = threading.local()  # refresh function -> ids waiting for it, per thread
+
+def refresh_on_commit(refresh, ids):
+    """
+    Calls ``refresh(ids)`` after commit, merged with every other id
+    scheduled for the same ``refresh`` meanwhile. One profile edit fires
+    several signals (the Profile save, then m2m post_remove and post_add);
+    the first of their callbacks refreshes every id and the rest find
+    nothing left to do. Ids from a rolled-back transaction only cost an
+    extra, harmless refresh with the next batch.
+    """
+    pending = _pending_refreshes.__dict__.setdefault('ids', {})
+    pending.setdefault(refresh, set()).update(ids)
+    transaction.on_commit(lambda: _flush_refresh(refresh))
+
+def _flush_refresh(refresh):
+    ids = _pending_refreshes.__dict__.get('ids', {}).pop(refresh, None)
+    if ids:
+        refresh(list(ids))
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
@@ -24,13 +48,172 @@ def save_user_profile(sender, instance, **kwargs):
 @receiver(post_save, sender=Message)
 def create_message_notification(sender, instance, created, **kwargs):
     if created:
-        # No need to import Notification inside if it's imported at the top
-        Notification.objects.create(
-            recipient=instance.recipient,
-            sender=instance.sender,
-            notification_type='message', # Consider changing to 'new_message' for consistency with views.py
-            message=f"New message from {instance.sender.username}",
-            # Use content_type and object_id for Generic Foreign Key
-            content_type=ContentType.objects.get_for_model(instance), # Get ContentType for the Message instance
-            object_id=instance.id # Use the ID of the Message instance
-        )
\ No newline at end of file
+        # The only place a message notification is raised; see core/notifications.py
+        notifications.notify_message(instance)
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        # Wait for the post row to be committed before pushing its id around
+        transaction.on_commit(lambda: timeline.fan_out_post(instance))
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_timelines(sender, instance, **kwargs):
+    timeline.get_timeline_backend().remove_post(instance.pk)
+
+@receiver(post_save, sender=Connection)
+def sync_connection_edge(sender, instance, **kwargs):
+    if instance.accepted:
+        connections.add_edge(instance.creator_id, instance.friend_id)
+    else:
+        connections.remove_edge(instance.creator_id, instance.friend_id)
+
+@receiver(post_delete, sender=Connection)
+def drop_connection_edge(sender, instance, **kwargs):
+    if instance.accepted:
+        connections.remove_edge(instance.creator_id, instance.friend_id)
+
+@receiver(post_save, sender=Connection)
+def backfill_timelines_on_connect(sender, instance, **kwargs):
+    if instance.accepted:
+        timeline.backfill_from_author(instance.creator, instance.friend)
+        timeline.backfill_from_author(instance.friend, instance.creator)
+
+@receiver(post_save, sender=Connection)
+def refresh_suggestions_on_connect(sender, instance, **kwargs):
+    if instance.accepted:
+        creator_id, friend_id = instance.creator_id, instance.friend_id
+        transaction.on_commit(lambda: recommendations.connection_accepted(creator_id, friend_id))
+
+@receiver(post_save, sender=ConnectionRequest)
+def drop_suggestion_on_request(sender, instance, created, **kwargs):
+    if created and instance.status == 'pending':
+        recommendations.discard_pair(instance.sender_id, instance.receiver_id)
+
+@receiver(m2m_changed, sender=Profile.skills.through)
+@receiver(m2m_changed, sender=Profile.subjects.through)
+def refresh_suggestions_on_interests_change(sender, instance, action, reverse, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        refresh_on_commit(recommendations.refresh_suggestions, [instance.pk])
+
+@receiver(post_delete, sender=Connection)
+def prune_timelines_on_disconnect(sender, instance, **kwargs):
+    if instance.accepted:
+        timeline.drop_author(instance.creator, instance.friend)
+        timeline.drop_author(instance.friend, instance.creator)
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    if created:
+        adjust_post_counter(instance.post_id, 'comment_count', 1)
+
+@receiver(post_save, sender=Comment)
+def create_comment_notification(sender, instance, created, **kwargs):
+    if created:
+        notifications.notify_comment(instance)
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    adjust_post_counter(instance.post_id, 'comment_count', -1)
+
+@receiver(post_save, sender=Message)
+def update_conversation_summary(sender, instance, created, **kwargs):
+    if created:
+        conversations.record_message(instance)
+
+@receiver(post_delete, sender=Message)
+def update_conversation_on_delete(sender, instance, **kwargs):
+    conversations.message_deleted(instance)
+
+# Author fields that are part of a post's search document (see core/search.py)
+SEARCHED_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    post_id = instance.pk
+    transaction.on_commit(lambda: search.index_posts([post_id]))
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_posts([instance.pk])
+
+@receiver(post_save, sender=Subject)
+def reindex_subject_posts(sender, instance, created, **kwargs):
+    if not created:
+        subject_id = instance.pk
+        transaction.on_commit(lambda: search.index_posts(
+            Post.objects.filter(subject_id=subject_id).values_list('pk', flat=True)
+        ))
+
+@receiver(post_save, sender=User)
+def reindex_author_posts(sender, instance, created, update_fields=None, **kwargs):
+    # Logins save only last_login; skip saves that cannot have changed the author name
+    if created or (update_fields is not None and not SEARCHED_USER_FIELDS & set(update_fields)):
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: search.index_posts(
+        Post.objects.filter(author_id=user_id).values_list('pk', flat=True)
+    ))
+
+# User fields that feed people search (see core/people_search.py); the profile's go with any Profile save
+PEOPLE_SEARCH_USER_FIELDS = {'username', 'email', 'first_name', 'last_name'}
+
+@receiver(post_save, sender=User)
+def refresh_people_search_for_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not PEOPLE_SEARCH_USER_FIELDS & set(update_fields):
+        return
+    refresh_on_commit(people_search.refresh_users, [instance.pk])
+
+@receiver(post_save, sender=Profile)
+def refresh_people_search_for_profile(sender, instance, **kwargs):
+    refresh_on_commit(people_search.refresh_users, [instance.pk])
+
+@receiver(m2m_changed, sender=Profile.skills.through)
+def refresh_people_search_on_skills_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # Skill-side edits (skill.profiles_with_skill.add(...)) list the profiles in pk_set
+        user_ids = list(pk_set or [])
+    else:
+        user_ids = [instance.pk]
+    refresh_on_commit(people_search.refresh_users, user_ids)
+
+@receiver(post_save, sender=Skill)
+def refresh_people_search_on_skill_rename(sender, instance, created, **kwargs):
+    if not created:
+        skill = instance
+        transaction.on_commit(lambda: people_search.refresh_users(
+            skill.profiles_with_skill.values_list('pk', flat=True)
+        ))
+
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=Badge)
+@receiver(post_delete, sender=Badge)
+def bump_reference_data_version(sender, **kwargs):
+    reference_data.bump_version(sender._meta.model_name)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Project)
+def generate_image_derivatives(sender, instance, **kwargs):
+    # Only queues work when an image field points at a file without derivatives
+    images.schedule_derivatives(instance)
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def invalidate_post_card(sender, instance, **kwargs):
+    # Counter changes (likes, new comments) invalidate through core/counters.py
+    post_cards.invalidate(instance.pk if sender is Post else instance.post_id)
+
+@receiver(post_save, sender=Submission)
+def update_leaderboard_on_save(sender, instance, created, **kwargs):
+    # Score buckets move in this transaction; the cached top after commit (see core/leaderboard.py)
+    leaderboard.submission_saved(instance, created)
+
+@receiver(post_delete, sender=Submission)
+def update_leaderboard_on_delete(sender, instance, **kwargs):
+    leaderboard.submission_deleted(instance)
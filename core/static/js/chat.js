@@ -42,6 +42,7 @@ document.addEventListener('DOMContentLoaded', function() {
     console.log('API_SEND_MESSAGE_URL:', API_SEND_MESSAGE_URL);
 
     let lastMessageTimestamp = null;
+    let lastMessageId = null; // Highest message id shown; polling asks only for newer ones
     let selectedFile = null; // To store the file selected for attachment
 
     /**
@@ -50,8 +51,8 @@ document.addEventListener('DOMContentLoaded', function() {
     async function fetchMessages() {
         console.log('fetchMessages function called. lastMessageTimestamp:', lastMessageTimestamp);
         try {
-            const url = lastMessageTimestamp 
-                ? `${API_FETCH_MESSAGES_URL}?since=${lastMessageTimestamp}` 
+            const url = lastMessageId
+                ? `${API_FETCH_MESSAGES_URL}?after=${lastMessageId}`
                 : API_FETCH_MESSAGES_URL;
 
             const response = await fetch(url);
@@ -82,12 +83,8 @@ document.addEventListener('DOMContentLoaded', function() {
                         console.log(`Appending message ID: ${msg.id}`);
                         chatMessages.prepend(messageElement); // Prepend for flex-direction: column-reverse
                         
-                        const msgTimestamp = new Date(msg.timestamp).toISOString();
-                        if (!lastMessageTimestamp || msgTimestamp > lastMessageTimestamp) {
-                            lastMessageTimestamp = msgTimestamp;
-                            console.log('Updated lastMessageTimestamp:', lastMessageTimestamp);
-                        }
                     }
+                    trackLastMessage(msg);
                 });
 
                 // Scroll to bottom if user was near bottom or it's the initial load
@@ -109,6 +106,19 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    /**
+     * Remembers the newest message seen so the next poll only asks for later ones.
+     */
+    function trackLastMessage(message) {
+        if (!lastMessageId || message.id > lastMessageId) {
+            lastMessageId = message.id;
+        }
+        const msgTimestamp = new Date(message.timestamp).toISOString();
+        if (!lastMessageTimestamp || msgTimestamp > lastMessageTimestamp) {
+            lastMessageTimestamp = msgTimestamp;
+        }
+    }
+
     /**
      * Creates an HTML element for a single message bubble.
      * Includes a check for existing IDs to prevent duplicates.
@@ -235,11 +245,17 @@ document.addEventListener('DOMContentLoaded', function() {
 
         const formData = new FormData();
         formData.append('content', content);
-        if (selectedFile) {
-            formData.append('file', selectedFile);
-        }
 
         try {
+            if (selectedFile) {
+                // Sent ahead in resumable chunks (chunked_upload.js); the message only carries its id
+                const uploadId = await window.ChunkedUpload.upload(selectedFile, 'message', {
+                    csrfToken,
+                    onProgress: fraction => console.log(`Attachment upload: ${Math.round(fraction * 100)}%`),
+                });
+                formData.append('upload_id', uploadId);
+            }
+
             const response = await fetch(API_SEND_MESSAGE_URL, {
                 method: 'POST',
                 headers: {
@@ -265,12 +281,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 scrollToBottom();
             }
             
-            // Update lastMessageTimestamp with the latest message's timestamp
-            const msgTimestamp = new Date(newMessage.timestamp).toISOString();
-            if (!lastMessageTimestamp || msgTimestamp > lastMessageTimestamp) {
-                lastMessageTimestamp = msgTimestamp;
-                console.log('Updated lastMessageTimestamp after sending:', lastMessageTimestamp);
-            }
+            trackLastMessage(newMessage);
 
             clearAttachmentPreview(); // <-- Move here, after successful send
         } catch (error) {
@@ -474,9 +485,84 @@ document.addEventListener('DOMContentLoaded', function() {
 // ... (rest of your chat.js code) ...
 
 
-    // --- Initial Load and Polling for real-time updates ---
+    // --- Real-time updates: WebSocket first, polling as the fallback ---
+    const POLL_INTERVAL_MS = 3000;
+    const MAX_RECONNECT_DELAY_MS = 30000;
+    let pollTimer = null;
+    let chatSocket = null;
+    let reconnectDelay = 1000;
+
+    function startPolling() {
+        if (pollTimer || document.hidden) return;
+        pollTimer = setInterval(fetchMessages, POLL_INTERVAL_MS);
+    }
+
+    function stopPolling() {
+        if (pollTimer) {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+    }
+
+    function socketIsOpen() {
+        return chatSocket && chatSocket.readyState === WebSocket.OPEN;
+    }
+
+    function connectSocket() {
+        if (!('WebSocket' in window) || !recipientUsername) {
+            startPolling();
+            return;
+        }
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        chatSocket = new WebSocket(
+            `${scheme}://${window.location.host}/ws/chat/${encodeURIComponent(recipientUsername)}/`
+        );
+
+        chatSocket.onopen = function() {
+            console.log('Chat socket connected.');
+            reconnectDelay = 1000;
+            stopPolling();
+            fetchMessages(); // Catch up on anything sent while we were disconnected
+        };
+
+        chatSocket.onmessage = function(event) {
+            const data = JSON.parse(event.data);
+            const message = data.message;
+            if (!message) return;
+            const isScrolledToBottom = chatMessages.scrollHeight - chatMessages.clientHeight <= chatMessages.scrollTop + 1;
+            const messageElement = createMessageElement(message);
+            if (messageElement) {
+                chatMessages.prepend(messageElement);
+                if (isScrolledToBottom || message.sender_username === currentUsername) {
+                    scrollToBottom();
+                }
+            }
+            trackLastMessage(message);
+        };
+
+        chatSocket.onclose = function(event) {
+            console.warn('Chat socket closed, falling back to polling.', event.code);
+            chatSocket = null;
+            startPolling();
+            // 4003/4004: the server refused this conversation, retrying will not help
+            if (event.code === 4003 || event.code === 4004) return;
+            setTimeout(connectSocket, reconnectDelay);
+            reconnectDelay = Math.min(reconnectDelay * 2, MAX_RECONNECT_DELAY_MS);
+        };
+    }
+
+    // Don't poll from background tabs; catch up as soon as the tab is visible again
+    document.addEventListener('visibilitychange', function() {
+        if (document.hidden) {
+            stopPolling();
+        } else if (!socketIsOpen()) {
+            fetchMessages();
+            startPolling();
+        }
+    });
+
     fetchMessages();
-    setInterval(fetchMessages, 3000); // Poll for new messages every 3 seconds
+    connectSocket();
 
     setTimeout(scrollToBottom, 100); // Scroll to bottom initially after a short delay
 });
\ No newline at end of file
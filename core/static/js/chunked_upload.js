@@ -0,0 +1,118 @@
+// static/js/chunked_upload.js
+//
+// Client for the resumable upload API in core/uploads.py. Files are sent
+// in fixed-size chunks, each with its SHA-256, so a dropped connection
+// only costs the chunk in flight. The session id is remembered per file in
+// localStorage, so picking the same file again resumes where it stopped.
+//
+//   const uploadId = await ChunkedUpload.upload(file, 'message', { csrfToken, onProgress });
+//   formData.append('upload_id', uploadId);
+
+(function () {
+    'use strict';
+
+    const API_URL = '/api/uploads/';
+    const RETRIES_PER_CHUNK = 3;
+
+    function storageKey(file, purpose) {
+        return `chunked-upload:${purpose}:${file.name}:${file.size}:${file.lastModified}`;
+    }
+
+    async function sha256Hex(blob) {
+        if (!window.crypto || !window.crypto.subtle) {
+            return '';  // Not a secure context; the server still checks the chunk size
+        }
+        const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async function request(url, options) {
+        const response = await fetch(url, options);
+        const data = await response.json().catch(() => ({}));
+        if (!response.ok) {
+            const error = new Error(data.error || response.statusText);
+            error.status = response.status;
+            throw error;
+        }
+        return data;
+    }
+
+    async function startOrResume(file, purpose, csrfToken) {
+        const key = storageKey(file, purpose);
+        const savedId = window.localStorage.getItem(key);
+        if (savedId) {
+            try {
+                const session = await request(`${API_URL}${savedId}/`, { credentials: 'same-origin' });
+                if (session.status !== 'attached') {
+                    return session;
+                }
+            } catch (error) {
+                // Expired or already used; start again below
+            }
+        }
+        const body = new FormData();
+        body.append('purpose', purpose);
+        body.append('filename', file.name);
+        body.append('size', file.size);
+        body.append('content_type', file.type || '');
+        const session = await request(API_URL, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': csrfToken },
+            credentials: 'same-origin',
+            body,
+        });
+        window.localStorage.setItem(key, session.id);
+        return session;
+    }
+
+    async function sendChunk(session, file, index, csrfToken) {
+        const start = index * session.chunk_size;
+        const blob = file.slice(start, Math.min(start + session.chunk_size, file.size));
+        const checksum = await sha256Hex(blob);
+        for (let attempt = 1; ; attempt++) {
+            try {
+                return await request(`${API_URL}${session.id}/chunks/${index}/`, {
+                    method: 'PUT',
+                    headers: { 'X-CSRFToken': csrfToken, 'X-Chunk-SHA256': checksum },
+                    credentials: 'same-origin',
+                    body: blob,
+                });
+            } catch (error) {
+                // Client errors other than a checksum mismatch will not go away by retrying
+                const retryable = !error.status || error.status >= 500 || error.status === 422;
+                if (!retryable || attempt >= RETRIES_PER_CHUNK) {
+                    throw error;
+                }
+                await new Promise(resolve => setTimeout(resolve, 500 * attempt));
+            }
+        }
+    }
+
+    async function upload(file, purpose, options = {}) {
+        const csrfToken = options.csrfToken;
+        const onProgress = options.onProgress || (() => {});
+        let session = await startOrResume(file, purpose, csrfToken);
+
+        if (session.status === 'pending') {
+            const received = new Set(session.received);
+            let done = received.size;
+            onProgress(done / session.chunk_count);
+            for (let index = 0; index < session.chunk_count; index++) {
+                if (received.has(index)) {
+                    continue;
+                }
+                await sendChunk(session, file, index, csrfToken);
+                onProgress(++done / session.chunk_count);
+            }
+            session = await request(`${API_URL}${session.id}/complete/`, {
+                method: 'POST',
+                headers: { 'X-CSRFToken': csrfToken },
+                credentials: 'same-origin',
+            });
+        }
+        window.localStorage.removeItem(storageKey(file, purpose));
+        return session.id;
+    }
+
+    window.ChunkedUpload = { upload };
+})();
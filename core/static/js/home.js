@@ -1,8 +1,9 @@
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize Masonry layout for posts
     const postsFeed = document.getElementById('postsFeed');
+    let msnry = null;
     if (postsFeed) {
-        const msnry = new Masonry(postsFeed, {
+        msnry = new Masonry(postsFeed, {
             itemSelector: '.post-card',
             columnWidth: '.post-card',
             percentPosition: true,
@@ -15,33 +16,40 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
-    // Infinite scroll
+    // Infinite scroll, driven by the keyset cursor handed out by the server.
+    // Each request asks for the page *after* the last post we rendered, so
+    // the server never re-renders posts we already have.
     let loading = false;
-    let page = 1;
+    let nextCursor = postsFeed ? postsFeed.dataset.nextCursor : '';
+    const feedUrl = postsFeed ? postsFeed.dataset.feedUrl : null;
+    const feedSource = postsFeed ? postsFeed.dataset.feedSource : '';
     const loadingSpinner = document.getElementById('loadingSpinner');
     
-    window.addEventListener('scroll', function() {
+    function onScroll() {
         if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 500 && !loading) {
             loadMorePosts();
         }
-    });
+    }
+    window.addEventListener('scroll', onScroll);
     
     function loadMorePosts() {
-        if (loading) return;
+        if (loading || !feedUrl) return;
+        if (!nextCursor) {
+            // No more posts to load
+            window.removeEventListener('scroll', onScroll);
+            return;
+        }
         
         loading = true;
         loadingSpinner.classList.remove('d-none');
-        page++;
         
-        fetch(`/?page=${page}`)
-            .then(response => response.text())
-            .then(html => {
-                const parser = new DOMParser();
-                const doc = parser.parseFromString(html, 'text/html');
-                const newPosts = doc.getElementById('postsFeed').innerHTML;
-                
-                if (newPosts.trim() !== '') {
-                    postsFeed.insertAdjacentHTML('beforeend', newPosts);
+        fetch(`${feedUrl}?cursor=${encodeURIComponent(nextCursor)}&source=${encodeURIComponent(feedSource)}`, {
+            headers: { 'X-Requested-With': 'XMLHttpRequest' }
+        })
+            .then(response => response.json())
+            .then(data => {
+                if (data.html && data.html.trim() !== '') {
+                    postsFeed.insertAdjacentHTML('beforeend', data.html);
                     
                     // Initialize any new post interactions
                     initPostInteractions();
@@ -51,9 +59,10 @@ document.addEventListener('DOMContentLoaded', function() {
                         msnry.reloadItems();
                         msnry.layout();
                     }
-                } else {
-                    // No more posts to load
-                    window.removeEventListener('scroll', loadMorePosts);
+                }
+                nextCursor = data.next_cursor || '';
+                if (!nextCursor) {
+                    window.removeEventListener('scroll', onScroll);
                 }
             })
             .catch(error => console.error('Error loading more posts:', error))
@@ -19,7 +19,12 @@ document.addEventListener('DOMContentLoaded', function() {
                         const icon = likeButton.querySelector('i');
                         icon.classList.toggle('bi-hand-thumbs-up');
                         icon.classList.toggle('bi-hand-thumbs-up-fill');
-                        // Optional: Update like count display if you have one
+                        // Counts come from the server-side counter columns
+                        const count = data.like_count ?? data.likes_count;
+                        const likeCount = document.querySelector(`#post-${postId} .like-count`);
+                        if (likeCount && count !== undefined) {
+                            likeCount.textContent = count;
+                        }
                     } else {
                         console.error('Failed to like/unlike post:', data.error);
                     }
@@ -77,6 +82,10 @@ document.addEventListener('DOMContentLoaded', function() {
                     if (data.success && data.comment_html) {
                         commentList.innerHTML = data.comment_html + commentList.innerHTML;
                         commentInput.value = '';
+                        const commentCount = document.querySelector(`#post-${postId} .comment-count`);
+                        if (commentCount && data.comment_count !== undefined) {
+                            commentCount.textContent = data.comment_count;
+                        }
                     } else {
                         console.error('Failed to post comment:', data.error);
                     }
@@ -1,7 +1,92 @@
 from django import template
+from django.utils.html import format_html, format_html_join
+
+from .. import images, post_cards
+from .. import reference_data as reference_tables
 
 register = template.Library()
 
 @register.filter
 def get_item(dictionary, key):
     return dictionary.get(key)
+
+@register.simple_tag
+def reference_data(kind):
+    """Cached rows of a reference table: {% reference_data 'subject' as subjects %}."""
+    return reference_tables.get_all(kind)
+
+@register.simple_tag
+def image_url(image, size):
+    """JPEG URL of one derivative (e.g. for a CSS background): {% image_url profile.cover_photo 'card' %}."""
+    return images.derivative_url(image, size)
+
+@register.simple_tag
+def responsive_image(image, size, width=None, height=None, **attrs):
+    """
+    Renders a derivative of ``image`` as a WebP/JPEG <picture> with srcset:
+    {% responsive_image post.author.profile_pic 'avatar' width=48 height=48 class="rounded-circle" alt="" %}.
+    ``width``/``height`` are the display size; without them the derivative's
+    own dimensions are used. Images without derivatives yet fall back to a
+    plain <img> of the original.
+    """
+    if not image:
+        return ''
+    chosen, _ = images.rendition(image, size)
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    if chosen is None:
+        attrs.update({'width': width, 'height': height})
+        return format_html('<img src="{}"{}>', image.url, _attributes(attrs))
+
+    if width:
+        sizes = f'{width}px'
+    else:
+        sizes = f"(max-width: {chosen['width']}px) 100vw, {chosen['width']}px"
+    attrs.update({
+        'width': width or chosen['width'],
+        'height': height or chosen['height'],
+        'srcset': images.srcset(image, size, 'jpeg'),
+        'sizes': sizes,
+    })
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}"><img src="{}"{}></picture>',
+        images.srcset(image, size, 'webp'), sizes, images.derivative_url(image, size), _attributes(attrs),
+    )
+
+class PostCardFragmentNode(template.Node):
+    def __init__(self, post, name, item, nodelist):
+        self.post = post
+        self.name = name
+        self.item = item
+        self.nodelist = nodelist
+
+    def render(self, context):
+        post = self.post.resolve(context)
+        if not post_cards.cache_timeout() or not post:
+            return self.nodelist.render(context)
+        item = self.item.resolve(context) if self.item else None
+        key, html = post_cards.get_fragment(post, self.name.resolve(context), item)
+        if html is None:
+            html = self.nodelist.render(context)
+            post_cards.store_fragment(key, html)
+        return html
+
+@register.tag
+def post_card_fragment(parser, token):
+    """
+    Caches the enclosed, viewer-independent part of a post card under the
+    post's version stamp (see core/post_cards.py):
+    {% post_card_fragment post 'body' %}...{% end_post_card_fragment %}.
+    A comment passes itself too: {% post_card_fragment post 'comment' comment %}.
+    Outside a card (no post in the context) the block renders uncached.
+    """
+    bits = token.split_contents()
+    if len(bits) not in (3, 4):
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a post, a fragment name and optionally a comment")
+    nodelist = parser.parse(('end_post_card_fragment',))
+    parser.delete_first_token()
+    item = parser.compile_filter(bits[3]) if len(bits) == 4 else None
+    return PostCardFragmentNode(parser.compile_filter(bits[1]), parser.compile_filter(bits[2]), item, nodelist)
+
+def _attributes(attrs):
+    return format_html_join('', ' {}="{}"', ((name.replace('_', '-'), value) for name, value in attrs.items() if value is not None))
@@ -1,3 +1,304 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import instrumentation, leaderboard, lookups, reference_data, uploads
+from .benchmarks import pick_subjects, reset_process_state
+from .models import Challenge, Message, ReferenceDataVersion, Skill, Submission, UploadSession, User
+from .seeding import Seeder
+
+# A private cache, so fragments and version stamps from other tests cannot leak in
+PRIVATE_CACHE = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': f'tests-{uuid.uuid4().hex}',
+}}
+
+
+@override_settings(CACHES=PRIVATE_CACHE, QUERY_BUDGET_STRICT=False)
+class QueryBudgetTests(TestCase):
+    """
+    The key views stay within their @query_budget on a small seeded network,
+    both cold (empty cache, fresh process state) and warm, for the median
+    and the most connected user (see core/benchmarks.py).
+    """
+
+    VIEWS = ['home', 'network', 'chat_list_history']
+
+    @classmethod
+    def setUpTestData(cls):
+        Seeder(users=60, seed=1, log=lambda message: None).run()
+        cls.subjects = pick_subjects()
+
+    def setUp(self):
+        self.addCleanup(reset_process_state)
+
+    def assert_view_within_budget(self, subject, url_name):
+        cache.clear()
+        reset_process_state()
+        self.client.force_login(subject.user)
+        for temperature in ('cold', 'warm'):
+            with self.subTest(persona=subject.persona, view=url_name, cache=temperature):
+                response = self.client.get(reverse(url_name))
+                self.assertEqual(response.status_code, 200)
+                instrumentation.assert_within_budget(response)
+
+    def test_views_within_budget(self):
+        self.assertEqual([subject.persona for subject in self.subjects], ['typical', 'heavy'])
+        for subject in self.subjects:
+            for url_name in self.VIEWS:
+                self.assert_view_within_budget(subject, url_name)
+
+
+@override_settings(CACHES=PRIVATE_CACHE)
+class SkillLookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference_data.reset()
+        self.addCleanup(reference_data.reset)
+        Skill.objects.create(name='Python')
+
+    def test_cached_skill_costs_no_query(self):
+        reference_data.get_all('skill')
+        with self.assertNumQueries(0):
+            self.assertEqual([skill.name for skill in lookups.get_or_create_skills(['python'])], ['Python'])
+
+    def test_skill_added_by_another_process_is_reused(self):
+        reference_data.get_all('skill')
+        # Another worker adds "Rust"; this process still holds the old stamp until it times out
+        Skill.objects.bulk_create([Skill(name='Rust')])
+        ReferenceDataVersion.objects.filter(key='skill').update(version=F('version') + 1)
+
+        skills = lookups.get_or_create_skills(['rust', 'Go'])
+        self.assertEqual([skill.name for skill in skills], ['Rust', 'Go'])
+        self.assertEqual(Skill.objects.filter(name__iexact='rust').count(), 1)
+
+
+@override_settings(UPLOAD_CHUNK_SIZE=1000, UPLOAD_USER_QUOTA=10_000)
+class ChunkedUploadTests(TestCase):
+    """The resumable upload protocol, driven through its endpoints (see core/uploads.py)."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root, UPLOAD_SESSION_DIR='')
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user('sender', 'sender@example.com', 'password')
+        self.recipient = User.objects.create_user('recipient', 'recipient@example.com', 'password')
+        self.client.force_login(self.user)
+        self.data = os.urandom(2500)
+
+    def start(self, data=None, purpose='message', **fields):
+        data = self.data if data is None else data
+        return self.client.post(reverse('upload_start'), {
+            'purpose': purpose, 'filename': 'report.pdf', 'size': len(data),
+            'content_type': 'application/pdf', 'sha256': hashlib.sha256(data).hexdigest(), **fields,
+        })
+
+    def put(self, upload_id, index, body, checksum=None):
+        checksum = hashlib.sha256(body).hexdigest() if checksum is None else checksum
+        return self.client.put(reverse('upload_chunk', args=[upload_id, index]), body,
+                               content_type='application/octet-stream', headers={'X-Chunk-SHA256': checksum})
+
+    def chunk(self, index):
+        return self.data[index * 1000:(index + 1) * 1000]
+
+    def upload(self, purpose='message'):
+        """A completed upload's id."""
+        upload_id = self.start(purpose=purpose).json()['id']
+        for index in range(3):
+            self.put(upload_id, index, self.chunk(index))
+        self.assertEqual(self.client.post(reverse('upload_complete', args=[upload_id])).status_code, 200)
+        return upload_id
+
+    def send(self, upload_id):
+        return self.client.post(reverse('api_send_message', args=[self.recipient.username]),
+                                {'content': 'see attached', 'upload_id': upload_id})
+
+    def test_chunks_are_checked_and_can_be_resent(self):
+        response = self.start()
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.json()['id']
+        self.assertEqual(response.json()['chunk_count'], 3)
+
+        self.assertEqual(self.put(upload_id, 0, self.chunk(0)[:999]).status_code, 400)
+        self.assertEqual(self.put(upload_id, 0, self.chunk(0), checksum='0' * 64).status_code, 422)
+        self.assertEqual(self.put(upload_id, 3, b'x').status_code, 400)
+        self.assertEqual(self.put(upload_id, 0, os.urandom(1000)).status_code, 200)
+        self.assertEqual(self.put(upload_id, 0, self.chunk(0)).status_code, 200)  # Replaces the first one
+        self.assertEqual(self.put(upload_id, 2, self.chunk(2)).status_code, 200)
+        self.assertEqual(self.client.get(reverse('upload_status', args=[upload_id])).json()['received'], [0, 2])
+
+        response = self.client.post(reverse('upload_complete', args=[upload_id]))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.put(upload_id, 1, self.chunk(1)).status_code, 200)
+        response = self.client.post(reverse('upload_complete', args=[upload_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'complete')
+        self.assertEqual(self.put(upload_id, 1, self.chunk(1)).status_code, 409)
+
+        self.assertEqual(self.send(upload_id).status_code, 201)
+        message = Message.objects.get()
+        self.assertEqual(message.file_name, 'report.pdf')
+        with message.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+
+    def test_whole_file_checksum_is_checked(self):
+        upload_id = self.start(sha256='0' * 64).json()['id']
+        for index in range(3):
+            self.put(upload_id, index, self.chunk(index))
+        self.assertEqual(self.client.post(reverse('upload_complete', args=[upload_id])).status_code, 422)
+
+    def test_concurrent_completes_assemble_once(self):
+        upload_id = self.start().json()['id']
+        for index in range(3):
+            self.put(upload_id, index, self.chunk(index))
+        session = UploadSession.objects.get(pk=upload_id)
+        replace = os.replace
+        results, overtaken = [], []
+
+        def replace_after_rival(source, target):
+            # The first call is overtaken by a second that runs to the end before it moves its copy in
+            if not overtaken:
+                overtaken.append(True)
+                results.append(uploads.complete(session))
+            return replace(source, target)
+
+        with mock.patch('core.uploads.os.replace', side_effect=replace_after_rival):
+            results.append(uploads.complete(session))
+        self.assertEqual([result.status for result in results], ['complete', 'complete'])
+        self.assertEqual(os.listdir(uploads.session_dir(session)), ['assembled'])
+        with open(uploads._assembled_path(session), 'rb') as assembled:
+            self.assertEqual(assembled.read(), self.data)
+
+    def test_quota_counts_unclaimed_uploads(self):
+        self.assertEqual(self.start(data=b'x' * 6000).status_code, 201)
+        self.assertEqual(self.start(data=b'x' * 5000).status_code, 413)
+        self.assertEqual(self.start(data=b'x' * 4000).status_code, 201)
+
+    def test_claim_once_and_for_its_purpose(self):
+        self.assertEqual(self.send('not-an-upload-id').status_code, 404)
+        self.assertEqual(self.send(self.upload(purpose='submission')).status_code, 400)
+        upload_id = self.upload()
+        self.assertEqual(self.send(upload_id).status_code, 201)
+        self.assertEqual(self.send(upload_id).status_code, 404)
+        self.assertFalse(UploadSession.objects.filter(pk=upload_id).exists())
+
+    def test_failed_claim_before_storing_can_be_retried(self):
+        upload_id = self.upload()
+        with self.assertRaises(RuntimeError):
+            with uploads.claim(upload_id, self.user, 'message'):
+                raise RuntimeError
+        self.assertEqual(UploadSession.objects.get(pk=upload_id).status, 'complete')
+        self.assertEqual(self.send(upload_id).status_code, 201)
+
+    def test_failed_claim_after_storing_leaves_nothing_behind(self):
+        upload_id = self.upload()
+        with self.assertRaises(RuntimeError):
+            with uploads.claim(upload_id, self.user, 'message') as upload:
+                message = Message(sender=self.user, recipient=self.recipient)
+                message.file.save(upload.name, upload, save=False)  # Moved out of the session directory
+                stored = message.file.path
+                self.assertTrue(os.path.exists(stored))
+                raise RuntimeError
+        self.assertFalse(os.path.exists(stored))
+        self.assertFalse(UploadSession.objects.filter(pk=upload_id).exists())
+
+
+@override_settings(CACHES=PRIVATE_CACHE, LEADERBOARD_CACHE_SIZE=4)
+class LeaderboardTests(TestCase):
+    """
+    The bucketed ranks, the cached top and the keyset pages all agree with
+    a plain ORDER BY over the board (see core/leaderboard.py).
+    """
+
+    SCORES = [50, 80, 80, 80, 20, None, 80, 50, 10, 95]
+
+    def setUp(self):
+        cache.clear()
+        self.challenge = Challenge.objects.create(title='Sorting', description='Sort things', prize='A mug',
+                                                  end_date=timezone.now() + timedelta(days=7))
+        start = timezone.now() - timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            for i, score in enumerate(self.SCORES):
+                user = User.objects.create_user(f'entrant{i}', f'entrant{i}@example.com')
+                Submission.objects.create(challenge=self.challenge, user=user.profile, content='solution', score=score)
+        # Ties on score: two share a timestamp (so the id decides), the others are apart
+        submitted_at = [start + timedelta(minutes=i // 2) for i in range(len(self.SCORES))]
+        for submission, moment in zip(Submission.objects.order_by('-id'), submitted_at):
+            Submission.objects.filter(pk=submission.pk).update(submitted_at=moment)
+
+    def expected(self):
+        return list(Submission.objects.filter(challenge=self.challenge, score__isnull=False)
+                    .order_by('-score', 'submitted_at', 'id').values_list('id', flat=True))
+
+    def walk(self, page_size):
+        """Every ``(rank, submission id)`` on the board, page by page."""
+        ranked, cursor = [], None
+        while True:
+            page, cursor = leaderboard.get_page(self.challenge.pk, cursor=cursor, page_size=page_size)
+            ranked.extend((rank, entry.submission_id) for rank, entry in page)
+            if not cursor:
+                return ranked
+
+    def assert_board_matches(self):
+        expected = self.expected()
+        entries, complete = leaderboard.get_top(self.challenge.pk)
+        self.assertEqual([entry.submission_id for entry in entries], expected[:4])
+        self.assertEqual(complete, len(expected) <= 4)
+        for page_size in (1, 3, 4, 10):
+            self.assertEqual(self.walk(page_size), list(enumerate(expected, 1)))
+        for rank, submission_id in enumerate(expected, 1):
+            self.assertEqual(leaderboard.rank_of(Submission.objects.get(pk=submission_id)), rank)
+        self.assertEqual(leaderboard.total_ranked(self.challenge.pk), len(expected))
+
+    def rescore(self, submission_id, score):
+        submission = Submission.objects.get(pk=submission_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            submission.score = score
+            submission.save()
+
+    def test_ties_and_pages_follow_board_order(self):
+        self.assert_board_matches()
+        unscored = Submission.objects.get(score__isnull=True)
+        self.assertIsNone(leaderboard.rank_of(unscored))
+
+    def test_rescore_moves_into_and_out_of_the_cached_top(self):
+        leaderboard.get_top(self.challenge.pk)  # Cache the top before re-scoring
+        bottom = self.expected()[-1]
+        self.rescore(bottom, 90)
+        self.assertIn(bottom, [entry.submission_id for entry in leaderboard.get_top(self.challenge.pk)[0]])
+        self.assert_board_matches()
+
+        first = self.expected()[0]
+        self.rescore(first, 5)
+        self.assertNotIn(first, [entry.submission_id for entry in leaderboard.get_top(self.challenge.pk)[0]])
+        self.assertEqual(leaderboard.rank_of(Submission.objects.get(pk=first)), len(self.expected()))
+        self.assert_board_matches()
+
+        self.rescore(first, None)
+        self.assert_board_matches()
+
+    def test_cached_top_serves_the_first_page_without_queries(self):
+        leaderboard.get_top(self.challenge.pk)
+        with self.assertNumQueries(0):
+            page, cursor = leaderboard.get_page(self.challenge.pk, page_size=4)
+        self.assertEqual([entry.submission_id for _, entry in page], self.expected()[:4])
+        self.assertIsNotNone(cursor)
+
+    def test_rebuild_repairs_drift(self):
+        leaderboard.get_top(self.challenge.pk)
+        Submission.objects.filter(score=80).update(score=30)  # Bypasses the signals
+        call_command('rebuild_leaderboards', verbosity=0)
+        self.assert_board_matches()
@@ -0,0 +1,263 @@
+# core/timeline.py
+
+"""
+Fan-out-on-write timelines for the personalised home feed.
+
+When a post is created its id is pushed into a bounded, newest-first
+timeline for the author and for each of the author's connections. Reading
+the home feed is then a single range scan over the reader's own timeline
+instead of an OR-join over Connection on every request.
+
+Storage is pluggable through ``settings.TIMELINE_BACKEND``:
+
+* ``core.timeline.DatabaseTimelineBackend`` (default) keeps entries in the
+  ``TimelineEntry`` table.
+* ``core.timeline.LocMemTimelineBackend`` keeps per-process sorted lists,
+  standing in for a Redis sorted set in development and tests.
+
+Entries are ``(created_at, post_id)`` pairs so the keyset cursors from
+core/feed.py work unchanged on top of them.
+"""
+
+import bisect
+import threading
+
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils.module_loading import import_string
+
+from .models import Post, Profile, TimelineEntry
+
+DEFAULT_TIMELINE_BACKEND = 'core.timeline.DatabaseTimelineBackend'
+
+
+def timeline_max_length():
+    return getattr(settings, 'TIMELINE_MAX_LENGTH', 500)
+
+
+class BaseTimelineBackend:
+    """Interface every timeline store implements."""
+
+    def push(self, owner_ids, post_id, created_at):
+        """Adds one post to each owner's timeline and trims them."""
+        raise NotImplementedError
+
+    def push_many(self, owner_id, entries):
+        """Adds several ``(created_at, post_id)`` entries to one timeline."""
+        raise NotImplementedError
+
+    def push_bulk(self, timelines):
+        """
+        Fills several timelines at once from ``{owner_id: entries}``, e.g.
+        after a bulk import. Entries beyond timeline_max_length() are dropped.
+        """
+        for owner_id, entries in timelines.items():
+            self.push_many(owner_id, entries)
+
+    def fetch(self, owner_id, before=None, limit=10):
+        """
+        Returns up to ``limit`` ``(created_at, post_id)`` entries, newest
+        first, strictly older than the ``before`` position if given.
+        """
+        raise NotImplementedError
+
+    def discard(self, owner_id, post_ids):
+        """Removes specific posts from one timeline."""
+        raise NotImplementedError
+
+    def remove_post(self, post_id):
+        """Removes a post from every timeline it was pushed to."""
+        raise NotImplementedError
+
+    def clear(self, owner_id):
+        raise NotImplementedError
+
+
+class DatabaseTimelineBackend(BaseTimelineBackend):
+    """Stores timelines in the TimelineEntry table."""
+
+    def push(self, owner_ids, post_id, created_at):
+        owner_ids = list(owner_ids)
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at) for owner_id in owner_ids],
+            ignore_conflicts=True,
+        )
+        self._trim(owner_ids)
+
+    def push_many(self, owner_id, entries):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at) for created_at, post_id in entries],
+            ignore_conflicts=True,
+        )
+        self._trim([owner_id])
+
+    def push_bulk(self, timelines, batch_size=1000):
+        # One INSERT per batch across owners; each owner is trimmed in memory
+        # first, so only owners that already had entries need a trimming DELETE.
+        limit = timeline_max_length()
+        existing = set(TimelineEntry.objects.filter(owner_id__in=list(timelines))
+                                            .values_list('owner_id', flat=True).distinct())
+        rows = [
+            TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at)
+            for owner_id, entries in timelines.items()
+            for created_at, post_id in sorted(entries, reverse=True)[:limit]
+        ]
+        TimelineEntry.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+        if existing:
+            self._trim(list(existing))
+
+    def fetch(self, owner_id, before=None, limit=10):
+        entries = TimelineEntry.objects.filter(owner_id=owner_id)
+        if before:
+            created_at, post_id = before
+            entries = entries.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, post_id__lt=post_id)
+            )
+        return list(entries.order_by('-created_at', '-post_id').values_list('created_at', 'post_id')[:limit])
+
+    def discard(self, owner_id, post_ids):
+        TimelineEntry.objects.filter(owner_id=owner_id, post_id__in=list(post_ids)).delete()
+
+    def remove_post(self, post_id):
+        # Rows cascade with the Post itself; this covers explicit removals.
+        TimelineEntry.objects.filter(post_id=post_id).delete()
+
+    def clear(self, owner_id):
+        TimelineEntry.objects.filter(owner_id=owner_id).delete()
+
+    def _trim(self, owner_ids):
+        # One DELETE for the whole batch, however many owners: rank each
+        # owner's rows newest-first and drop those past the limit.
+        overflow = TimelineEntry.objects.filter(owner_id__in=owner_ids).annotate(
+            position=Window(RowNumber(), partition_by=[F('owner_id')],
+                            order_by=[F('created_at').desc(), F('post_id').desc()]),
+        ).filter(position__gt=timeline_max_length()).values('id')
+        TimelineEntry.objects.filter(id__in=overflow).delete()
+
+
+class LocMemTimelineBackend(BaseTimelineBackend):
+    """
+    Keeps timelines in process memory as newest-first sorted lists.
+    Mirrors Redis ZADD/ZREMRANGEBYRANK semantics; not shared between workers.
+    """
+
+    def __init__(self):
+        self._timelines = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(created_at, post_id):
+        # Negated so that ascending list order is newest-first.
+        return (-created_at.timestamp(), -post_id)
+
+    def _insert(self, owner_id, created_at, post_id):
+        timeline = self._timelines.setdefault(owner_id, [])
+        item = (self._key(created_at, post_id), created_at, post_id)
+        index = bisect.bisect_left(timeline, item)
+        if index < len(timeline) and timeline[index][2] == post_id:
+            return
+        timeline.insert(index, item)
+        del timeline[timeline_max_length():]
+
+    def push(self, owner_ids, post_id, created_at):
+        with self._lock:
+            for owner_id in owner_ids:
+                self._insert(owner_id, created_at, post_id)
+
+    def push_many(self, owner_id, entries):
+        with self._lock:
+            for created_at, post_id in entries:
+                self._insert(owner_id, created_at, post_id)
+
+    def fetch(self, owner_id, before=None, limit=10):
+        with self._lock:
+            timeline = list(self._timelines.get(owner_id, ()))
+        start = 0
+        if before:
+            start = bisect.bisect_right([item[0] for item in timeline], self._key(*before))
+        return [(created_at, post_id) for _, created_at, post_id in timeline[start:start + limit]]
+
+    def discard(self, owner_id, post_ids):
+        post_ids = set(post_ids)
+        with self._lock:
+            timeline = self._timelines.get(owner_id)
+            if timeline:
+                timeline[:] = [item for item in timeline if item[2] not in post_ids]
+
+    def remove_post(self, post_id):
+        with self._lock:
+            for timeline in self._timelines.values():
+                timeline[:] = [item for item in timeline if item[2] != post_id]
+
+    def clear(self, owner_id):
+        with self._lock:
+            self._timelines.pop(owner_id, None)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_timeline_backend():
+    """Returns the process-wide backend configured by settings.TIMELINE_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'TIMELINE_BACKEND', DEFAULT_TIMELINE_BACKEND)
+                _backend = import_string(path)()
+    return _backend
+
+
+def reset_timeline_backend():
+    """Drops the cached backend, e.g. after settings change in tests."""
+    global _backend
+    _backend = None
+
+
+# --- Fan-out helpers ---
+
+def audience_ids(author):
+    """Profile ids whose timelines should receive ``author``'s posts."""
+    return [author.pk] + list(author.get_connections().values_list('pk', flat=True))
+
+
+def fan_out_post(post):
+    """Pushes a newly created post into its author's and connections' timelines."""
+    get_timeline_backend().push(audience_ids(post.author), post.pk, post.created_at)
+
+
+def backfill_from_author(owner, author, limit=None):
+    """Copies ``author``'s most recent posts into ``owner``'s timeline (e.g. on a new connection)."""
+    limit = limit or getattr(settings, 'TIMELINE_BACKFILL_LENGTH', 50)
+    entries = Post.objects.filter(author=author)\
+                          .order_by('-created_at', '-id')\
+                          .values_list('created_at', 'id')[:limit]
+    get_timeline_backend().push_many(owner.pk, list(entries))
+
+
+def drop_author(owner, author):
+    """Removes ``author``'s posts from ``owner``'s timeline (e.g. on disconnect)."""
+    backend = get_timeline_backend()
+    post_ids = [post_id for _, post_id in backend.fetch(owner.pk, limit=timeline_max_length())]
+    authored = Post.objects.filter(author=author, id__in=post_ids).values_list('id', flat=True)
+    backend.discard(owner.pk, list(authored))
+
+
+def rebuild_timeline(owner):
+    """Recomputes ``owner``'s timeline from scratch (used by the rebuild_timelines command)."""
+    backend = get_timeline_backend()
+    entries = Post.objects.filter(author_id__in=audience_ids(owner))\
+                          .order_by('-created_at', '-id')\
+                          .values_list('created_at', 'id')[:timeline_max_length()]
+    backend.clear(owner.pk)
+    backend.push_many(owner.pk, list(entries))
+
+
+def rebuild_all_timelines():
+    count = 0
+    for owner in Profile.objects.all().iterator():
+        rebuild_timeline(owner)
+        count += 1
+    return count
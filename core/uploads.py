@@ -0,0 +1,331 @@
+# core/uploads.py
+
+"""
+Chunked, resumable uploads for chat attachments and challenge submissions.
+
+A client opens an UploadSession with the file's name, size and (optionally)
+its SHA-256, then PUTs the raw bytes of each fixed-size chunk with an
+``X-Chunk-SHA256`` header. Chunk bodies are streamed from the request to a
+part file in blocks of UPLOAD_STREAM_BLOCK_SIZE, hashed on the way, so a
+worker holds one block in memory whatever the file size. A chunk whose
+checksum does not match is thrown away and can be sent again.
+
+After a dropped connection the client asks for the session's status, gets
+back the indexes already received, and sends only the missing ones.
+``complete`` concatenates the parts into one file under UPLOAD_SESSION_DIR
+outside any transaction, checks the whole-file checksum and then marks the
+session complete with a guarded UPDATE. ``claim`` then hands that file to
+Message.file or Submission.file; FileSystemStorage moves it into MEDIA_ROOT
+instead of copying it. Sessions that stop moving are removed by
+``manage.py purge_upload_sessions``. The bytes a user has reserved in
+unclaimed sessions are capped by UPLOAD_USER_QUOTA.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Message, Submission, UploadChunk, UploadSession
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024  # 4 MB
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024  # 512 MB
+DEFAULT_USER_QUOTA = 1024 * 1024 * 1024  # 1 GB across a user's unclaimed sessions
+DEFAULT_STREAM_BLOCK_SIZE = 64 * 1024
+DEFAULT_SESSION_TTL = 24 * 60 * 60  # seconds
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# The file field each purpose's upload ends up in
+TARGET_FIELDS = {
+    'message': Message._meta.get_field('file'),
+    'submission': Submission._meta.get_field('file'),
+}
+
+
+class UploadError(Exception):
+    """A request that does not fit the session; ``status`` is the HTTP code to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class AssembledFile(File):
+    """
+    An assembled upload on local disk. Storages that understand
+    ``temporary_file_path`` (FileSystemStorage) move it into place.
+    """
+
+    def __init__(self, path, name, content_type):
+        super().__init__(open(path, 'rb'), name=name)
+        self.path = path
+        self.content_type = content_type
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def session_dir(session):
+    root = getattr(settings, 'UPLOAD_SESSION_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'upload_sessions')
+    return os.path.join(root, str(session.pk))
+
+
+def _part_path(session, index):
+    return os.path.join(session_dir(session), f'{index:06d}.part')
+
+
+def _assembled_path(session):
+    return os.path.join(session_dir(session), 'assembled')
+
+
+def start_session(user, purpose, filename, size, content_type='', sha256=''):
+    """Opens an UploadSession after checking the declared file. Raises UploadError."""
+    if purpose not in dict(UploadSession.PURPOSES):
+        raise UploadError(f"Unknown upload purpose: {purpose!r}")
+    filename = os.path.basename((filename or '').replace('\\', '/')).strip()[:255]
+    if not filename:
+        raise UploadError("A file name is required.")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("The file size must be a whole number of bytes.")
+    max_size = getattr(settings, 'UPLOAD_MAX_SIZE', DEFAULT_MAX_SIZE)
+    if size <= 0 or size > max_size:
+        raise UploadError(f"Files must be between 1 byte and {max_size} bytes.", status=413 if size > 0 else 400)
+    sha256 = (sha256 or '').lower()
+    if sha256 and not SHA256_RE.match(sha256):
+        raise UploadError("sha256 must be 64 hexadecimal characters.")
+
+    quota = getattr(settings, 'UPLOAD_USER_QUOTA', DEFAULT_USER_QUOTA)
+    with transaction.atomic():
+        # Locking the user's row serialises their concurrent starts, so two cannot both fit the quota
+        get_user_model().objects.select_for_update().filter(pk=user.pk).exists()
+        reserved = UploadSession.objects.filter(user=user, status__in=['pending', 'complete'])\
+                                        .aggregate(total=Sum('size'))['total'] or 0
+        if reserved + size > quota:
+            raise UploadError(
+                f"Unfinished uploads already hold {reserved} of your {quota} bytes; "
+                "finish or wait out one before starting another.", status=413,
+            )
+        session = UploadSession.objects.create(
+            user=user, purpose=purpose, filename=filename, size=size,
+            content_type=(content_type or '')[:100], chunk_size=chunk_size(), sha256=sha256,
+        )
+    os.makedirs(session_dir(session), exist_ok=True)
+    return session
+
+
+def get_session(session_id, user):
+    """The caller's own session ``session_id``. Raises UploadError (404) otherwise."""
+    try:
+        return UploadSession.objects.get(pk=session_id, user=user)
+    except (UploadSession.DoesNotExist, ValueError, ValidationError):
+        # ValidationError: an id that is not a UUID at all
+        raise UploadError("Upload not found.", status=404)
+
+
+def received_chunks(session):
+    return list(session.chunks.order_by('index').values_list('index', flat=True))
+
+
+def describe(session):
+    """The JSON a client needs to start or resume ``session``."""
+    return {
+        'id': str(session.pk),
+        'filename': session.filename,
+        'size': session.size,
+        'chunk_size': session.chunk_size,
+        'chunk_count': session.chunk_count,
+        'status': session.status,
+        'received': received_chunks(session) if session.status == 'pending' else list(range(session.chunk_count)),
+    }
+
+
+def expected_chunk_size(session, index):
+    if index == session.chunk_count - 1:
+        return session.size - index * session.chunk_size
+    return session.chunk_size
+
+
+def write_chunk(session, index, stream, length, checksum=''):
+    """
+    Streams chunk ``index`` of ``length`` bytes from ``stream`` to disk,
+    checking its size and, when given, its SHA-256. Sending a chunk again
+    replaces it. Returns the chunk's checksum.
+    """
+    if session.status != 'pending':
+        raise UploadError("This upload is already complete.", status=409)
+    if not 0 <= index < session.chunk_count:
+        raise UploadError(f"Chunk index must be between 0 and {session.chunk_count - 1}.")
+    expected = expected_chunk_size(session, index)
+    if length != expected:
+        raise UploadError(f"Chunk {index} must be {expected} bytes, got {length}.")
+    checksum = (checksum or '').lower()
+
+    block_size = getattr(settings, 'UPLOAD_STREAM_BLOCK_SIZE', DEFAULT_STREAM_BLOCK_SIZE)
+    digest = hashlib.sha256()
+    path = _part_path(session, index)
+    temp_path = f'{path}.{uuid.uuid4().hex}.tmp'  # Retries of one chunk may overlap
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    try:
+        with open(temp_path, 'wb') as part:
+            while written < length:
+                block = stream.read(min(block_size, length - written))
+                if not block:
+                    break
+                digest.update(block)
+                part.write(block)
+                written += len(block)
+        if written != length:
+            raise UploadError(f"Chunk {index} ended after {written} of {length} bytes.")
+        if checksum and digest.hexdigest() != checksum:
+            raise UploadError(f"Checksum mismatch for chunk {index}.", status=422)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    UploadChunk.objects.update_or_create(
+        session=session, index=index, defaults={'size': length, 'sha256': digest.hexdigest()},
+    )
+    UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+    return digest.hexdigest()
+
+
+def complete(session):
+    """
+    Joins the parts of a fully received session into one file and checks
+    the whole-file checksum. Safe to call again on a completed session.
+
+    The copy, up to UPLOAD_MAX_SIZE bytes, runs outside any transaction so
+    no database lock is held meanwhile. The status then flips with a
+    guarded UPDATE; of two concurrent calls, only one does it.
+    """
+    session = UploadSession.objects.get(pk=session.pk)
+    if session.status != 'pending':
+        return session
+    missing = sorted(set(range(session.chunk_count)) - set(received_chunks(session)))
+    if missing:
+        raise UploadError(f"{len(missing)} chunk(s) still missing, starting at {missing[0]}.", status=409)
+
+    block_size = getattr(settings, 'UPLOAD_STREAM_BLOCK_SIZE', DEFAULT_STREAM_BLOCK_SIZE)
+    digest = hashlib.sha256()
+    path = _assembled_path(session)
+    temp_path = f'{path}.{uuid.uuid4().hex}.tmp'  # Concurrent calls each assemble their own copy
+    try:
+        with open(temp_path, 'wb') as assembled:
+            for index in range(session.chunk_count):
+                with open(_part_path(session, index), 'rb') as part:
+                    for block in iter(lambda: part.read(block_size), b''):
+                        digest.update(block)
+                        assembled.write(block)
+    except FileNotFoundError:
+        # Another call finished first and removed the parts
+        os.remove(temp_path)
+        session.refresh_from_db()
+        if session.status != 'pending':
+            return session
+        raise UploadError("The upload's chunks are missing on the server; send them again.", status=409)
+    if session.sha256 and digest.hexdigest() != session.sha256:
+        os.remove(temp_path)
+        raise UploadError("Checksum mismatch for the assembled file.", status=422)
+
+    # In place before the status flips, so a claim never finds a complete session without its file
+    os.replace(temp_path, path)
+    completed = UploadSession.objects.filter(pk=session.pk, status='pending').update(
+        status='complete', sha256=digest.hexdigest(), updated_at=timezone.now(),
+    )
+    if completed:
+        for index in range(session.chunk_count):
+            os.remove(_part_path(session, index))
+    elif not UploadSession.objects.filter(pk=session.pk, status='complete').exists():
+        # Lost the race to a call whose file has since been claimed (moved away); ours is a stray copy
+        if os.path.exists(path):
+            os.remove(path)
+    session.refresh_from_db()
+    return session
+
+
+@contextmanager
+def claim(session_id, user, purpose):
+    """
+    Yields the caller's completed upload as a File for Message.file or
+    Submission.file. Each upload can be claimed once. The session is
+    removed when the block finishes, or made claimable again if it raises
+    before the storage moved the file away. If it raises after the move,
+    the stored copy is deleted along with the session.
+
+        with uploads.claim(upload_id, request.user, 'message') as upload:
+            send_message(sender, recipient, content, file=upload)
+    """
+    session = get_session(session_id, user)
+    if session.purpose != purpose:
+        raise UploadError("This upload was started for something else.")
+    claimed = UploadSession.objects.filter(pk=session.pk, status='complete').update(
+        status='attached', updated_at=timezone.now(),
+    )
+    if not claimed:
+        raise UploadError("This upload is not complete, or has already been used.", status=409)
+
+    path = _assembled_path(session)
+    field = TARGET_FIELDS[purpose]
+    # Where the storage will put the file, unless another save takes the name first
+    expected_name = field.storage.get_available_name(field.generate_filename(None, session.filename))
+    upload = AssembledFile(path, session.filename, session.content_type or None)
+    try:
+        yield upload
+    except BaseException:
+        if os.path.exists(path):
+            UploadSession.objects.filter(pk=session.pk).update(status='complete')
+        else:
+            _delete_stored_copy(field.storage, expected_name, session)
+            discard(session)
+        raise
+    finally:
+        upload.close()
+    discard(session)
+
+
+def _delete_stored_copy(storage, name, session):
+    """Deletes the file a failed claim left at ``name``, if its contents are the session's."""
+    if not storage.exists(name) or storage.size(name) != session.size:
+        return
+    digest = hashlib.sha256()
+    with storage.open(name, 'rb') as stored:
+        for block in stored.chunks():
+            digest.update(block)
+    if digest.hexdigest() == session.sha256:
+        storage.delete(name)
+
+
+def discard(session):
+    """Removes a session's files and row."""
+    shutil.rmtree(session_dir(session), ignore_errors=True)
+    UploadSession.objects.filter(pk=session.pk).delete()
+
+
+def purge_stale_sessions(max_age=None):
+    """Discards sessions untouched for ``max_age`` seconds. Returns how many."""
+    max_age = max_age if max_age is not None else getattr(settings, 'UPLOAD_SESSION_TTL', DEFAULT_SESSION_TTL)
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    stale = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+    for session in stale:
+        discard(session)
+    return len(stale)
@@ -10,15 +10,16 @@ from django.contrib.auth.decorators import login_required
 # Import all necessary views.
 # Consolidated some views from the previous version.
 from .views import (
-    login_view, register_view, home_view,
+    login_view, register_view, home_view, home_feed_api,
     profile_view, edit_profile, projects_view, add_project, edit_project, delete_project,
-    posts_list_view, create_post_view, post_detail_view, # 'create_post' is now 'create_post_view'
-    challenge_detail_view, logout_view, send_connection_request, remove_connection, chat_view, # Added remove_connection
-    accept_connection_request, reject_connection_request, connections_view
+    posts_list_view, search_posts_view, create_post_view, post_detail_view, # 'create_post' is now 'create_post_view'
+    challenge_detail_view, challenge_leaderboard_api, logout_view, send_connection_request, remove_connection, chat_view, # Added remove_connection
+    accept_connection_request, reject_connection_request, connections_view, network_view
     , message_list_view, message_detail_view, delete_message, # Renamed message_list and message_detail
     all_notifications, view_notification,
-    system_dashboard, user_management, edit_user, content_review, approve_post, system_settings, # Added edit_user, approve_post
-    get_messages, send_message_api, chat_list_history, like_post, unlike_post, add_comment, view_all_comments
+    system_dashboard, user_management, edit_user, content_review, approve_post, system_settings, request_performance, # Added edit_user, approve_post
+    get_messages, send_message_api, people_autocomplete_api, lookup_autocomplete_api,
+    upload_start_api, upload_status_api, upload_chunk_api, upload_complete_api, chat_list_history, like_post, unlike_post, add_comment, view_all_comments
 )
 
 urlpatterns = [
@@ -32,6 +33,7 @@ urlpatterns = [
 
     # Core Application URLs
     path('home/', home_view, name='home'),
+    path('home/feed/', home_feed_api, name='home_feed_api'),
 
     # Profile URLs
     path('profile/<str:username>/', profile_view, name='profile_view'), # Renamed for consistency with views.py
@@ -39,11 +41,13 @@ urlpatterns = [
 
     # Post URLs
     path('posts/', posts_list_view, name='posts_list_view'), # Renamed for clarity and consistency
+    path('posts/search/', search_posts_view, name='search_posts'),
     path('posts/create/', create_post_view, name='create_post_view'), # Changed to 'create_post_view'
     path('posts/<int:pk>/', post_detail_view, name='post_detail_view'), # Renamed for clarity
 
     # Challenge URLs
     path('challenges/<int:pk>/', challenge_detail_view, name='challenge_detail_view'), # Renamed for clarity
+    path('api/challenges/<int:pk>/leaderboard/', challenge_leaderboard_api, name='challenge_leaderboard_api'),
 
     # Connection URLs
     path('connect/<str:username>/', send_connection_request, name='send_connection_request'),
@@ -51,6 +55,9 @@ urlpatterns = [
     path('connections/', connections_view, name='connections_view'), # Renamed for clarity
     path('connect/accept/<int:request_id>/', accept_connection_request, name='accept_connection_request'),
     path('reject-connection/<int:request_id>/', reject_connection_request, name='reject_connection_request'),
+    path('network/', network_view, name='network'),
+    path('api/people/autocomplete/', people_autocomplete_api, name='people_autocomplete'),
+    path('api/autocomplete/<str:kind>/', lookup_autocomplete_api, name='lookup_autocomplete'),
 
     # Messaging URLs
     path('messages/', chat_list_history, name='message_list_view'),
@@ -70,6 +77,12 @@ urlpatterns = [
     path('api/messages/<str:recipient_username>/', get_messages, name='api_get_messages'),
     path('api/messages/<str:recipient_username>/send/', send_message_api, name='api_send_message'),
 
+    # Chunked, resumable uploads for chat attachments and submissions
+    path('api/uploads/', upload_start_api, name='upload_start'),
+    path('api/uploads/<uuid:upload_id>/', upload_status_api, name='upload_status'),
+    path('api/uploads/<uuid:upload_id>/chunks/<int:index>/', upload_chunk_api, name='upload_chunk'),
+    path('api/uploads/<uuid:upload_id>/complete/', upload_complete_api, name='upload_complete'),
+
     # Project URLs
     path('projects/<str:username>/', login_required(projects_view), name='projects_view'), # Renamed for consistency
     path('projects/add/', login_required(add_project), name='add_project'),
@@ -88,6 +101,7 @@ urlpatterns = [
         path('content/', content_review, name='content_review'),
         path('content/posts/<int:post_id>/approve/', approve_post, name='approve_post'), # Added approve_post route
         path('settings/', system_settings, name='system_settings'),
+        path('performance/', request_performance, name='request_performance'),
     ])),
 ]
 
@@ -9,6 +9,9 @@ from django.views.decorators.http import require_http_methods, require_POST
 from django.db.models import Q
 from django.urls import reverse
 from django.contrib.contenttypes.models import ContentType
+from django.http import JsonResponse, HttpResponse
+from django.template.loader import render_to_string
+from django.conf import settings
 
 # Import all forms
 from .forms import (
@@ -25,6 +28,14 @@ from .models import (
     Skill # Skill model is now separate and used by Profile
     # Assuming Experience and Education models exist based on about_view
 )
+from .feed import FEED_PAGE_SIZE, InvalidCursor, feed_queryset, get_home_feed_page
+from . import instrumentation, leaderboard, likes, lookups, people_search, post_cards, recommendations, reference_data, uploads, view_counter
+from .connections import connection_statuses, disconnect
+from .conversations import inbox_for, mark_conversation_read
+from .directory import directory_queryset, get_directory_page, parse_skills
+from .messaging import send_message, serialize_message
+from .notifications import get_notification_summary, mark_notifications_read, notify
+from .search import search_posts
 
 # Get the custom User model
 User = get_user_model()
@@ -116,26 +127,24 @@ def profile_view(request, username):
     """
     # Use user__username for querying Profile through its OneToOneField with User
     profile = get_object_or_404(Profile.objects.select_related('user'), user__username=username)
-    posts = Post.objects.filter(author=profile).select_related('subject').order_by('-created_at')
-
-    is_connected = False
-    connection_request_sent = False
-    # Check connection status only if viewing another user's profile
-    if request.user.profile != profile:
-        is_connected = request.user.profile.is_connected_with(profile)
-        # Check for pending request sent FROM current user TO this profile's user
-        connection_request_sent = ConnectionRequest.objects.filter(
-            sender=request.user,            # ConnectionRequest.sender is User
-            receiver=profile.user,          # ConnectionRequest.receiver is User
-            status='pending'
-        ).exists()
+    posts = feed_queryset().filter(author=profile).order_by('-created_at')
+    post_cards.prime(posts)  # Evaluates the queryset; cards then render from cached fragments
+
+    # The profile's connections (Users) for the Connections tab
+    connections = [connected.user for connected in profile.get_connections().select_related('user')]
+
+    # One resolver call covers the profile owner, their connections and the post author
+    statuses = connection_statuses(request.user, [profile.pk] + [user.pk for user in connections])
+    status = statuses[profile.pk]
 
     context = {
         'profile_user': profile, # Renamed from profile_user to profile for clarity
         'posts': posts,
-        'is_connected': is_connected,
-        'connection_request_sent': connection_request_sent,
-        'unread_notifications_count': request.user.received_notifications.filter(read=False).count()
+        'liked_post_ids': likes.liked_post_ids(request.user.profile, [post.id for post in posts]),
+        'is_connected': status.is_connected,
+        'connection_request_sent': status.request_sent,
+        'connections': connections,
+        'connection_statuses': statuses,
     }
     return render(request, 'profile.html', context)
 
@@ -170,7 +179,7 @@ def edit_profile(request, username):
         'profile': profile,
         'title': f'Edit {profile.user.username}\'s Profile'
     }
-    return render(request, 'profile/edit_profile.html', context) # Adjusted template path for consistency
+    return render(request, 'edit_profile.html', context)
 
 @login_required
 def about_view(request, username):
@@ -300,17 +309,16 @@ def posts_list_view(request):
     Displays a list of all posts, with optional subject filtering.
     """
     posts = Post.objects.all().select_related('author__user', 'subject').order_by('-created_at')
-    subjects = Subject.objects.all().order_by('name')
+    subjects = reference_data.get_all('subject')
     selected_subject = None
 
     subject_filter_id = request.GET.get('subject')
     if subject_filter_id:
-        try:
-            selected_subject = Subject.objects.get(id=subject_filter_id)
+        selected_subject = reference_data.get_by_id('subject', subject_filter_id)
+        if selected_subject is not None:
             posts = posts.filter(subject=selected_subject)
-        except Subject.DoesNotExist:
-            messages.error(request, "Selected subject does not exist.")
-            pass # Keep all posts if subject filter is invalid
+        else:
+            messages.error(request, "Selected subject does not exist.") # Keep all posts if subject filter is invalid
 
     context = {
         'posts': posts,
@@ -319,6 +327,46 @@ def posts_list_view(request):
     }
     return render(request, 'posts/list.html', context)
 
+@login_required
+def search_posts_view(request):
+    """
+    Full-text search over post titles, content, subjects and author names
+    (see core/search.py). Results are ranked by relevance and paginated,
+    with subject and content-type facets for narrowing them down.
+    """
+    form = PostSearchForm(request.GET or None)
+    results = None
+    page_obj = None
+    facets = {'subject': [], 'content_type': []}
+    if form.is_valid() and form.cleaned_data['query']:
+        results = search_posts(
+            form.cleaned_data['query'],
+            subject=form.cleaned_data['subject'],
+            content_type=form.cleaned_data['content_type'],
+        )
+        paginator = Paginator(results, settings.SEARCH_PAGE_SIZE)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        facets = results.facets()
+
+    # Current filters for the pagination and facet links; each facet link
+    # replaces its own filter and keeps the rest
+    def params_without(*keys):
+        params = request.GET.copy()
+        for key in ('page',) + keys:
+            params.pop(key, None)
+        return params.urlencode()
+
+    return render(request, 'posts/search.html', {
+        'form': form,
+        'page_obj': page_obj,
+        'posts': page_obj.object_list if page_obj else [],
+        'result_count': results.count() if results is not None else 0,
+        'facets': facets,
+        'filter_query': params_without(),
+        'subject_facet_query': params_without('subject'),
+        'type_facet_query': params_without('content_type'),
+    })
+
 @login_required
 def create_post_view(request):
     """
@@ -342,21 +390,19 @@ def create_post_view(request):
     return render(request, 'posts/create.html', {
         'form': form,
         'title': 'Create New Post',
-        'subjects': Subject.objects.all().order_by('name') # Ensure subjects are available for the form
+        'subjects': reference_data.get_all('subject') # Ensure subjects are available for the form
     })
 
 @login_required
 def post_detail_view(request, pk):
     """
-    Displays the details of a single post and increments its view count.
+    Displays the details of a single post and counts the view.
     """
     post = get_object_or_404(Post.objects.select_related('author__user', 'subject'), id=pk)
 
-    # Increment views only if it's not the author viewing
-    if request.user != post.author.user:
-        # Assuming Post model has a 'views' PositiveIntegerField with default=0
-        post.views = (post.views or 0) + 1
-        post.save()
+    # Buffered and deduplicated per viewer; the author's own views are skipped (see core/view_counter.py)
+    view_counter.record_view(post, request)
+    post.views = view_counter.current_views(post)
 
     related_posts = Post.objects.filter(subject=post.subject)\
                                 .exclude(id=pk)\
@@ -391,7 +437,18 @@ def challenge_detail_view(request, pk):
                 submission = submission_form.save(commit=False)
                 submission.challenge = challenge
                 submission.user = request.user.profile # Submission.user is ForeignKey to Profile
-                submission.save()
+                upload_id = submission_form.cleaned_data.get('upload_id')
+                try:
+                    if upload_id:
+                        # A large file sent beforehand in chunks (see core/uploads.py)
+                        with uploads.claim(upload_id, request.user, 'submission') as upload:
+                            submission.file = upload
+                            submission.save()
+                    else:
+                        submission.save()
+                except uploads.UploadError as e:
+                    messages.error(request, str(e))
+                    return redirect('challenge_detail_view', pk=challenge.id)
                 messages.success(request, "Your submission has been recorded!")
                 return redirect('challenge_detail_view', pk=challenge.id)
             else:
@@ -406,21 +463,53 @@ def challenge_detail_view(request, pk):
 
     time_remaining = challenge.end_date - timezone.now() if challenge.end_date else None
     
-    submissions = Submission.objects.filter(challenge=challenge)\
-                                     .select_related('user__user')\
-                                     .order_by('-score', 'submitted_at') # Order by score, then by submission time
+    # The first page of the board, usually from the cached top (see core/leaderboard.py)
+    entries, next_cursor = leaderboard.get_page(challenge.pk)
 
     context = {
         'challenge': challenge,
         'user_submission': user_submission,
+        'user_rank': leaderboard.rank_of(user_submission),
         'time_remaining': time_remaining,
-        'submissions': submissions,
+        'leaderboard': leaderboard.describe(entries),
+        'leaderboard_total': leaderboard.total_ranked(challenge.pk),
+        'leaderboard_next': next_cursor,
         'submission_form': submission_form,
         'can_submit': request.user.is_authenticated and not user_submission and challenge.is_active
     }
     return render(request, 'challenges/detail.html', context)
 
 
+@login_required
+@require_http_methods(["GET"])
+def challenge_leaderboard_api(request, pk):
+    """
+    One page of a challenge's leaderboard as JSON, ``?cursor=`` continuing
+    from a previous page's ``next_cursor``. ``me`` is the requesting user's
+    own rank, or null without a scored submission.
+    """
+    challenge = get_object_or_404(Challenge, pk=pk)
+    try:
+        entries, next_cursor = leaderboard.get_page(
+            challenge.pk, cursor=request.GET.get('cursor'),
+            page_size=request.GET.get('limit', leaderboard.DEFAULT_PAGE_SIZE),
+        )
+    except (InvalidCursor, ValueError):
+        return JsonResponse({'error': 'Invalid leaderboard cursor'}, status=400)
+
+    # Profile.pk == user.pk, so no profile lookup is needed
+    submission = Submission.objects.filter(challenge=challenge, user_id=request.user.pk, score__isnull=False)\
+                                   .only('id', 'challenge_id', 'score', 'submitted_at').first()
+    me = {'rank': leaderboard.rank_of(submission), 'score': submission.score} if submission else None
+
+    return JsonResponse({
+        'entries': leaderboard.describe(entries),
+        'next_cursor': next_cursor,
+        'total': leaderboard.total_ranked(challenge.pk),
+        'me': me,
+    })
+
+
 
 # --- Connection Management Views ---
 @login_required
@@ -448,14 +537,7 @@ def connections_view(request):
         receiver=user, status='pending'
     ).select_related('sender')
 
-    connected_user_ids = [p.user.id for p in connections]
-    pending_sender_ids = [req.sender.id for req in pending_requests]
-
-    suggested = User.objects.exclude(
-        id__in=connected_user_ids + pending_sender_ids + [user.id]
-    ).filter(
-        profile__isnull=False
-    ).order_by('?')[:10].select_related('profile')
+    suggested = recommendations.suggested_users(user.profile, limit=10)
 
     return render(request, 'my_connections.html', {
         'connections': connections,
@@ -496,15 +578,7 @@ def send_connection_request(request, username):
         status='pending'
     )
     
-    # Create notification for the receiver
-    Notification.objects.create(
-        recipient=receiver_user, # Notification recipient is User object
-        sender=request.user,    # Notification sender is User object
-        message=f"{request.user.username} sent you a connection request.",
-        notification_type='connection_request',
-        content_type=ContentType.objects.get_for_model(connection_request),
-        object_id=connection_request.id
-    )
+    # ConnectionRequest.save() notifies the receiver
     messages.success(request, "Connection request sent successfully!")
     
     return redirect('profile_view', username=username)
@@ -517,23 +591,15 @@ def remove_connection(request, username):
     """
     user_to_remove = get_object_or_404(User, username=username)
     
-    # Remove connection symmetrically
-    # Find the Connection object where both profiles are involved and it's accepted
-    connection_to_delete = Connection.objects.filter(
-        (Q(creator=request.user.profile, friend=user_to_remove.profile) |
-         Q(creator=user_to_remove.profile, friend=request.user.profile)),
-        accepted=True
-    ).first()
-
-    if connection_to_delete:
-        connection_to_delete.delete()
+    # Remove connection symmetrically (whichever side created it)
+    if disconnect(request.user.profile, user_to_remove.profile):
         messages.success(request, f'Removed connection with {user_to_remove.username}.')
         # Optionally, create a notification for the removed user
-        Notification.objects.create(
-            recipient=user_to_remove,
-            sender=request.user,
-            message=f"{request.user.username} has removed you from their connections.",
-            notification_type='connection_removed'
+        notify(
+            user_to_remove,
+            request.user,
+            'connection_removed',
+            f"{request.user.username} has removed you from their connections.",
         )
     else:
         messages.warning(request, f"You are not connected with {user_to_remove.username}.")
@@ -566,13 +632,12 @@ def accept_connection_request(request, request_id):
     connection_request.save()
     
     # Create acceptance notification for the sender
-    Notification.objects.create(
-        recipient=connection_request.sender, # Notification recipient is User object
-        sender=request.user,                 # Notification sender is User object
-        message=f"{request.user.username} accepted your connection request.",
-        notification_type='connection_accepted',
-        content_type=ContentType.objects.get_for_model(connection_request),
-        object_id=connection_request.id
+    notify(
+        connection_request.sender,
+        request.user,
+        'connection_accepted',
+        f"{request.user.username} accepted your connection request.",
+        target=connection_request,
     )
     
     messages.success(request, "Connection request accepted!")
@@ -595,13 +660,12 @@ def reject_connection_request(request, request_id):
     connection_request.save()
     
     # Optionally, create a rejection notification for the sender
-    Notification.objects.create(
-        recipient=connection_request.sender,
-        sender=request.user,
-        message=f"{request.user.username} declined your connection request.",
-        notification_type='connection_rejected',
-        content_type=ContentType.objects.get_for_model(connection_request),
-        object_id=connection_request.id
+    notify(
+        connection_request.sender,
+        request.user,
+        'connection_rejected',
+        f"{request.user.username} declined your connection request.",
+        target=connection_request,
     )
 
     messages.info(request, "Connection request declined.")
@@ -656,6 +720,9 @@ def chat_view(request, username): # Or a different name, if you want to keep sen
     """
     profile_user = get_object_or_404(User, username=username)
 
+    # Opening the thread reads everything the partner sent so far
+    mark_conversation_read(request.user, profile_user)
+
     context = {
         'profile_user': profile_user,  # The recipient user for the chat
         # You might not need 'form' here, as the chat is primarily AJAX-driven
@@ -683,72 +750,45 @@ logger = logging.getLogger(__name__)
 def get_messages(request, recipient_username):
     """
     Fetches messages between the current user and a specified recipient.
-    Supports fetching messages since a given timestamp for polling.
+    This is the polling fallback for chat.js when the WebSocket is down:
+    ?after=<message id> returns only messages newer than the last one the
+    client has, so nothing is ever sent twice. ?since=<ISO timestamp> is
+    still accepted for older clients.
     """
-    logger.debug(f"get_messages called by: {request.user.username} for recipient_username: {recipient_username}")
     try:
         recipient = User.objects.get(username=recipient_username)
-        logger.debug(f"Resolved recipient User object: {recipient.username}")
     except User.DoesNotExist:
         logger.warning(f"Recipient {recipient_username} not found.")
         return JsonResponse({'error': 'Recipient not found'}, status=404)
 
     # Base queryset for messages between current user and recipient
-    # Order by timestamp for chronological display and correct 'since' filtering
+    # Order by timestamp for chronological display
     messages_qs = Message.objects.filter(
         Q(sender=request.user, recipient=recipient) | Q(sender=recipient, recipient=request.user)
-    ).order_by('timestamp') 
-
-    logger.debug(f"Base messages_qs count (before 'since' filter): {messages_qs.count()}")
+    ).select_related('sender').order_by('timestamp', 'id')
 
+    after_id = request.GET.get('after')
     since_timestamp_str = request.GET.get('since')
-    if since_timestamp_str:
-        logger.debug(f"Received 'since' parameter: {since_timestamp_str}")
+    if after_id:
+        try:
+            messages_qs = messages_qs.filter(id__gt=int(after_id))
+        except ValueError:
+            return JsonResponse({'error': 'Invalid message id'}, status=400)
+    elif since_timestamp_str:
         try:
             # Handle both 'Z' for UTC and direct ISO format
             if since_timestamp_str.endswith('Z'):
                 since_dt = datetime.fromisoformat(since_timestamp_str[:-1] + '+00:00')
             else:
                 since_dt = datetime.fromisoformat(since_timestamp_str)
-            
-            logger.debug(f"Parsed 'since' datetime: {since_dt}")
-            # Filter for messages *at or after* the 'since' timestamp
-            messages_qs = messages_qs.filter(timestamp__gte=since_dt) 
-            logger.debug(f"Applied timestamp filter. Messages count AFTER 'since' filter: {messages_qs.count()}")
-
+            # Strictly after: the client already has the message at 'since'
+            messages_qs = messages_qs.filter(timestamp__gt=since_dt)
         except ValueError as e:
             logger.error(f"ValueError parsing 'since' timestamp '{since_timestamp_str}': {e}")
             # If the timestamp is malformed, we'll return all messages (or what's left after other filters)
             # This is a graceful fallback rather than erroring out the whole request.
-    else:
-        logger.debug("No 'since' timestamp provided, fetching initial messages.")
-
-    message_data = []
-    # Loop through the filtered messages and prepare data for JSON response
-    for msg in messages_qs: 
-        # Add a check to prevent adding duplicates if `timestamp__gte` includes already-fetched messages
-        # This reinforces the client-side check but is good for robustness.
-        # However, for pure polling, if client correctly uses `gt` or `gte` for *new* messages, 
-        # then duplicates shouldn't be an issue on subsequent fetches.
-        # The frontend's `createMessageElement` with `id` check is ultimately more important here.
-
-        msg_dict = {
-            'id': msg.id,
-            'sender_username': msg.sender.username,
-            'content': msg.content,
-            'timestamp': msg.timestamp.isoformat(), # Essential for JS date parsing
-            # Include file details in the response if a file is attached
-            'file_url': msg.file_url, # Uses the @property from your Message model
-            'file_name': msg.file_name,
-            'file_type': msg.file_type,
-            'is_image': msg.is_image, # Uses the @property
-            'is_video': msg.is_video, # Uses the @property
-            'is_audio': msg.is_audio, # Uses the @property
-            'is_document': msg.is_document, # Uses the @property
-        }
-        message_data.append(msg_dict)
 
-    logger.debug(f"Returning {len(message_data)} messages in final JSON response.")
+    message_data = [serialize_message(msg) for msg in messages_qs]
     return JsonResponse(message_data, safe=False)
 
 
@@ -767,11 +807,12 @@ def send_message_api(request, recipient_username):
 
         content = request.POST.get('content', '').strip()
         uploaded_file = request.FILES.get('file')  # 'file' is the name of the FormData key
+        upload_id = request.POST.get('upload_id')  # A completed chunked upload (see core/uploads.py)
 
         logger.debug(f"Content extracted: '{content}', Uploaded File extracted: {uploaded_file}")
 
         # Validate that either content or a file is present
-        if not content and not uploaded_file:
+        if not content and not uploaded_file and not upload_id:
             logger.warning("Attempted to send message with no content and no file.")
             return JsonResponse({'error': 'Message content or a file is required'}, status=400)
 
@@ -782,58 +823,26 @@ def send_message_api(request, recipient_username):
             logger.error(f"Recipient '{recipient_username}' not found for message sending.")
             return JsonResponse({'error': 'Recipient not found'}, status=404)
 
-        message_fields = {
-            'sender': request.user,
-            'recipient': recipient,
-            'content': content,
-        }
-
         try:
-            # Handle file attachment if present
             if uploaded_file:
-                message_fields['file'] = uploaded_file
-                message_fields['file_name'] = uploaded_file.name
-                message_fields['file_type'] = uploaded_file.content_type
-                logger.debug(f"File details added to message_fields: Name={uploaded_file.name}, Type={uploaded_file.content_type}, Size={uploaded_file.size} bytes")
+                logger.debug(f"Attaching file: Name={uploaded_file.name}, Type={uploaded_file.content_type}, Size={uploaded_file.size} bytes")
 
-            new_message = Message.objects.create(**message_fields)
+            # Stores the message and pushes it to both users' open chat sockets
+            if upload_id:
+                with uploads.claim(upload_id, request.user, 'message') as upload:
+                    new_message = send_message(request.user, recipient, content, file=upload)
+            else:
+                new_message = send_message(request.user, recipient, content, file=uploaded_file)
             logger.info(f"Message ID {new_message.id} created successfully by {request.user.username} to {recipient.username}.")
 
             # Prepare response data for the newly created message
-            response_data = {
-                'id': new_message.id,
-                'sender_username': new_message.sender.username,
-                'content': new_message.content,
-                'timestamp': new_message.timestamp.isoformat(),
-            }
-
-            # Add file-related fields to response if a file was attached
-            if new_message.file:
-                response_data['file_url'] = new_message.file.url if new_message.file else None
-                response_data['file_name'] = new_message.file_name
-                response_data['file_type'] = new_message.file_type
-                response_data['is_image'] = new_message.file_type and new_message.file_type.startswith('image/')
-                response_data['is_video'] = new_message.file_type and new_message.file_type.startswith('video/')
-                response_data['is_audio'] = new_message.file_type and new_message.file_type.startswith('audio/')
-                response_data['is_document'] = new_message.file_type and (
-                    new_message.file_type in [
-                        'application/pdf',
-                        'application/msword',
-                        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                        'application/vnd.ms-excel',
-                        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                        'text/plain',
-                        'application/zip',
-                        'application/x-rar-compressed',
-                        'application/vnd.rar',
-                        'application/x-7z-compressed',
-                    ]
-                )
-                logger.debug(f"Response data includes file URL: {response_data['file_url']}")
+            response_data = serialize_message(new_message)
 
             logger.debug(f"Sending JSON response for message ID: {new_message.id}")
             return JsonResponse(response_data, status=201)
 
+        except uploads.UploadError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
         except Exception as e:
             import traceback
             tb = traceback.format_exc()
@@ -856,12 +865,7 @@ def message_list_view(request):
     Marks associated message notifications as read.
     """
     # Mark all unread message notifications as read when the message list is viewed
-    unread_message_notifs = Notification.objects.filter(
-        recipient=request.user,
-        notification_type='message',
-        read=False
-    )
-    unread_message_notifs.update(read=True)
+    mark_notifications_read(request.user, notification_type='message')
 
     # Fetch all messages sent to or from the current user
     messages_query = Message.objects.filter(
@@ -894,50 +898,33 @@ def message_list_view(request):
 from django.db.models import Q, Max
 from django.contrib.auth.decorators import login_required
 
+@instrumentation.query_budget(7)
 @login_required
 def chat_list_history(request):
+    """
+    Lists the current user's conversations, most recent first.
+    Reads the materialised Conversation summaries (one indexed, paginated
+    query) instead of aggregating the Message table per partner.
+    """
     current_user = request.user
 
-    # Get all messages involving the current user
-    messages = Message.objects.filter(Q(sender=current_user) | Q(recipient=current_user))
-
-    # Get unique conversation partners based on latest message timestamp
-    latest_messages = messages.values('sender', 'recipient').annotate(
-        last_message_time=Max('timestamp')
-    ).order_by('-last_message_time')
-
-    conversations = []
-    seen_user_ids = set()
-
-    for entry in latest_messages:
-        # Identify the conversation partner (not current user)
-        other_user_id = entry['recipient'] if entry['sender'] == current_user.id else entry['sender']
-
-        if other_user_id not in seen_user_ids:
-            other_user = User.objects.get(id=other_user_id)
-
-            # Fetch latest message in this conversation
-            last_message = Message.objects.filter(
-                (Q(sender=current_user, recipient=other_user) | Q(sender=other_user, recipient=current_user))
-            ).order_by('-timestamp').first()
-
-            # Count unread messages from this user to the current user
-            unread_count = Message.objects.filter(
-                sender=other_user,
-                recipient=current_user,
-                read=False
-            ).count()
+    paginator = Paginator(inbox_for(current_user), 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
 
-            conversations.append({
-                'user': other_user,
-                'last_message': last_message,
-                'unread_count': unread_count,
-            })
-
-            seen_user_ids.add(other_user_id)
+    inbox = [
+        {
+            'user': convo.other_user(current_user),
+            'preview': convo.last_message_preview,
+            'last_message_at': convo.last_message_at,
+            'unread_count': convo.unread_for(current_user),
+        }
+        for convo in page_obj
+    ]
 
     context = {
-        'conversations': conversations
+        'conversations': inbox,
+        'page_obj': page_obj,
+        'is_paginated': paginator.num_pages > 1,
     }
 
     return render(request, 'messages/chat_history.html', context)
@@ -954,17 +941,10 @@ def message_detail_view(request, message_id):
         Q(id=message_id) & (Q(sender=request.user) | Q(recipient=request.user))
     )
 
-    # Mark the message as read if the current user is the recipient
+    # Mark the message (and its notifications and conversation counter) as read
+    # if the current user is the recipient
     if message.recipient == request.user:
-        message.read = True
-        message.save()
-        # Also mark any related notifications as read
-        Notification.objects.filter(
-            content_type=ContentType.objects.get_for_model(message),
-            object_id=message.id,
-            recipient=request.user,
-            read=False
-        ).update(read=True)
+        message.mark_as_read()
 
     return render(request, 'messages/message_detail.html', {'message': message})
 
@@ -990,7 +970,7 @@ def all_notifications(request):
     notifications = request.user.received_notifications.all().order_by('-created_at')
 
     # Mark all visible notifications as read when the page loads
-    notifications.filter(read=False).update(read=True)
+    mark_notifications_read(request.user)
 
     paginator = Paginator(notifications, 15) # 15 notifications per page
     page_number = request.GET.get('page')
@@ -999,7 +979,7 @@ def all_notifications(request):
     # Unread count will now be 0 after updating all on the page.
     # If you want to show total unread from the past, you'd calculate before the update.
     # For simplicity, this implies current page mark as read.
-    unread_count = request.user.received_notifications.filter(read=False).count() 
+    unread_count = get_notification_summary(request.user)['unread_count']
     
     return render(request, 'notifications/all_notifications.html', {
         'notifications': page_obj,
@@ -1020,8 +1000,7 @@ def view_notification(request, notification_id):
 
     # Mark as read
     if not notification.read:
-        notification.read = True
-        notification.save()
+        mark_notifications_read(request.user, pk=notification.pk)
 
     # Redirect based on notification type
     # This is the section where the error is likely happening
@@ -1037,7 +1016,7 @@ def view_notification(request, notification_id):
             return redirect(reverse('message_detail_view', args=[notification.content_object.id]))
         else:
             return redirect(reverse('message_list_view'))
-    elif notification.notification_type == 'post_mention' or notification.notification_type == 'post_comment':
+    elif notification.notification_type in ('post_mention', 'post_comment', 'post_like'):
         # Assuming content_object is the Post instance
         if notification.content_object and hasattr(notification.content_object, 'id'):
             return redirect(reverse('post_detail_view', args=[notification.content_object.id]))
@@ -1051,56 +1030,166 @@ def view_notification(request, notification_id):
 
 # --- Home & Dashboard Views ---
 
+@instrumentation.query_budget(14)
 @login_required
 def home_view(request):
     """
     Displays the main home feed with recent posts and suggested connections.
+    Only the first page of the user's timeline is rendered; home.js pulls
+    the rest from home_feed_api using the returned cursor.
     """
-    posts = Post.objects.all().select_related('author__user', 'subject').order_by('-created_at')
-
-    # Suggested connections: exclude current user, and users they are already connected with
-    # or have a pending request from/to.
-
-    # Get IDs of users already connected with (using Profile.is_connected_with which checks both ways)
-    connected_profiles = request.user.profile.get_connections()
-    connected_user_ids = [p.user.id for p in connected_profiles]
-
-    # Get IDs of users involved in pending requests with current user (sender or receiver)
-    pending_request_user_ids = ConnectionRequest.objects.filter(
-        Q(sender=request.user) | Q(receiver=request.user),
-        status='pending'
-    ).values_list('sender__id', 'receiver__id')
+    posts, next_cursor, feed_source = get_home_feed_page(request.user.profile)
+    post_cards.prime(posts)
 
-    # Flatten the list of IDs
-    pending_user_ids = [id for sublist in pending_request_user_ids for id in sublist]
-
-    # Combine all excluded IDs and ensure uniqueness
-    excluded_user_ids = list(set(connected_user_ids + pending_user_ids + [request.user.id]))
-
-    suggested_users = User.objects.exclude(
-        id__in=excluded_user_ids
-    ).filter(
-        profile__isnull=False # Only suggest users who have a profile
-    ).order_by('?')[:5].select_related('profile') # Get 5 random suggestions
+    # Precomputed "people you may know" list (see core/recommendations.py)
+    suggested_users = recommendations.suggested_users(request.user.profile, limit=5)
 
+    # Connection state for suggested users and post authors, resolved in bulk
+    statuses = connection_statuses(
+        request.user,
+        [user_obj.pk for user_obj in suggested_users] + [post.author_id for post in posts],
+    )
     user_statuses = {}
     for user_obj in suggested_users: # Renamed 'user' to 'user_obj' to avoid conflict with 'user = request.user'
         user_statuses[user_obj.username] = {
-            'is_connected': request.user.profile.is_connected_with(user_obj.profile),
-            'connection_request_sent': ConnectionRequest.objects.filter(
-                sender=request.user, receiver=user_obj, status='pending'
-            ).exists() # REMOVED THE TRAILING COMMA HERE!
+            'is_connected': statuses[user_obj.pk].is_connected,
+            'connection_request_sent': statuses[user_obj.pk].request_sent,
         }
 
     context = {
         'posts': posts,
+        'liked_post_ids': likes.liked_post_ids(request.user.profile, [post.id for post in posts]),
+        'next_cursor': next_cursor,
+        'feed_source': feed_source,
         'suggested_users': suggested_users,
+        'suggested_connections': suggested_users, # Name used by the home.html widget
         'user_statuses': user_statuses,
+        'connection_statuses': statuses,
         'current_user': request.user,
-        'unread_notification_count': request.user.received_notifications.filter(read=False).count()
     }
     return render(request, 'home.html', context)
 
+
+@login_required
+def home_feed_api(request):
+    """
+    Returns the next page of the home feed for infinite scroll.
+    Pages are addressed by an opaque keyset cursor rather than a page number,
+    so deep pages cost the same as the first one. Responds with JSON
+    ({'html', 'next_cursor', 'count'}) or, with ?format=html, the bare
+    rendered post cards. ?source= pins the timeline/global source chosen
+    by the first page.
+    """
+    try:
+        posts, next_cursor, feed_source = get_home_feed_page(
+            request.user.profile,
+            source=request.GET.get('source'),
+            cursor=request.GET.get('cursor'),
+            page_size=request.GET.get('limit', FEED_PAGE_SIZE),
+        )
+    except (InvalidCursor, ValueError):
+        return JsonResponse({'error': 'Invalid feed cursor'}, status=400)
+
+    post_cards.prime(posts)
+    html = render_to_string('posts/feed_page.html', {
+        'posts': posts,
+        'liked_post_ids': likes.liked_post_ids(request.user.profile, [post.id for post in posts]),
+        'connection_statuses': connection_statuses(request.user, [post.author_id for post in posts]),
+    }, request=request)
+    if request.GET.get('format') == 'html':
+        response = HttpResponse(html)
+        if next_cursor:
+            response['X-Next-Cursor'] = next_cursor
+        return response
+    return JsonResponse({
+        'html': html,
+        'next_cursor': next_cursor,
+        'source': feed_source,
+        'count': len(posts),
+    })
+
+@login_required
+def people_autocomplete_api(request):
+    """
+    Returns up to 8 people whose name, profile or skills start with the
+    words in ?q=, as JSON {'results': [...]}, for search-box suggestions.
+    """
+    query = request.GET.get('q', '')
+    if len(query.strip()) < 2:
+        return JsonResponse({'results': []})
+    return JsonResponse({'results': people_search.autocomplete(query)})
+
+@login_required
+def lookup_autocomplete_api(request, kind):
+    """
+    Returns Skills or Subjects (``kind`` is 'skill' or 'subject') whose name
+    or a word in it starts with ?q=, as JSON {'results': [{'id', 'name'}]}.
+    Served from the per-process prefix index in core/lookups.py.
+    """
+    if kind not in lookups.LOOKUP_MODELS:
+        return JsonResponse({'error': 'Unknown lookup'}, status=404)
+    return JsonResponse({'results': lookups.autocomplete(kind, request.GET.get('q', ''))})
+
+# --- Chunked upload API (see core/uploads.py) ---
+
+def _upload_error(error):
+    return JsonResponse({'error': str(error)}, status=error.status)
+
+@login_required
+@require_POST
+def upload_start_api(request):
+    """
+    Opens a resumable upload. Expects filename, size, purpose ('message' or
+    'submission') and optionally content_type and sha256; returns the
+    session id, chunk size and chunk count.
+    """
+    try:
+        session = uploads.start_session(
+            request.user,
+            purpose=request.POST.get('purpose', ''),
+            filename=request.POST.get('filename', ''),
+            size=request.POST.get('size'),
+            content_type=request.POST.get('content_type', ''),
+            sha256=request.POST.get('sha256', ''),
+        )
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(uploads.describe(session), status=201)
+
+@login_required
+@require_http_methods(['GET'])
+def upload_status_api(request, upload_id):
+    """Lists the chunks received so far, so an interrupted upload can resume."""
+    try:
+        return JsonResponse(uploads.describe(uploads.get_session(upload_id, request.user)))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+
+@login_required
+@require_http_methods(['PUT'])
+def upload_chunk_api(request, upload_id, index):
+    """
+    Stores one chunk. The body is the raw bytes, checked against the
+    X-Chunk-SHA256 header; it is streamed to disk, never read whole.
+    """
+    try:
+        session = uploads.get_session(upload_id, request.user)
+        length = int(request.headers.get('Content-Length') or 0)
+        checksum = uploads.write_chunk(session, index, request, length, request.headers.get('X-Chunk-SHA256', ''))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return JsonResponse({'index': index, 'sha256': checksum})
+
+@login_required
+@require_POST
+def upload_complete_api(request, upload_id):
+    """Assembles a fully received upload; its id can then be sent with a message or submission."""
+    try:
+        session = uploads.complete(uploads.get_session(upload_id, request.user))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(uploads.describe(session))
+
 # --- Admin/Superuser Views ---
 
 def superuser_check(user):
@@ -1142,12 +1231,8 @@ def user_management(request):
 
     search_query = request.GET.get('q')
     if search_query:
-        users_query = users_query.filter(
-            Q(username__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(profile__institution__icontains=search_query) |
-            Q(profile__location__icontains=search_query)
-        ).distinct() # Use distinct to avoid duplicate users if filtering on multiple related fields
+        # Prefix match on the people-search token index (see core/people_search.py); admins may search by email
+        users_query = people_search.search_users(search_query, users_query, include_email=True)
 
     # Pagination
     paginator = Paginator(users_query, 25) # 25 users per page
@@ -1268,137 +1353,117 @@ def system_settings(request):
     
     return render(request, 'admin/system_settings.html', {'form': form})
 
+@user_passes_test(superuser_check, login_url='login')
+def request_performance(request):
+    """
+    Rolling per-view request costs for this process (see core/instrumentation.py).
+    """
+    if request.method == 'POST':
+        instrumentation.rolling_stats.clear()
+        return redirect('request_performance')
+    context = {
+        'rows': instrumentation.rolling_stats.summary(),
+        'window': instrumentation.rolling_stats.window,
+    }
+    return render(request, 'admin/request_performance.html', context)
+
 
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 # --- Network Page View ---
+@instrumentation.query_budget(8)
 @login_required
 def network_view(request):
+    """
+    Member directory for finding new connections. Filtering, request-status
+    annotations and keyset pagination all happen in the database (see
+    core/directory.py), so a deep page costs the same as the first.
+    """
     current_user = request.user
-    
-    # Exclude current user
-    users_list = User.objects.exclude(pk=current_user.pk)
-
-    # Exclude users already connected or with pending requests involving the current user
-    # Get IDs of users involved in 'accepted' or 'pending' requests with current_user
-    connected_or_pending_user_ids = set()
-    requests_involving_current_user = ConnectionRequest.objects.filter(
-        (Q(sender=current_user) | Q(receiver=current_user)) & 
-        (Q(status='accepted') | Q(status='pending'))
-    )
-    for req in requests_involving_current_user:
-        connected_or_pending_user_ids.add(req.sender.pk)
-        connected_or_pending_user_ids.add(req.receiver.pk)
-    
-    # Further exclude these users (making sure not to exclude current_user again if they were in the set)
-    users_list = users_list.exclude(pk__in=connected_or_pending_user_ids - {current_user.pk})
-
-    # Get filter parameters
-    query = request.GET.get('q')
-    skills_query = request.GET.get('skills')
-    industry_query = request.GET.get('industry')
-
-    if query:
-        users_list = users_list.filter(
-            Q(username__icontains=query) |
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(profile__headline__icontains=query) # Assumes User has a 'profile' relation
-        ).distinct() # Use distinct if joining on profile causes duplicates
-
-    if skills_query:
-        # This depends on how skills are stored on the Profile model
-        # Example: if Profile has a ManyToManyField 'skills' to a Skill model
-        # users_list = users_list.filter(profile__skills__name__icontains=skills_query).distinct()
-        # Example: if Profile has a text field 'skills_text'
-        users_list = users_list.filter(profile__skills_text__icontains=skills_query).distinct()
-
-    if industry_query:
-        # Assumes Profile has an 'industry' field
-        users_list = users_list.filter(profile__industry__icontains=industry_query).distinct()
-
-    # For each user, determine connection status with current_user
-    # This is for the template to show "Connect", "Request Sent", or "Connected" (though "Connected" ones are excluded above)
-    users_for_template = []
-    for user_obj in users_list:
-        request_sent = ConnectionRequest.objects.filter(sender=current_user, receiver=user_obj, status='pending').exists()
-        # request_received = ConnectionRequest.objects.filter(sender=user_obj, receiver=current_user, status='pending').exists() # Not strictly needed if we only show "Connect" or "Sent"
-        
-        # Add custom attributes for template logic
-        user_obj.connection_request_sent_by_me = request_sent
-        # user_obj.is_connected_to_current_user = False # Already excluded
-        users_for_template.append(user_obj)
-
-    # Suggested Connections (Simplified example: users not connected, from same industry, or with mutual skills)
-    # This is a complex feature; a basic placeholder:
-    suggested_connections = User.objects.exclude(pk=current_user.pk)\
-                                      .exclude(pk__in=connected_or_pending_user_ids)\
-                                      .order_by('?')[:3] # Random 3 users, very basic
+    query = request.GET.get('q', '').strip()
+    skills = parse_skills(request.GET.get('skills'))
 
-    # Pagination
-    paginator = Paginator(users_for_template, 12) # 12 users per page
-    page = request.GET.get('page')
+    users_list = directory_queryset(current_user, query=query, skills=skills)
     try:
-        paged_users_list = paginator.page(page)
-    except PageNotAnInteger:
-        paged_users_list = paginator.page(1)
-    except EmptyPage:
-        paged_users_list = paginator.page(paginator.num_pages)
+        users_page, prev_cursor, next_cursor = get_directory_page(
+            users_list, after=request.GET.get('after'), before=request.GET.get('before'),
+        )
+    except InvalidCursor:
+        users_page, prev_cursor, next_cursor = get_directory_page(users_list)
+
+    # Suggested Connections: precomputed by mutual connections and shared skills/subjects
+    suggested_connections = recommendations.suggested_users(current_user.profile, limit=3)
+
+    # Filters carried over to the previous/next links
+    filter_params = request.GET.copy()
+    for key in ('after', 'before', 'page'):
+        filter_params.pop(key, None)
 
     context = {
-        'users_list': paged_users_list,
+        'users_list': users_page,
+        'prev_cursor': prev_cursor,
+        'next_cursor': next_cursor,
+        'filter_query': filter_params.urlencode(),
         'suggested_connections': suggested_connections,
-        'request_GET': request.GET,
     }
-    return render(request, 'your_template_path/network_page.html', context)
-
+    return render(request, 'network.html', context)
 
 
 @login_required
 def like_post(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    profile = request.user.profile  # Assuming OneToOne relation is named 'profile'
-
-    if profile in post.likes.all():
-        post.likes.remove(profile)
-        liked = False
-    else:
-        post.likes.add(profile)
-        liked = True
-
-    return JsonResponse({'success': True, 'liked': liked, 'like_count': post.likes.count()})
+    """
+    Toggles the current user's like on a post.
+    """
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    liked = likes.toggle_like(request.user.profile, post.id)
+    post.refresh_from_db(fields=['like_count'])
+    return JsonResponse({'success': True, 'liked': liked, 'like_count': post.like_count})
 
 
 
 @login_required
 @require_POST
 def unlike_post(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    if request.user in post.likes.all():
-        post.likes.remove(request.user)
-        liked = False
-    else:
-        liked = True
-    return JsonResponse({'success': True, 'liked': liked, 'likes_count': post.likes.count()})
+    """
+    Removes the current user's like. Idempotent: unliking twice is not an error.
+    """
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    likes.unlike(request.user.profile, post.id)
+    post.refresh_from_db(fields=['like_count'])
+    return JsonResponse({'success': True, 'liked': False, 'likes_count': post.like_count})
 
 
 from django.http import JsonResponse, HttpResponse
 from django.template.loader import render_to_string
 @login_required
-def add_comment(request):
-    post_id = request.POST.get('post_id')
+@require_POST
+def add_comment(request, post_id):
+    post = get_object_or_404(Post, id=post_id)
     content = request.POST.get('content')
-    post = Post.objects.get(id=post_id)
+    if content is None and request.content_type == 'application/json':
+        # post_card.js sends {"text": ...} as JSON
+        try:
+            content = json.loads(request.body).get('text')
+        except ValueError:
+            content = None
+    content = (content or '').strip()
+    if not content:
+        return JsonResponse({'success': False, 'error': 'Comment cannot be empty'}, status=400)
 
-    comment = Comment.objects.create(user=request.user, post=post, content=content)
-    comment.save()
+    # comment_count is bumped by the Comment post_save signal
+    comment = Comment.objects.create(user=request.user.profile, post=post, content=content)
+    post.refresh_from_db(fields=['comment_count'])
 
     return JsonResponse({
+        'success': True,
+        'comment_count': post.comment_count,
         'comment_html': render_to_string('partials/comment.html', {'comment': comment}, request=request)
     })
 
 
 def view_all_comments(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all().order_by('-created_at') # Or your preferred ordering
-    comments_html = render_to_string('partials/comment.html', {'comments': comments, 'request': request}) # You might need to adjust the template to handle a list of comments
+    comments = post.comments.all().select_related('user__user').order_by('-created_at') # Or your preferred ordering
+    comments_html = ''.join(
+        render_to_string('partials/comment.html', {'comment': comment}, request=request)
+        for comment in comments
+    )
     return HttpResponse(comments_html) # Or JsonResponse if you handle rendering on the client-side